@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the enview commands on a synthetic, large environment.
+
+The environment is generated on the fly: many variables of every recognized
+type, a few multi-MB values, and a PATH group whose entries are temporary
+directories full of executables (with overlapping names, so there are
+conflicts to report). Each benchmark runs a number of rounds after a warmup
+and reports min / median / mean / stddev, like pytest-benchmark.
+
+Use `--json FILE` to keep the results and `--compare FILE` to compare against
+results of an earlier commit.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from enview import envstore  # noqa: E402
+from enview.commands import enviewcmd  # noqa: E402
+from enview.formats import EXPORT_FORMATS  # noqa: E402
+from enview.pathscan import RACY_MTIME_SECONDS  # noqa: E402
+from enview.screen import Screen  # noqa: E402
+from enview.vartypes import recognize_type  # noqa: E402
+
+SAMPLE_VALUES = (
+    "42",
+    "true",
+    "192.168.1.{i}",
+    "fe80::{i:x}",
+    "/usr/share/doc/pkg-{i}",
+    "https://example.com/api/v{i}",
+    "db-{i}.internal:5432",
+    '{{"id": {i}, "tags": ["a", "b"]}}',
+    "just some text for variable number {i}",
+)
+
+
+class FakeTerminal(Screen):
+    """
+    Screen writing into memory with a fixed size.
+    """
+
+    def __init__(self, columns=200, rows=60):
+        super().__init__(io.StringIO())
+        self._size = (columns, rows)
+
+    def size(self):
+        return self._size
+
+    def _write(self, data: str):
+        self.stream.seek(0)
+        self.stream.truncate()
+        self.stream.write(data)
+
+
+def make_path_dirs(root, count, per_dir, shared):
+    """
+    Create `count` directories of `per_dir` executables each; the first
+    `shared` names are the same in every directory. They are backdated, as
+    listings of directories modified within the last RACY_MTIME_SECONDS are
+    never cached.
+    :return: list of directories
+    """
+    past = time.time() - 60 * RACY_MTIME_SECONDS
+    directories = []
+    for index in range(count):
+        directory = os.path.join(root, f"bin{index:04d}")
+        os.makedirs(directory)
+        for number in range(per_dir):
+            name = f"tool{number}" if number < shared else f"tool{index}_{number}"
+            path = os.path.join(directory, name)
+            with open(path, "w") as f:
+                f.write("#!/bin/sh\n")
+            os.chmod(path, 0o755)
+            os.utime(path, (past, past))
+        os.utime(directory, (past, past))
+        directories.append(directory)
+    return directories
+
+
+def make_environment(root, variables, big_values, big_size, directories):
+    """
+    Build the synthetic environment.
+    :return: dict
+    """
+    env = {
+        "HOME": root,
+        "ENVIEW_CACHE_DIR": os.path.join(root, "cache"),
+        "ENVIEW_DATA_DIR": os.path.join(root, "data"),
+    }
+    for index in range(variables):
+        template = SAMPLE_VALUES[index % len(SAMPLE_VALUES)]
+        env[f"SYNTH_VAR_{index:05d}"] = template.format(i=index % 256)
+    for index in range(big_values):
+        env[f"SYNTH_BIG_{index}"] = "x" * big_size
+    # duplicates and redundant spellings give optimize something to do
+    path = directories + [directory + "/" for directory in directories[::10]]
+    env["PATH"] = os.pathsep.join(path)
+    env["SYNTH_LIB_PATH"] = os.pathsep.join(reversed(directories))
+    return env
+
+
+@contextlib.contextmanager
+def environment(env):
+    """
+    Replace the process environment for the duration of the block.
+    """
+    saved = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(env)
+    envstore._default_store = None
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+        envstore._default_store = None
+
+
+def measure(function, setup=None, rounds=10, warmup=1):
+    """
+    Time a function, running `setup` untimed before every call.
+    :return: dict of statistics in seconds
+    """
+    timings = []
+    for round_number in range(warmup + rounds):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        if round_number >= warmup:
+            timings.append(elapsed)
+    return {
+        "min": min(timings),
+        "max": max(timings),
+        "mean": statistics.fmean(timings),
+        "median": statistics.median(timings),
+        "stddev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "rounds": len(timings),
+    }
+
+
+def benchmarks(env, root):
+    """
+    The benchmarks, as (name, function, setup).
+    """
+    store = enviewcmd.get_environment_vars
+    values = list(env.values())
+    terminal = FakeTerminal()
+    output = os.path.join(root, "saved.env")
+
+    def reset_store():
+        envstore._default_store = None
+
+    def reset_path():
+        store().set("PATH", env["PATH"])
+        store().set("SYNTH_LIB_PATH", env["SYNTH_LIB_PATH"])
+
+    def draw_scroll():
+        position = 0
+        for selected in range(0, 200):
+            position, _ = enviewcmd.print_env_list(
+                position=position, selected=selected, screen=terminal
+            )
+
+    def recognize_all():
+        for value in values:
+            recognize_type(value)
+
+    def clear_listing_cache():
+        path = os.path.join(env["ENVIEW_CACHE_DIR"], "executables.json")
+        if os.path.exists(path):
+            os.unlink(path)
+
+    yield "get_environment_vars", store, reset_store
+    yield (
+        "print_env_list.full",
+        (lambda: enviewcmd.print_env_list(screen=terminal)),
+        terminal.invalidate,
+    )
+    yield "print_env_list.scroll", draw_scroll, terminal.invalidate
+    yield "recognize_type.cold", recognize_all, recognize_type.cache_clear
+    yield "recognize_type.warm", recognize_all, None
+    yield (
+        "conflict_checker.uncached",
+        (lambda: enviewcmd.conflict_checker("PATH", no_cache=True)),
+        None,
+    )
+    yield (
+        "conflict_checker.cold_cache",
+        (lambda: enviewcmd.conflict_checker("PATH")),
+        clear_listing_cache,
+    )
+    yield (
+        "conflict_checker.warm_cache",
+        (lambda: enviewcmd.conflict_checker("PATH")),
+        None,
+    )
+    yield "optimize", lambda: enviewcmd.optimize("PATH"), reset_path
+    yield "optimize.all", lambda: enviewcmd.optimize(all_groups=True), reset_path
+    for fmt in EXPORT_FORMATS:
+        yield (
+            f"save.{fmt}",
+            (lambda fmt=fmt: enviewcmd.save(fmt=fmt, output=output)),
+            None,
+        )
+
+
+def git_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print the change against earlier results.
+    :return: names of the benchmarks slower than `threshold` times
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["benchmarks"]
+    regressions = []
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        ratio = stats["median"] / baseline[name]["median"]
+        marker = ""
+        if ratio > threshold:
+            marker = "  <- slower"
+            regressions.append(name)
+        print(f"{name:<32} {ratio:6.2f}x{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--variables", type=int, default=10000)
+    parser.add_argument("--big-values", type=int, default=3)
+    parser.add_argument("--big-size", type=int, default=2 * 1024 * 1024)
+    parser.add_argument("--path-dirs", type=int, default=500)
+    parser.add_argument("--executables", type=int, default=20, help="per directory")
+    parser.add_argument("--shared", type=int, default=5, help="names in every dir")
+    parser.add_argument("-k", dest="select", help="only run names containing this")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="median ratio above which --compare reports a regression",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="enview-bench-") as root:
+        directories = make_path_dirs(
+            os.path.join(root, "path"), args.path_dirs, args.executables, args.shared
+        )
+        env = make_environment(
+            root, args.variables, args.big_values, args.big_size, directories
+        )
+        with environment(env):
+            for name, function, setup in benchmarks(env, root):
+                if args.select and args.select not in name:
+                    continue
+                stats = measure(function, setup, rounds=args.rounds)
+                results[name] = stats
+                print(
+                    f"{name:<32} median {stats['median'] * 1000:9.2f} ms"
+                    f"  min {stats['min'] * 1000:9.2f} ms"
+                    f"  stddev {stats['stddev'] * 1000:7.2f} ms"
+                )
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.time(),
+            "parameters": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("json", "compare", "threshold", "select")
+            },
+            "benchmarks": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} benchmarks regressed")
+
+
+if __name__ == "__main__":
+    main()
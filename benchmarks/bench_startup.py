@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the non-interactive entry point.
+
+Runs `python -m enview <command>` several times and fails if the median
+wall time exceeds the budget, or if running a command imported any of the
+modules only the interactive shell needs.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SHELL_ONLY_MODULES = ("nubia", "prompt_toolkit", "pygments", "readchar")
+
+# runs the package the way `python -m enview` does, global options included,
+# and reports the shell-only modules it imported on the way out
+PROBE = f"""
+import runpy, sys
+sys.argv[0] = "enview"
+try:
+    runpy.run_module("enview", run_name="__main__", alter_sys=True)
+finally:
+    loaded = sorted({{m.split(".")[0] for m in sys.modules}} & set({SHELL_ONLY_MODULES!r}))
+    sys.stderr.write("LOADED=" + ",".join(loaded) + "\\n")
+"""
+
+
+def run_once(command):
+    pythonpath = os.pathsep.join(
+        filter(None, [str(PROJECT_ROOT), os.environ.get("PYTHONPATH")])
+    )
+    env = dict(os.environ, PYTHONPATH=pythonpath)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, *command],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    loaded = ""
+    for line in result.stderr.splitlines():
+        if line.startswith("LOADED="):
+            loaded = line[len("LOADED=") :]
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"enview {' '.join(command)} failed")
+    return elapsed, loaded
+
+
+def baseline(repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=150.0,
+        help="allowed median time on top of a bare interpreter start",
+    )
+    parser.add_argument("command", nargs="*", default=["getall"])
+    args = parser.parse_args()
+
+    interpreter = baseline(args.repeat)
+    timings = []
+    for _ in range(args.repeat):
+        elapsed, loaded = run_once(args.command)
+        if loaded:
+            raise SystemExit(f"shell-only modules imported: {loaded}")
+        timings.append(elapsed)
+    overhead_ms = (statistics.median(timings) - interpreter) * 1000
+    median_ms = statistics.median(timings) * 1000
+    print(
+        f"enview {' '.join(args.command)}: median {median_ms:.1f} ms, "
+        f"{overhead_ms:.1f} ms over a bare interpreter ({interpreter * 1000:.1f} ms)"
+    )
+    if overhead_ms > args.budget_ms:
+        raise SystemExit(f"startup overhead above budget of {args.budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,3 @@
+from enview.envstore import EnvStore, get_store
+
 __version__ = "1.0.6"
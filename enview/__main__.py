@@ -0,0 +1,3 @@
+from enview.enview import main
+
+main()
@@ -0,0 +1,142 @@
+"""
+Fixed-width table cells measured in terminal display cells.
+
+Only the prefix of a value that can be visible is escaped and measured, so
+the cost of a cell depends on the column width, not on the value size.
+"""
+
+ELLIPSIS = "..."
+# at most this many source characters per display cell are looked at, which
+# bounds the work on runs of zero-width characters
+_CHARS_PER_CELL = 8
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+_wcwidth = None
+
+
+def char_width(char: str) -> int:
+    """
+    Display width of one printable character: 0, 1 or 2 cells.
+    :param char:
+    :return: width
+    """
+    global _wcwidth
+    if " " <= char < "\x7f":
+        return 1
+    if _wcwidth is None:
+        from wcwidth import wcwidth
+
+        _wcwidth = wcwidth
+    return max(_wcwidth(char), 0)
+
+
+def escape_char(char: str) -> str:
+    """
+    Make a character safe to print in a table, like repr does.
+    :param char:
+    :return: the character, or its escape sequence
+    """
+    escaped = _ESCAPES.get(char)
+    if escaped is not None:
+        return escaped
+    if char.isprintable():
+        return char
+    return repr(char)[1:-1]
+
+
+def fit(text: str, width: int, escape: bool = True) -> str:
+    """
+    Fit text into exactly `width` display cells, padding with spaces or
+    truncating with "...".
+    :param text:
+    :param width: number of display cells
+    :param escape: escape control characters and backslashes
+    :return: cell text
+    """
+    if width <= 0:
+        return ""
+    head = text[: width + 1]
+    if head.isascii() and head.isprintable() and not (escape and "\\" in head):
+        # one cell per character, nothing to escape
+        if len(text) <= width:
+            return text + " " * (width - len(text))
+        if width <= len(ELLIPSIS):
+            return text[:width]
+        return text[: width - len(ELLIPSIS)] + ELLIPSIS
+
+    pieces = []
+    used = 0
+    # display width at which the truncated text still leaves room for "..."
+    keep = width - len(ELLIPSIS) if width > len(ELLIPSIS) else width
+    kept = 0
+    kept_width = 0
+    limit = min(len(text), width * _CHARS_PER_CELL + _CHARS_PER_CELL)
+    for index in range(limit):
+        char = text[index]
+        piece = escape_char(char) if escape else char
+        if len(piece) > 1 or piece != char:
+            piece_width = len(piece)
+        elif char.isprintable():
+            piece_width = char_width(char)
+        else:
+            piece_width = 0
+        if used + piece_width > width:
+            break
+        pieces.append(piece)
+        used += piece_width
+        if used <= keep:
+            kept = len(pieces)
+            kept_width = used
+    else:
+        if limit == len(text):
+            return "".join(pieces) + " " * (width - used)
+    if width <= len(ELLIPSIS):
+        return "".join(pieces[:kept]) + " " * (width - kept_width)
+    return (
+        "".join(pieces[:kept]) + ELLIPSIS + " " * (width - kept_width - len(ELLIPSIS))
+    )
+
+
+class CellCache:
+    """
+    Cache of rendered cells per column width.
+
+    Cells are keyed by the value itself; Python caches the hash of a string
+    and compares identical objects without reading them, so a hit on a large
+    value is O(1). A new width (after a resize) starts a fresh table, and
+    only the last few widths are kept. Edited values simply stop being
+    looked up and age out.
+    """
+
+    def __init__(self, max_cells: int = 4096, max_widths: int = 4):
+        self.max_cells = max_cells
+        self.max_widths = max_widths
+        self._tables = {}
+
+    def cell(self, text: str, width: int, escape: bool = True) -> str:
+        """
+        Get `fit(text, width, escape)`, computing it only once.
+        :param text:
+        :param width:
+        :param escape:
+        :return: cell text
+        """
+        key = (width, escape)
+        table = self._tables.get(key)
+        if table is None:
+            if len(self._tables) >= self.max_widths:
+                del self._tables[next(iter(self._tables))]
+            table = self._tables[key] = {}
+        cell = table.get(text)
+        if cell is None:
+            if len(table) >= self.max_cells:
+                table.clear()
+            cell = table[text] = fit(text, width, escape)
+        return cell
+
+    def clear(self):
+        """
+        Drop every cached cell.
+        :return:
+        """
+        self._tables.clear()
@@ -0,0 +1,244 @@
+import argparse
+import os
+import sys
+import textwrap
+
+from enview import profiling
+from enview.registry import COMMANDS
+
+_EMPTY = object()
+
+
+def load_commands():
+    """
+    Import the command modules so their commands are registered.
+    :return: dict mapping command name to function
+    """
+    import enview.commands.enviewcmd  # noqa: F401
+
+    return COMMANDS
+
+
+def _parameters(function):
+    """
+    Get the parameters of a command function without importing inspect.
+    :param function:
+    :return: dict mapping name to (annotation, default)
+    """
+    code = function.__code__
+    names = code.co_varnames[: code.co_argcount]
+    defaults = function.__defaults__ or ()
+    defaults = (_EMPTY,) * (len(names) - len(defaults)) + tuple(defaults)
+    annotations = function.__annotations__
+    return {
+        name: (annotations.get(name, str), default)
+        for name, default in zip(names, defaults)
+    }
+
+
+def _is_list(annotation) -> bool:
+    return getattr(annotation, "__origin__", None) is list
+
+
+def _unwrap_optional(annotation):
+    """
+    Turn Optional[X] into X.
+    :param annotation:
+    :return: annotation
+    """
+    arguments = getattr(annotation, "__args__", ())
+    if len(arguments) == 2 and type(None) in arguments:
+        return next(argument for argument in arguments if argument is not type(None))
+    return annotation
+
+
+def _add_argument(parser, function, spec):
+    arg = spec["arg"]
+    name = spec.get("name") or arg
+    annotation, default = _parameters(function)[arg]
+    annotation = spec.get("type") or _unwrap_optional(annotation)
+    has_default = default is not _EMPTY
+    kwargs = {"help": spec.get("description")}
+    if spec.get("choices"):
+        kwargs["choices"] = spec["choices"]
+    if spec.get("positional"):
+        if _is_list(annotation):
+            kwargs["nargs"] = "*" if has_default else "+"
+            kwargs["type"] = annotation.__args__[0]
+        else:
+            kwargs["type"] = annotation
+            if has_default:
+                kwargs["nargs"] = "?"
+        if has_default:
+            kwargs["default"] = default
+        parser.add_argument(arg, metavar=name, **kwargs)
+        return
+    flags = ["--" + name.replace("_", "-")]
+    flags += ["-" + alias for alias in spec.get("aliases") or ()]
+    if annotation is not bool and name != arg and not spec.get("choices"):
+        kwargs["metavar"] = name.upper()
+    if annotation is bool:
+        kwargs["action"] = "store_true"
+    elif _is_list(annotation):
+        kwargs["nargs"] = "*"
+        kwargs["type"] = annotation.__args__[0]
+    else:
+        kwargs["type"] = annotation
+    if has_default:
+        kwargs["default"] = default
+    else:
+        kwargs["required"] = True
+    parser.add_argument(*flags, dest=arg, **kwargs)
+
+
+def build_parser(commands):
+    """
+    Build an argument parser from the registered commands.
+    :param commands: dict mapping command name to function
+    :return: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog="enview")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, function in commands.items():
+        doc = textwrap.dedent(function.__doc__ or "").strip()
+        subparser = subparsers.add_parser(
+            name, help=doc.split("\n", 1)[0], description=doc
+        )
+        subparser.set_defaults(function=function)
+        specs = list(function._enview_arguments)
+        # like nubia, parameters without an @argument become plain options
+        declared = {spec["arg"] for spec in specs}
+        for parameter in _parameters(function):
+            if parameter not in declared:
+                specs.append({"arg": parameter})
+        for spec in specs:
+            _add_argument(subparser, function, spec)
+    return parser
+
+
+def global_options(argv):
+    """
+    Take the options that apply to any command (or to the shell) off the
+    front of a command line: `--profile`, `--trace FILE`, `--client` and
+    `--batch FILE`.
+    :param argv: arguments, without the program name
+    :return: (dict with "profile", "trace", "client" and "batch", remaining
+    arguments)
+    """
+    options = {"profile": False, "trace": None, "client": False, "batch": None}
+    argv = list(argv)
+    while argv:
+        if argv[0] == "--profile":
+            options["profile"] = True
+            argv.pop(0)
+        elif argv[0] == "--client":
+            options["client"] = True
+            argv.pop(0)
+        elif argv[0] == "--trace" and len(argv) > 1:
+            options["trace"] = argv[1]
+            del argv[:2]
+        elif argv[0].startswith("--trace="):
+            options["trace"] = argv.pop(0)[len("--trace=") :]
+        elif argv[0] == "--batch" and len(argv) > 1:
+            options["batch"] = argv[1]
+            del argv[:2]
+        elif argv[0].startswith("--batch="):
+            options["batch"] = argv.pop(0)[len("--batch=") :]
+        else:
+            break
+    return options, argv
+
+
+def is_command(argv) -> bool:
+    """
+    Check whether a command line names a registered command.
+    :param argv: arguments, without the program name
+    :return: bool
+    """
+    return bool(argv) and argv[0] in load_commands()
+
+
+def run(argv) -> int:
+    """
+    Run one command without the interactive shell.
+    :param argv: arguments, without the program name
+    :return: exit code
+    """
+    return _call(vars(build_parser(load_commands()).parse_args(argv)))
+
+
+def _call(args) -> int:
+    function = args.pop("function")
+    name = args.pop("command")
+    with profiling.span("command." + name, "command"):
+        result = function(**args)
+    return result if isinstance(result, int) else 0
+
+
+def read_batch(lines):
+    """
+    Split a batch script into command lines: one command per line, quoted
+    like in a shell. Blank lines and lines starting with "#" are skipped.
+    :param lines: iterable of lines
+    :return: list of (line number, arguments)
+    """
+    import shlex
+
+    commands = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        commands.append((number, shlex.split(line)))
+    return commands
+
+
+def run_batch(path: str) -> int:
+    """
+    Run the commands of a batch script in this process, against one
+    in-memory copy of the environment: `os.environ` is left alone, so a
+    final `delta` prints everything the script changed. Only what the
+    commands export (`delta`, `save -o -`) goes to stdout, everything else
+    to stderr, so stdout can be evaluated or parsed as is. Every command
+    line is parsed before the first one runs, and the script stops at the
+    first command that fails.
+    :param path: script file, "-" for stdin
+    :return: exit code
+    """
+    import shlex
+    from contextlib import redirect_stdout
+
+    from enview.envstore import bound_store
+    from enview.formats import exports_to
+
+    name = "<stdin>" if path == "-" else path
+    try:
+        if path == "-":
+            commands = read_batch(sys.stdin)
+        else:
+            with open(path) as f:
+                commands = read_batch(f)
+    except (OSError, ValueError) as error:
+        print(f"{name}: {error}", file=sys.stderr)
+        return 2
+
+    parser = build_parser(load_commands())
+    parsed = []
+    for number, argv in commands:
+        try:
+            parsed.append((number, argv, vars(parser.parse_args(argv))))
+        except SystemExit:
+            # argparse already explained what is wrong
+            print(f"{name}:{number}: invalid command, nothing was run", file=sys.stderr)
+            return 2
+
+    with bound_store(dict(os.environ)), exports_to(sys.stdout):
+        for number, argv, args in parsed:
+            # keeps the output of every command apart
+            print(f"# enview {shlex.join(argv)}", file=sys.stderr, flush=True)
+            with redirect_stdout(sys.stderr):
+                code = _call(args)
+            sys.stdout.flush()
+            if code:
+                print(f"{name}:{number}: exited with {code}", file=sys.stderr)
+                return code
+    return 0
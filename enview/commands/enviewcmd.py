@@ -1,14 +1,57 @@
 import os
-import re
-import socket
-import subprocess
-import tempfile
-from os import listdir
-from os.path import isfile, join
-
-import readchar
-from nubia import argument, command
-from termcolor import cprint
+import sys
+import time
+from contextlib import suppress
+from typing import List, Optional
+
+from termcolor import colored, cprint
+
+from enview import profiling
+from enview.cells import CellCache, fit
+from enview.envstore import EnvStore, get_store
+from enview.formats import (
+    DEFAULT_FORMAT,
+    DELTA_FORMATS,
+    EXPORT_FORMATS,
+    IMPORT_FORMATS,
+    delta_lines,
+    export_stream,
+    filter_items,
+    open_export,
+    read_export,
+    write_export,
+)
+from enview.journal import get_journal
+from enview.libscan import build_library_index, scan_libraries
+from enview.pathhealth import (
+    HEALTH_TIMEOUT,
+    check_entries,
+    describe_health,
+)
+from enview.pathopt import DirectoryIdentity, optimize_path_group
+from enview.pathrefs import get_path_refs
+from enview.pathscan import (
+    ExecutableIndex,
+    HashCache,
+    ListingCache,
+    scan_directories,
+    scan_executables,
+)
+from enview.procenv import (
+    RawEnviron,
+    parse_query,
+    proc_supported,
+    read_comm,
+    read_environ_raw,
+    scan_processes,
+)
+from enview.registry import argument, command
+from enview.screen import Screen
+from enview.search import IncrementalSearch, SearchIndex
+from enview.snapshot import Snapshot, SnapshotStore, diff_path_group, diff_snapshots
+from enview.storage import atomic_open
+from enview.vartypes import check_path, classify_all, get_type, recognize_type
+from enview.watch import WATCH_INTERVAL, DirectoryWatcher
 
 # initialize the module
 # to be compatible with both Linux and Windows
@@ -16,58 +59,25 @@ OS_NAME = os.name
 if OS_NAME == "posix":
     SYSTEM_TYPE = "Linux"
     CLEAR_COMMAND = "clear"
-    PATH_PATTERN = (
-        r"(\${[a-zA-Z_][a-zA-Z0-9_]*}|\$[a-zA-Z_][a-zA-Z0-9_]*|\/.*)"
-        r"(/\${[a-zA-Z_][a-zA-Z0-9_]*}|/\$[a-zA-Z_][a-zA-Z0-9_]*|\/.*)*"
-    )
     PATH_SEPARATOR = ":"
     SAVE_FILE = "env.txt"
-    SCRIPT_PATTERN = 'export {}="{}"\n'
 elif OS_NAME == "nt":
     SYSTEM_TYPE = "Windows"
     CLEAR_COMMAND = "powershell clear"
-    PATH_PATTERN = r"([A-Z][:].*)"
     PATH_SEPARATOR = ";"
     # SAVE_FILE = 'env.bat'
-    # SCRIPT_PATTERN = "set {}={}\n"
     SAVE_FILE = "env.ps1"
-    SCRIPT_PATTERN = '${{env:{}}}="{}"\n'
 else:
     exit("System not supported.")
 
-# if using powershell in Windows Terminal, color patterns are correctly interpreted
-# but when using in Windows PowerShell, Command Prompt, or double clicking on enview.exe, color patterns will work after executing a `powershell clear` command
-os.system(CLEAR_COMMAND)
-print("Running on " + SYSTEM_TYPE)
 
-
-def get_char() -> str:
+def clear_terminal():
     """
-    Reads the next char from stdin
-    :return: string with length 1
+    Clear the terminal with the platform's clear command.
+    :return:
     """
-    if OS_NAME == "posix":
-        return readchar.readchar()
-    elif OS_NAME == "nt":
-        # > https://github.com/magmax/python-readchar
-        # > Sadly, this library has only being probed on GNU/Linux. Please, if you can try it in another OS and find a bug, put an issue or send the pull-request.
-        # seems that on Windows it returns a byte
-        # and a UnicodeDecodeError raises when pressing arror keys
-        # although both of these are said fixed, but they happen on my case
-        # > https://github.com/magmax/python-readchar/issues/37
-        # > https://github.com/magmax/python-readchar/issues/66
-        while True:
-            try:
-                c = readchar.readchar()
-                break
-            except Exception:
-                continue
-        if isinstance(c, str):
-            return c
-        elif isinstance(c, bytes):
-            return bytes.decode(c)
-        else:
-            exit("module readchar exception")
+    profiling.count("subprocess launches")
+    os.system(CLEAR_COMMAND)
 
 
 class BColors:
@@ -86,89 +96,23 @@ class BColors:
     UNDERLINE = "\033[4m"
 
 
-def check_ipv6(address: str) -> bool:
-    """
-    Check if the address is a valid IPv6 address.
-    :param address:
-    :return: bool
-    """
-    try:
-        socket.inet_pton(socket.AF_INET6, address)
-        return True
-    except OSError:
-        return False
-
-
-def check_ipv4(address: str) -> bool:
-    """
-    Check if the address is a valid IPv4 address.
-    :param address:
-    :return: bool
-    """
-    try:
-        socket.inet_aton(address)
-        return True
-    except OSError:
-        return False
-
-
-def check_path(path: str) -> bool:
-    """
-    Check if the path is a valid path.
-    :param path:
-    :return: bool
-    """
-    return bool(re.match(PATH_PATTERN, path))
-
-
-def check_path_group(path: str) -> bool:
-    """
-    Check if the path is a valid path group.
-    :param path:
-    :return: bcol
-
-    WARNING: This function might conflict with `check_path`, since we cannot check if there are colons(:) in the path.
-    """
-    if path.find(PATH_SEPARATOR) == -1:
-        return False
-    # again, if using powershell in Windows Terminal, it works fine
-    # but when using in Windows PowerShell, Command Prompt, or double clicking on enview.exe, 'Path' variable will end with a separator character ';'
-    # causing the last element in path_list a string in length 0
-    if path[len(path) - 1] == PATH_SEPARATOR:
-        path = path[:-1]
-    path_list = path.split(PATH_SEPARATOR)
-    return all(check_path(item) for item in path_list)
-
-
-def recognize_type(name: str) -> str:
-    """
-    Recognize the type of the environment variable.
-    :param name:
-    :return: type string
-    """
-    if check_ipv4(name):
-        return "ipv4"
-    if check_ipv6(name):
-        return "ipv6"
-    if check_path_group(name):
-        return "path_group"
-    if check_path(name):
-        return "path"
-    return "undefined"
-
-
 def full_screen_edit(initial_message: str) -> str:
     """
     Edit text in full screen.
     :param initial_message:
     :return:
     """
+    import subprocess
+    import tempfile
+
     editor_name = os.environ.get("EDITOR", "vim")
 
     with tempfile.NamedTemporaryFile(suffix=".enview_tmp") as tf:
         tf.write(initial_message.encode())
         tf.flush()
-        subprocess.call([editor_name, tf.name])
+        profiling.count("subprocess launches")
+        with profiling.span("full_screen_edit", "subprocess"):
+            subprocess.call([editor_name, tf.name])
         tf.seek(0)
         edited_message = tf.read().decode()
         return edited_message
@@ -178,11 +122,13 @@ def full_screen_edit(initial_message: str) -> str:
 def get_environment_vars():
     """
     Get all environment variables.
-    :return: env_vars
+    :return: the shared EnvStore snapshot, write through `set` / `unset`
     """
-    env_vars = os.environ.copy()
-    env_vars.update(os.environ.copy())
-    return env_vars
+    return get_store()
+
+
+# rendered table cells, shared by every frame of the env list
+CELL_CACHE = CellCache()
 
 
 def compress_str(origin_str: str, width: int) -> str:
@@ -190,42 +136,41 @@ def compress_str(origin_str: str, width: int) -> str:
     Compress a string to a specific width.
     :param origin_str:
     :param width:
-    :return: if the length of the string is less than the width, fill space to the end of the string. Otherwise,
-    compress the origin string.
+    :return: if the string is narrower than the width, fill space to the end of the string. Otherwise,
+    compress the origin string. Widths are counted in terminal display cells.
     """
-    if len(origin_str) <= width:
-        return origin_str + " " * (width - len(origin_str))
-    else:
-        return origin_str[: width - 3] + "..."
+    return fit(origin_str, width, escape=False)
 
 
-def print_env_list(position=0, selected=0):
+def format_env_list(columns, rows, position=0, selected=0, env_vars=None):
     """
-    Print environment variables.
+    Render the environment variable table into lines.
+    :param columns: terminal width
+    :param rows: terminal height
     :param position:
     :param selected:
-    :return: Updated position and selected.
+    :param env_vars: EnvStore to show, the process environment if not given
+    :return: (lines, position, selected)
     """
-    env_vars = get_environment_vars()
-    columns, rows = os.get_terminal_size()
+    if env_vars is None:
+        env_vars = get_environment_vars()
     rows = int(rows) - 1
     columns = int(columns)
     name_width = int((columns - 3) * 0.4)
     value_width = (columns - 3) - name_width
-    env_list = list(env_vars.items())
     # position bound:
     # row position range = [position, position + rows - 5]
     position_bound = position + rows - 5
 
     # console window is too small
     if columns < 5:
-        return 0
+        return [], position, selected
 
     # prevent out of range
     if selected < 0:
         selected = 0
-    if selected >= len(env_vars.keys()):
-        selected = len(env_vars.keys()) - 1
+    if selected >= len(env_vars):
+        selected = len(env_vars) - 1
 
     # slide window
     if selected < position:
@@ -235,122 +180,173 @@ def print_env_list(position=0, selected=0):
         position_bound = selected
         position = position_bound - rows + 5
 
-    boundary_str = "+" + "-" * name_width + "+" + "-" * value_width + "+"
-    cprint(boundary_str, "green")
-    cprint(
-        "| "
-        + compress_str("Name", name_width - 2)
-        + " | "
-        + compress_str("Value", value_width - 2)
-        + " |",
-        "green",
+    boundary_str = colored(
+        "+" + "-" * name_width + "+" + "-" * value_width + "+", "green"
     )
-    cprint(boundary_str, "green")
+    left_str = colored("| ", "green")
+    middle_str = colored(" | ", "green")
+    right_str = colored(" |", "green")
+    lines = [
+        boundary_str,
+        colored(
+            "| "
+            + compress_str("Name", name_width - 2)
+            + " | "
+            + compress_str("Value", value_width - 2)
+            + " |",
+            "green",
+        ),
+        boundary_str,
+    ]
 
-    # print environment variables
-    for index in range(position, min(len(env_list), position_bound + 1)):
-        key = env_list[index][0]
-        value = repr(env_list[index][1])[1:-1]
-        cprint("| ", "green", end="")
+    # environment variables
+    for index in range(position, min(len(env_vars), position_bound + 1)):
+        key, value = env_vars.item_at(index)
+        # only the visible prefix of a value is escaped and measured
+        name_str = CELL_CACHE.cell(key, name_width - 2)
+        value_str = CELL_CACHE.cell(value, value_width - 2)
         if index != selected:
-            cprint(compress_str(key, name_width - 2), "yellow", end="")
-            cprint(" | ", "green", end="")
-            cprint(compress_str(value, value_width - 2), "yellow", end="")
+            name_str = colored(name_str, "yellow")
+            value_str = colored(value_str, "yellow")
         else:
-            name_str = compress_str(key, name_width - 2)
             name_str = f"{BColors.WHITE}{name_str}{BColors.ENDC}"
-            value_str = compress_str(value, value_width - 2)
             value_str = f"{BColors.WHITE}{value_str}{BColors.ENDC}"
-            print(name_str, end="")
-            cprint(" | ", "green", end="")
-            print(value_str, end="")
-        cprint(" |", "green")
+        lines.append(left_str + name_str + middle_str + value_str + right_str)
+
+    lines.append(boundary_str)
+    return lines, position, selected
+
 
-    cprint(boundary_str, "green")
+def print_env_list(position=0, selected=0, screen=None, status=None, env_vars=None):
+    """
+    Print environment variables.
+    :param position:
+    :param selected:
+    :param screen: Screen to draw on, print to stdout if not given
+    :param status: line shown below the table
+    :param env_vars: EnvStore to show, the process environment if not given
+    :return: Updated position and selected.
+    """
+    with profiling.span("render.env_list", "render"):
+        if screen is None:
+            columns, rows = os.get_terminal_size()
+        else:
+            columns, rows = screen.size()
+        lines, position, selected = format_env_list(
+            columns, rows, position, selected, env_vars
+        )
+        if status is not None:
+            lines.append(status)
+        if screen is None:
+            print("\n".join(lines))
+        else:
+            screen.draw(lines)
     return position, selected
 
 
-def edit_mode(selected):
+def edit_mode(selected, screen=None):
     """
     Edit the environment variable.
     :param selected:
+    :param screen: Screen to clear first, if any
     :return:
     """
-    os.system(CLEAR_COMMAND)
+    if screen is not None:
+        screen.clear()
     env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    key = env_list[selected][0]
-    value = env_list[selected][1]
+    key, value = env_vars.item_at(selected)
     new_value = full_screen_edit(value)
-    env_vars[key] = new_value
-    os.environ.update(env_vars)
+    get_journal().set(key, new_value)
     return True
 
 
+# listing caches by name, kept loaded for the life of the process (which is
+# what keeps them warm in the daemon)
+LISTING_CACHES = {}
+
+
+def _shared_listing_cache(name: str, scanner=None):
+    cache = LISTING_CACHES.get(name)
+    if cache is None:
+        cache = LISTING_CACHES[name] = ListingCache(name, scanner=scanner)
+    return cache
+
+
+def get_listing_cache(no_cache: bool = False):
+    """
+    Get the on-disk listing cache used by the PATH scanning commands.
+    :param no_cache: bypass the cache
+    :return: ListingCache, or None
+    """
+    if no_cache:
+        return None
+    return _shared_listing_cache("executables")
+
+
+def get_library_cache(no_cache: bool = False):
+    """
+    Get the on-disk cache of shared library listings.
+    :param no_cache: bypass the cache
+    :return: ListingCache, or None
+    """
+    if no_cache:
+        return None
+    return _shared_listing_cache("libraries", scanner=scan_libraries)
+
+
 def find_executables(mypath: str):
-    if not os.path.exists(mypath):
-        return []
-    onlyfiles = [
-        f
-        for f in listdir(mypath)
-        if isfile(join(mypath, f)) and os.access(join(mypath, f), os.X_OK)
-    ]
-    return onlyfiles
+    """
+    List the executable files in a directory.
+    :param mypath:
+    :return: list of file names
+    """
+    with profiling.span("find_executables", "scan"):
+        return scan_executables(mypath)
 
 
-def edit_ipv4(selected):
+def edit_validated(selected, vartype, screen=None):
     """
-    Edit the environment variable.
+    Edit the environment variable, accepting only values of its type.
     :param selected:
+    :param vartype: VarType from the type registry
+    :param screen: Screen to clear first, if any
     :return:
     """
-    # clear the current value of the enviroment variable
-    os.system(CLEAR_COMMAND)
+    if screen is not None:
+        screen.clear()
     env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    key = env_list[selected][0]
-    value = env_list[selected][1]
+    key, value = env_vars.item_at(selected)
     print(
         f"{BColors.OKGREEN}Current value: {BColors.ENDC}\n{BColors.OKBLUE}{value}{BColors.ENDC}"
     )
     print(
-        f"{BColors.OKGREEN}Suggested type: {BColors.ENDC}\n{BColors.FAIL}IPV4{BColors.ENDC}"
+        f"{BColors.OKGREEN}Suggested type: {BColors.ENDC}\n{BColors.FAIL}{vartype.label}{BColors.ENDC}"
     )
     new_value = input(f"{BColors.OKGREEN}New value: \n{BColors.ENDC}")
-    if check_ipv4(new_value):
-        env_vars[key] = new_value
-        os.environ.update(env_vars)
+    if vartype.check(new_value):
+        get_journal().set(key, new_value)
         return selected
     else:
-        print(f"{BColors.FAIL}Invalid IPv4 address.{BColors.ENDC}")
+        print(f"{BColors.FAIL}{vartype.error}{BColors.ENDC}")
         return selected
 
 
+def edit_ipv4(selected):
+    """
+    Edit the environment variable.
+    :param selected:
+    :return:
+    """
+    return edit_validated(selected, get_type("ipv4"))
+
+
 def edit_ipv6(selected):
     """
     Edit the environment variables
     :param selected:
     :return:
     """
-    os.system(CLEAR_COMMAND)
-    env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    key = env_list[selected][0]
-    value = env_list[selected][1]
-    print(
-        f"{BColors.OKGREEN}Current value: {BColors.ENDC}\n{BColors.OKBLUE}{value}{BColors.ENDC}"
-    )
-    print(
-        f"{BColors.OKGREEN}Suggested type: {BColors.ENDC}\n{BColors.FAIL}IPV6{BColors.ENDC}"
-    )
-    new_value = input(f"{BColors.OKGREEN}New value: \n{BColors.ENDC}")
-    if check_ipv6(new_value):
-        env_vars[key] = new_value
-        os.environ.update(env_vars)
-        return selected
-    else:
-        print(f"{BColors.FAIL}Invalid IPv6 address.{BColors.ENDC}")
-        return selected
+    return edit_validated(selected, get_type("ipv6"))
 
 
 def edit_path(selected):
@@ -359,37 +355,41 @@ def edit_path(selected):
     :param selected:
     :return:
     """
-    os.system(CLEAR_COMMAND)
-    env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    key = env_list[selected][0]
-    value = env_list[selected][1]
-    print(
-        f"{BColors.OKGREEN}Current value: {BColors.ENDC}\n{BColors.OKBLUE}{value}{BColors.ENDC}"
-    )
-    print(
-        f"{BColors.OKGREEN}Suggested type: {BColors.ENDC}\n{BColors.FAIL}PATH{BColors.ENDC}"
-    )
-    new_value = input(f"{BColors.OKGREEN}New value: \n{BColors.ENDC}")
-    if check_path(new_value):
-        env_vars[key] = new_value
-        os.environ.update(env_vars)
-        return selected
-    else:
-        print(f"{BColors.FAIL}Invalid path.{BColors.ENDC}")
-        return selected
+    return edit_validated(selected, get_type("path"))
+
+
+# keep the editor responsive when an entry sits on a hung mount
+EDITOR_HEALTH_TIMEOUT = 0.5
+
+PATH_GROUP_HEADER = [
+    f"{BColors.OKGREEN}Current value: {BColors.ENDC}",
+    'Move with "ws" or "jk". Add to rear with "a". Add to front with "A". Change order with "-=".',
+    'Edit path with "e". Remove path with "r". Quit with "q".',
+]
 
 
-def print_path_list(path_list, position=0, selected=0):
+HEALTH_COLUMN_WIDTH = 18
+HEALTH_COLORS = {
+    "ok": "green",
+    "slow": "yellow",
+    "missing": "red",
+    "not-a-dir": "red",
+    "unreadable": "red",
+}
+
+
+def format_path_list(path_list, columns, rows, position=0, selected=0, health=None):
     """
-    Print the list of paths
+    Render the list of paths into lines.
     :param path_list:
+    :param columns: terminal width
+    :param rows: terminal height
     :param position:
     :param selected:
-    :return:
+    :param health: dict mapping entry to (status, latency), shown after it
+    :return: (lines, position, selected)
     """
     # return the position of the selected rows
-    columns, rows = os.get_terminal_size()
     rows = int(rows) - 3  # 3 for the header
     columns = int(columns)
 
@@ -406,217 +406,718 @@ def print_path_list(path_list, position=0, selected=0):
         position_bound = selected
         position = position_bound - rows + 1
 
+    width = columns
+    if health is not None and columns > 2 * HEALTH_COLUMN_WIDTH:
+        width = columns - HEALTH_COLUMN_WIDTH - 1
+    lines = []
     for index in range(position, min(len(path_list), position_bound + 1)):
-        if index == selected:
-            cprint(compress_str(path_list[index], columns), "red")
-        else:
-            cprint(compress_str(path_list[index], columns), "yellow")
+        entry = path_list[index]
+        color = "red" if index == selected else "yellow"
+        line = colored(compress_str(entry, width), color)
+        if width < columns and entry in health:
+            status, latency = health[entry]
+            tag = compress_str(describe_health(status, latency), HEALTH_COLUMN_WIDTH)
+            line += " " + colored(tag, HEALTH_COLORS[status])
+        lines.append(line)
 
+    return lines, position, selected
+
+
+def print_path_list(
+    path_list, position=0, selected=0, screen=None, status=None, health=None
+):
+    """
+    Print the list of paths
+    :param path_list:
+    :param position:
+    :param selected:
+    :param screen: Screen to draw on (below the header), print if not given
+    :param status: line shown below the list
+    :param health: dict mapping entry to (status, latency), see `check_entries`
+    :return:
+    """
+    with profiling.span("render.path_list", "render"):
+        if screen is None:
+            columns, rows = os.get_terminal_size()
+        else:
+            columns, rows = screen.size()
+        if status is not None:
+            rows -= 1
+        lines, position, selected = format_path_list(
+            path_list, columns, rows, position, selected, health
+        )
+        if status is not None:
+            lines.append(compress_str(status, columns).rstrip())
+        if screen is None:
+            print("\n".join(lines))
+        else:
+            screen.draw(PATH_GROUP_HEADER + lines)
     return position, selected
 
 
-def edit_path_group(selected):
+def responsive_entries(path_list, health):
+    """
+    Drop the entries whose health check timed out.
+    :param path_list:
+    :param health: dict mapping entry to (status, latency)
+    :return: list of entries
+    """
+    return [entry for entry in path_list if health.get(entry, ("ok", 0))[1] is not None]
+
+
+def format_resolution_changes(changes):
+    """
+    Summarize which commands resolve to another directory.
+    :param changes: dict from `ExecutableIndex.resolution_changes`
+    :return: one line, or None if nothing changes
+    """
+    if not changes:
+        return None
+    parts = []
+    for name in sorted(changes):
+        _old, new = changes[name]
+        parts.append(f"{name} -> {new if new is not None else '(not found)'}")
+    return f"{len(changes)} commands resolve differently: " + ", ".join(parts)
+
+
+def edit_path_group(selected, watch=False):
     """
     Edit the environment variables
     :param selected:
+    :param watch: poll the entries between keypresses and refresh their
+    health and the command resolution as they change
     :return:
     """
     env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    key = env_list[selected][0]
-    value = env_list[selected][1]
+    key, value = env_vars.item_at(selected)
     selected_path_index = 0
     path_position = 0
     path_list = value.split(PATH_SEPARATOR)
+    # previous states of path_list, for "u" and Ctrl-R
+    undo_stack = []
+    redo_stack = []
+    health = check_entries(path_list, timeout=EDITOR_HEALTH_TIMEOUT)
+    # for PATH, show live which commands would resolve differently; entries
+    # that did not answer in time are never scanned
+    original_index = None
+    cache = None
+    if key.upper() == "PATH":
+        cache = get_listing_cache()
+        original_index = ExecutableIndex.build(
+            responsive_entries(path_list, health), cache=cache
+        )
+    status = None
+    indexed_list = list(path_list)
+    # hung entries are never watched, a stat on them would block the loop
+    watcher = DirectoryWatcher(responsive_entries(path_list, health)) if watch else None
 
-    os.system(CLEAR_COMMAND)
-    print(f"{BColors.OKGREEN}Current value: {BColors.ENDC}")
-    print(
-        'Move with "ws" or "jk". Add to rear with "a". Add to front with "A". Change order with "-=".'
-    )
-    print('Edit path with "e". Remove path with "r". Quit with "q".')
-    print_path_list(path_list)
-
-    while info := get_char():
-        if info == "q":
-            break
-        elif info == "s" or info == "j":
-            selected_path_index += 1
-        elif info == "w" or info == "k":
-            selected_path_index -= 1
-        elif info == "a":
-            new_path = full_screen_edit("")
-            new_path = new_path.translate({ord(c): None for c in " \n\t\r"})
-            if check_path(new_path):
-                path_list.append(new_path)
-        elif info == "A":
-            new_path = full_screen_edit("")
-            new_path = new_path.translate({ord(c): None for c in " \n\t\r"})
-            if check_path(new_path):
-                path_list.insert(0, new_path)
-            selected_path_index += 1
-        elif info == "+" or info == "=":
-            if selected_path_index < len(path_list) - 1:
+    count = ""
+    with Screen() as screen:
+        keys = screen.keys
+        print_path_list(path_list, screen=screen, health=health)
+
+        while True:
+            info = keys.read_key(WATCH_INTERVAL if watcher is not None else None)
+            if info is None:
+                if watcher is None or keys.closed:
+                    break
+                changed = watcher.poll()
+                if not changed:
+                    continue
+                health.update(check_entries(changed, timeout=EDITOR_HEALTH_TIMEOUT))
+                if original_index is not None:
+                    original_index.update(
+                        scan_directories(changed, scanner=cache.listing)
+                    )
+                    cache.save()
+                    # the listings changed under the same entries
+                    indexed_list = None
+            elif info.isdigit() and (count or info != "0"):
+                # vi-style count prefix, e.g. "5j"
+                count += info
+                continue
+            repeat = int(count or 1)
+            if info is not None:
+                count = ""
+            page = max(1, screen.size()[1] - len(PATH_GROUP_HEADER) - 2)
+            if info in ("a", "A", "+", "=", "-", "r", "e"):
+                undo_stack.append(list(path_list))
+                redo_stack.clear()
+            if info == "q":
+                break
+            elif info == "u":
+                if undo_stack:
+                    redo_stack.append(path_list)
+                    path_list = undo_stack.pop()
+            elif info == "\x12":
+                if redo_stack:
+                    undo_stack.append(path_list)
+                    path_list = redo_stack.pop()
+            elif info in ("s", "j", "down"):
+                selected_path_index += repeat
+            elif info in ("w", "k", "up"):
+                selected_path_index -= repeat
+            elif info == "page_down":
+                selected_path_index += repeat * page
+            elif info == "page_up":
+                selected_path_index -= repeat * page
+            elif info == "home":
+                selected_path_index = 0
+            elif info == "end":
+                selected_path_index = len(path_list) - 1
+            elif info == "a":
+                with screen.suspend():
+                    new_path = full_screen_edit("")
+                new_path = new_path.translate({ord(c): None for c in " \n\t\r"})
+                if check_path(new_path):
+                    path_list.append(new_path)
+            elif info == "A":
+                with screen.suspend():
+                    new_path = full_screen_edit("")
+                new_path = new_path.translate({ord(c): None for c in " \n\t\r"})
+                if check_path(new_path):
+                    path_list.insert(0, new_path)
                 selected_path_index += 1
-                path_list[selected_path_index], path_list[selected_path_index - 1] = (
-                    path_list[selected_path_index - 1],
-                    path_list[selected_path_index],
-                )
-        elif info == "-":
-            if selected_path_index > 0:
-                selected_path_index -= 1
-                path_list[selected_path_index], path_list[selected_path_index + 1] = (
-                    path_list[selected_path_index + 1],
-                    path_list[selected_path_index],
+            elif info == "+" or info == "=":
+                if selected_path_index < len(path_list) - 1:
+                    selected_path_index += 1
+                    (
+                        path_list[selected_path_index],
+                        path_list[selected_path_index - 1],
+                    ) = (
+                        path_list[selected_path_index - 1],
+                        path_list[selected_path_index],
+                    )
+            elif info == "-":
+                if selected_path_index > 0:
+                    selected_path_index -= 1
+                    (
+                        path_list[selected_path_index],
+                        path_list[selected_path_index + 1],
+                    ) = (
+                        path_list[selected_path_index + 1],
+                        path_list[selected_path_index],
+                    )
+            elif info == "r":
+                if len(path_list) >= 1:
+                    path_list.pop(selected_path_index)
+            elif info == "e":
+                with screen.suspend():
+                    new_path = full_screen_edit(path_list[selected_path_index])
+                path_list[selected_path_index] = new_path
+
+            selected_path_index = max(0, min(selected_path_index, len(path_list) - 1))
+            if keys.pending():
+                # only draw the state after the last key already typed
+                continue
+            unchecked = [entry for entry in path_list if entry not in health]
+            if unchecked:
+                health.update(check_entries(unchecked, timeout=EDITOR_HEALTH_TIMEOUT))
+            if watcher is not None:
+                watcher.add(responsive_entries(path_list, health))
+            if original_index is not None and path_list != indexed_list:
+                indexed_list = list(path_list)
+                changes = original_index.resolution_changes(
+                    original_index.reorder(responsive_entries(path_list, health))
                 )
-        elif info == "r":
-            if len(path_list) >= 1:
-                path_list.pop(selected_path_index)
-        elif info == "e":
-            new_path = full_screen_edit(path_list[selected_path_index])
-            path_list[selected_path_index] = new_path
-
-        os.system(CLEAR_COMMAND)
-        print(f"{BColors.OKGREEN}Current value: {BColors.ENDC}")
-        print(
-            'Move with "ws" or "jk". Add to rear with "a". Add to front with "A". Change order with "-=".'
-        )
-        print('Edit path with "e". Remove path with "r". Quit with "q".')
-        path_position, selected_path_index = print_path_list(
-            path_list=path_list, position=path_position, selected=selected_path_index
-        )  # print the list
+                status = format_resolution_changes(changes)
+            path_position, selected_path_index = print_path_list(
+                path_list=path_list,
+                position=path_position,
+                selected=selected_path_index,
+                screen=screen,
+                status=status,
+                health=health,
+            )  # draw the list
     new_path_group = PATH_SEPARATOR.join(path_list)
     print(new_path_group)
-    env_vars[key] = new_path_group
-    os.environ.update(env_vars)
+    get_journal().set(key, new_path_group)
 
 
-def intelligent_edit_mode(selected):
+def intelligent_edit_mode(selected, watch=False, screen=None):
     """
     Intelligent edit mode.
     :param selected:
+    :param watch: keep the path group editor live, see `edit_path_group`
+    :param screen: Screen the editor for the type clears, if any; the path
+    group editor draws its own
     :return:
     """
-    os.system(CLEAR_COMMAND)
-    env_vars = get_environment_vars()
-    env_list = list(env_vars.items())
-    value = env_list[selected][1]
+    value = get_environment_vars().value_at(selected)
     vartype = recognize_type(value)
     if vartype == "undefined":
-        edit_mode(selected)
-    elif vartype == "ipv4":
-        edit_ipv4(selected)
-    elif vartype == "ipv6":
-        edit_ipv6(selected)
-    elif vartype == "path":
-        edit_path(selected)
+        edit_mode(selected, screen)
     elif vartype == "path_group":
-        edit_path_group(selected)
+        edit_path_group(selected, watch)
+    else:
+        edit_validated(selected, get_type(vartype), screen)
 
 
 @command("getall")
-def getall():
+@argument("types", description="show the recognized type of each value", type=bool)
+@argument("pid", description="show the environment of another process", type=int)
+def getall(types: bool = False, pid: int = 0):
     """
     Get all environment variables.
     """
-    env_dict = get_environment_vars()
+    env_dict = get_environment_vars() if not pid else get_process_vars(pid)
+    if env_dict is None:
+        return 1
+    var_types = classify_all(env_dict) if types else None
     for key, value in env_dict.items():
         cprint(key, "green", end="")
+        if var_types is not None:
+            cprint(f" ({var_types[key]})", "blue", end="")
         cprint(" = ", "red", end="")
         cprint(value, "yellow", end="\n")
     return 0
 
 
+def get_process_vars(pid: int):
+    """
+    Get a read-only snapshot of another process's environment.
+    :param pid:
+    :return: EnvStore, or None (after printing why) if it cannot be read
+    """
+    if not proc_supported():
+        print("Reading other processes' environments needs /proc.")
+        return None
+    raw = read_environ_raw(pid)
+    if raw is None:
+        print(f"Cannot read the environment of process {pid}.")
+        return None
+    return EnvStore(RawEnviron(raw))
+
+
+def get_search_index(search_indexes, env_vars, include_values=False):
+    """
+    Get a search index of the environment, refreshed when it changed.
+    :param search_indexes: cache of indexes, one per mode
+    :param env_vars: EnvStore
+    :param include_values: index values as well as names
+    :return: SearchIndex
+    """
+    index = search_indexes.get(include_values)
+    if index is None:
+        index = SearchIndex(env_vars, include_values=include_values)
+        search_indexes[include_values] = index
+    else:
+        index.refresh(env_vars)
+    return index
+
+
 @command("edit")
-def select():
+@argument("pid", description="browse the environment of another process", type=int)
+@argument("watch", description="keep the path group editor live", type=bool)
+def select(pid: int = 0, watch: bool = False):
     """
     Select environment variables.
-    Move with "ws" or "jk" keys.
+    Move with "ws", "jk", the arrow keys or PageUp/PageDown, with an
+    optional count like "50j".
     Edit with "e"
-    Goto with "g", "G" or ":[number]"
-    Search with "/" and move with "nN"
+    Goto with "g", "G", "[number]G" or ":[number]"
+    Search as you type with "/" (Tab searches values too) and move with "nN"
+    Find the variables referencing a path or prefix with "r"
+    Undo with "u" and redo with Ctrl-R
     quit with "q"
+    With --pid, another process's environment is shown read-only.
+    With --watch, the path group editor follows changes to its directories.
     """
-    os.system(CLEAR_COMMAND)
+    env_vars = get_environment_vars() if not pid else get_process_vars(pid)
+    if env_vars is None:
+        return 1
+    read_only = bool(pid)
     position = 0
     selected = 0
-    print_env_list()
     search_list = []
     search_index = 0
-    while info := get_char():
-        if info == "s" or info == "j":
-            # move down
-            selected += 1
-        elif info == "w" or info == "k":
-            # move up
-            selected -= 1
-        elif info == "q":
-            # quit
-            break
-        elif info == "g":
-            # move to the beginning
-            selected = 0
-        elif info == "G":
-            # move to the end
-            selected = len(get_environment_vars()) - 1
-        elif info == ":":
-            # move to a specific line
-            move_postion = int(input())
-            if move_postion < 0:
-                move_postion = 0
-            if move_postion > len(get_environment_vars()):
-                move_postion = len(get_environment_vars())
-            selected = move_postion
-        elif info == "/":
-            # search
-            search_str = input()
-            found_flag = False
-            for index, (key, _value) in enumerate(get_environment_vars().items()):
-                if search_str.lower() in key.lower():
-                    selected = index
-                    search_list.append(index)
-                    found_flag = True
-            if found_flag:
+    search_indexes = {}
+    count = ""
+    with Screen() as screen:
+        keys = screen.keys
+        print_env_list(screen=screen, env_vars=env_vars)
+        while info := keys.read_key():
+            if info.isdigit() and (count or info != "0"):
+                # vi-style count prefix, e.g. "50j"
+                count += info
+                continue
+            counted = bool(count)
+            repeat = int(count or 1)
+            count = ""
+            # rows of the table, see format_env_list
+            page = max(1, screen.size()[1] - 6)
+            if info in ("s", "j", "down"):
+                # move down
+                selected += repeat
+            elif info in ("w", "k", "up"):
+                # move up
+                selected -= repeat
+            elif info == "page_down":
+                selected += repeat * page
+            elif info == "page_up":
+                selected -= repeat * page
+            elif info == "q":
+                # quit
+                break
+            elif info in ("g", "home"):
+                # move to the beginning
+                selected = 0
+            elif info in ("G", "end"):
+                # move to the end, or to the position given as a count
+                selected = repeat if counted else len(env_vars) - 1
+            elif info == ":":
+                # move to a specific line
+                with suppress(ValueError):
+                    selected = int(screen.prompt(":"))
+            elif info == "/":
+                # incremental search, Tab toggles searching values too
+                query = ""
+                include_values = False
+                origin = selected
+                search = IncrementalSearch(
+                    get_search_index(search_indexes, env_vars, include_values),
+                    visible=page,
+                )
+                while True:
+                    label = "/" if not include_values else "/(values) "
+                    if not keys.pending():
+                        position, selected = print_env_list(
+                            position=position,
+                            selected=selected,
+                            screen=screen,
+                            status=label + query,
+                            env_vars=env_vars,
+                        )
+                    key = keys.read_key()
+                    if key is None or key in ("\r", "\n"):
+                        break
+                    if key == "\x1b":
+                        selected = origin
+                        search_list = []
+                        break
+                    if key in ("\x7f", "\x08"):
+                        query = query[:-1]
+                    elif key == "\t":
+                        include_values = not include_values
+                        search = IncrementalSearch(
+                            get_search_index(search_indexes, env_vars, include_values),
+                            visible=page,
+                        )
+                    elif len(key) == 1:
+                        query += key
+                    search_list = search.update(query)
+                    search_index = 0
+                    selected = search_list[0] if search_list else origin
+            elif info == "r":
+                # variables referencing a path, walked with n / N like a search
+                prefix = screen.prompt("refs: ").strip()
+                search_list = [
+                    env_vars.index_of(name)
+                    for name in get_path_refs(env_vars).variables(prefix)
+                ]
                 search_index = 0
-                selected = search_list[0]
-        elif info == "n":
-            # search next
-            if search_index < len(search_list) - 1:
-                search_index += 1
-                selected = search_list[search_index]
-        elif info == "N":
-            # search previous
-            if search_index > 0:
-                search_index -= 1
-                selected = search_list[search_index]
-        elif info == "e":
-            edit_mode(selected)
-        elif info == "i":
-            intelligent_edit_mode(selected)
-
-        os.system(CLEAR_COMMAND)
-        position, selected = print_env_list(position=position, selected=selected)
+                if search_list:
+                    selected = search_list[0]
+                    status = f"{len(search_list)} variables reference {prefix}"
+                else:
+                    status = f"No variable references {prefix}"
+                position, selected = print_env_list(
+                    position=position,
+                    selected=selected,
+                    screen=screen,
+                    status=status,
+                    env_vars=env_vars,
+                )
+                continue
+            elif info == "n":
+                # search next
+                if search_index < len(search_list) - 1:
+                    search_index += 1
+                    selected = search_list[search_index]
+            elif info == "N":
+                # search previous
+                if search_index > 0:
+                    search_index -= 1
+                    selected = search_list[search_index]
+            elif info == "e" and not read_only:
+                with screen.suspend():
+                    edit_mode(selected, screen)
+            elif info == "i" and not read_only:
+                with screen.suspend():
+                    intelligent_edit_mode(selected, watch, screen)
+            elif info in ("u", "\x12") and not read_only:
+                # undo / redo (Ctrl-R), jump to the first variable it touched
+                journal = get_journal()
+                entry = journal.undo() if info == "u" else journal.redo()
+                if entry:
+                    found = env_vars.index_of(entry[0][0])
+                    selected = found if found >= 0 else selected
+                    verb = "Undid" if info == "u" else "Redid"
+                    if len(entry) == 1:
+                        status = f"{verb} the change to {entry[0][0]}"
+                    else:
+                        status = f"{verb} {len(entry)} changes"
+                else:
+                    status = "Nothing to undo" if info == "u" else "Nothing to redo"
+                position, selected = print_env_list(
+                    position=position,
+                    selected=selected,
+                    screen=screen,
+                    status=status,
+                    env_vars=env_vars,
+                )
+                continue
 
-    os.system(CLEAR_COMMAND)
+            selected = max(0, min(selected, len(env_vars) - 1))
+            if keys.pending():
+                # only draw the state after the last key already typed
+                continue
+            position, selected = print_env_list(
+                position=position, selected=selected, screen=screen, env_vars=env_vars
+            )
 
 
 @command("save")
-def save():
+@argument(
+    "fmt", name="format", description="export format", choices=list(EXPORT_FORMATS)
+)
+@argument("patterns", name="filter", description="glob patterns of the names to save")
+@argument(
+    "output", description='file to write, "-" for stdout', aliases=["o"], type=str
+)
+def save(
+    fmt: str = DEFAULT_FORMAT,
+    patterns: Optional[List[str]] = None,
+    output: str = SAVE_FILE,
+):
     """
     Save environment variables.
+    Values are quoted for the chosen format; files are replaced atomically.
     """
-    filename = input("Save file name: (Default: " + SAVE_FILE + ")\n").strip()
-    if filename == "":
-        filename = SAVE_FILE
-    if os.path.exists(filename):
-        print("File already exists. Overwrite? ([y]/n)")
-        flag = input().strip().lower()
-        if flag == "n":
-            return 0
+    items = filter_items(get_environment_vars().items(), patterns)
+    if output == "-":
+        stream = export_stream()
+        write_export(stream, items, fmt)
+        stream.flush()
+        return 0
+    with atomic_open(output, "w", encoding="utf-8", newline="\n") as f:
+        write_export(f, items, fmt)
+    return 0
+
+
+@command("snapshot")
+@argument(
+    "action",
+    description="save, list, diff or delete",
+    positional=True,
+    choices=["save", "list", "diff", "delete"],
+)
+@argument(
+    "names",
+    description="snapshot names, diff against the current environment if only one",
+    positional=True,
+)
+def snapshot(action: str, names: Optional[List[str]] = None):
+    """
+    Save, list, compare and delete environment snapshots.
+    """
+    names = names or []
+    store = SnapshotStore()
+    env_vars = get_environment_vars()
+    try:
+        if action == "save":
+            name = names[0] if names else time.strftime("%Y%m%d-%H%M%S")
+            store.save(name, env_vars.items())
+            print(f"Saved snapshot {BColors.OKBLUE}{name}{BColors.ENDC}.")
+        elif action == "list":
+            for name, mtime in store.list():
+                created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(mtime))
+                print(f"{created}  {name}")
+        elif action == "delete":
+            for name in names:
+                if not store.delete(name):
+                    print(f"No snapshot named {name}.")
+        elif action == "diff":
+            if not 1 <= len(names) <= 2:
+                print("diff takes one or two snapshot names.")
+                return 1
+            old = store.load(names[0])
+            if len(names) == 2:
+                new = store.load(names[1])
+            else:
+                new = Snapshot.from_items("current", env_vars.items())
+            print_snapshot_diff(old, new)
+    except KeyError as error:
+        print(f"No snapshot named {error.args[0]}.")
+        return 1
+    except ValueError as error:
+        print(error)
+        return 1
+    return 0
+
+
+def print_snapshot_diff(old, new):
+    """
+    Print the variables added, removed and changed between two snapshots.
+    :param old: Snapshot
+    :param new: Snapshot
+    :return:
+    """
+    added, removed, changed = diff_snapshots(old, new)
+    for name in added:
+        print(f"{BColors.OKGREEN}+ {name}={new.value(name)}{BColors.ENDC}")
+    for name in removed:
+        print(f"{BColors.FAIL}- {name}{BColors.ENDC}")
+    for name in changed:
+        old_value = old.value(name)
+        new_value = new.value(name)
+        print(f"{BColors.WARNING}~ {name}{BColors.ENDC}")
+        if "path_group" in (recognize_type(old_value), recognize_type(new_value)):
+            for op, element in diff_path_group(old_value, new_value, PATH_SEPARATOR):
+                color = BColors.OKGREEN if op == "+" else BColors.FAIL
+                print(f"    {color}{op} {element}{BColors.ENDC}")
+        else:
+            print(f"    {BColors.FAIL}- {old_value}{BColors.ENDC}")
+            print(f"    {BColors.OKGREEN}+ {new_value}{BColors.ENDC}")
+    if not (added or removed or changed):
+        print("No differences.")
+
+
+@command("load")
+@argument(
+    "filename", description='export file to apply, "-" for stdin', positional=True
+)
+@argument(
+    "fmt",
+    name="format",
+    description="file format, guessed from the file if not given",
+    choices=["auto", *IMPORT_FORMATS],
+)
+@argument(
+    "check_types",
+    description="reject values that do not match the type of the current value",
+    type=bool,
+)
+@argument("dry_run", description="only report what would change", type=bool)
+def load(
+    filename: str,
+    fmt: str = "auto",
+    check_types: bool = False,
+    dry_run: bool = False,
+):
+    """
+    Apply a file written by save (sh, dotenv, ps1 or JSON) in one go.
+    Every entry is validated first; nothing is applied if any entry fails.
+    """
+    env_vars = get_environment_vars()
+    try:
+        if filename == "-":
+            entries = read_env_file(sys.stdin, "-", fmt)
+        else:
+            with open(filename, encoding="utf-8", newline="") as f:
+                entries = read_env_file(f, filename, fmt)
+    except (OSError, ValueError) as error:
+        print(f"{BColors.FAIL}{error}{BColors.ENDC}")
+        return 1
+
+    errors = validate_entries(entries, env_vars, check_types)
+    if errors:
+        for error in errors:
+            print(f"{BColors.FAIL}{error}{BColors.ENDC}")
+        print(f"{len(errors)} invalid entries, nothing was applied.")
+        return 1
+
+    changes = {
+        name: value for name, value in entries.items() if env_vars.get(name) != value
+    }
+    if dry_run:
+        changed = [(name, env_vars.get(name), value) for name, value in changes.items()]
+    else:
+        changed = get_journal().apply(changes)
+    for name, old, _value in changed:
+        if old is None:
+            print(f"{BColors.OKGREEN}+ {name}{BColors.ENDC}")
+        else:
+            print(f"{BColors.WARNING}~ {name}{BColors.ENDC}")
+    verb = "Would apply" if dry_run else "Applied"
+    print(f"{verb} {len(changed)} changes, {len(entries) - len(changed)} unchanged.")
+    return 0
+
 
-    with open(filename, "w") as f:
-        for key, value in get_environment_vars().items():
-            f.write(SCRIPT_PATTERN.format(key, value))
+def read_env_file(stream, filename: str, fmt: str = "auto"):
+    """
+    Read every entry of an export file.
+    :param stream: readable text stream
+    :param filename: used to guess the format
+    :param fmt: format, or "auto"
+    :return: dict mapping name to value, later entries win
+    """
+    fmt, lines = open_export(stream, filename, fmt)
+    return dict(read_export(lines, fmt))
+
+
+def validate_entries(entries, env_vars, check_types: bool = False):
+    """
+    Check that entries can be applied to the environment.
+    :param entries: dict mapping name to value
+    :param env_vars: EnvStore
+    :param check_types: require values of the same type as the current ones
+    :return: list of error messages
+    """
+    errors = []
+    for name, value in entries.items():
+        if not name or "=" in name or "\0" in name:
+            errors.append(f"{name!r}: invalid variable name")
+            continue
+        if "\0" in value:
+            errors.append(f"{name}: value contains a NUL character")
+            continue
+        current = env_vars.get(name)
+        if not check_types or current is None:
+            continue
+        vartype = get_type(recognize_type(current))
+        if vartype is not None and not vartype.check(value):
+            errors.append(f"{name}: {vartype.error} Expected {vartype.label}.")
+    return errors
+
+
+@command("ps")
+@argument(
+    "queries",
+    description='"NAME" (set), "NAME=VALUE" or "NAME~TEXT" (value contains TEXT)',
+    positional=True,
+)
+def ps(queries: List[str]):
+    """
+    Find the processes whose environment matches every query.
+    e.g. "ps LD_PRELOAD" or "ps PATH~/opt/x"
+    """
+    if not proc_supported():
+        print("Reading other processes' environments needs /proc.")
+        return 1
+    parsed = [parse_query(query) for query in queries]
+
+    def predicate(raw):
+        values = []
+        for _name, match in parsed:
+            value = match(raw)
+            if value is None:
+                return None
+            values.append(value)
+        return values
+
+    matches, unreadable = scan_processes(predicate)
+    for pid, values in matches:
+        cprint(f"{pid:>7} ", "green", end="")
+        cprint(f"{read_comm(pid):<16}", "yellow", end="")
+        for (name, _match), value in zip(parsed, values):
+            cprint(f" {name}=", "red", end="")
+            cprint(fit(value, 60).rstrip(), "yellow", end="")
+        print()
+    print(f"{len(matches)} matching processes.", end="")
+    if unreadable:
+        print(f" {unreadable} processes could not be read.", end="")
+    print()
     return 0
 
 
@@ -626,18 +1127,173 @@ def setenv(name: str, value: str):
     """
     Set environment variable.
     """
-    os.environ[name] = value
+    get_journal().set(name, value)
     return 0
 
 
+@command("delta")
+@argument(
+    "fmt", name="format", description="script format", choices=list(DELTA_FORMATS)
+)
+@argument("clear", description="forget the changes once printed", type=bool)
+def delta(fmt: str = DEFAULT_FORMAT, clear: bool = False):
+    """
+    Print the changes made through enview as a script for the parent shell,
+    e.g. eval "$(enview delta --clear)". Only variables that differ from the
+    current environment are set or unset.
+    """
+    journal = get_journal()
+    changes = journal.pending_changes()
+    stream = export_stream()
+    stream.write("".join(delta_lines(changes, fmt)))
+    stream.flush()
+    if clear:
+        journal.clear_pending()
+    return 0
+
+
+@command("which")
+@argument("names", description="command names", positional=True)
+@argument("show_all", name="all", description="list shadowed copies too", type=bool)
+@argument("varname", description="path group to search", type=str)
+@argument("no_cache", description="rescan every directory", type=bool)
+def which(
+    names: List[str],
+    show_all: bool = False,
+    varname: str = "PATH",
+    no_cache: bool = False,
+):
+    """
+    Show the file each command runs, like the shell's PATH lookup.
+    All names are resolved from one scan of the path group.
+    """
+    value = get_environment_vars().get(varname)
+    if value is None:
+        print(f"{varname} is not in the environment variables.")
+        return 1
+    exe_index = ExecutableIndex.build(
+        value.split(PATH_SEPARATOR), cache=get_listing_cache(no_cache)
+    )
+    missing = 0
+    for name in names:
+        if os.sep in name or (os.altsep and os.altsep in name):
+            # the shell runs names with a separator as they are
+            found = os.path.isfile(name) and os.access(name, os.X_OK)
+            paths = [name] if found else []
+        else:
+            providers = exe_index.providers.get(name, [])
+            if not show_all:
+                providers = providers[:1]
+            paths = [
+                os.path.join(directory or os.curdir, name) for directory in providers
+            ]
+        if not paths:
+            missing += 1
+            print(f"{name} not found", file=sys.stderr)
+        # plain lines, so scripts can use the output
+        for path in paths:
+            print(path)
+    return 1 if missing else 0
+
+
+@command("refs")
+@argument("prefix", description="path, or prefix of paths", positional=True, type=str)
+@argument("replace", description="rewrite the prefix to this path")
+def refs(prefix: str, replace: Optional[str] = None):
+    """
+    Show which variables reference a path or anything under it, e.g.
+    `enview refs /opt/cuda-11`, with the position of each entry.
+    With --replace, rewrite that prefix in every variable at once.
+    """
+    env_vars = get_environment_vars()
+    path_refs = get_path_refs(env_vars)
+    found = path_refs.lookup(prefix)
+    if not found:
+        print(f"No variable references {prefix}.")
+        return 1
+    if replace is None:
+        for name, position, entry in found:
+            cprint(name, "green", end="")
+            print(f"[{position}] {entry}")
+        return 0
+    changes = path_refs.rewrite(env_vars, prefix, replace)
+    for name, value in changes.items():
+        cprint(name, "green", end="")
+        print(f" = {value}")
+    # one undo step for every variable
+    get_journal().apply(changes)
+    return 0
+
+
+@command("health")
+@argument(
+    "varname", description="the variable to be checked", positional=True, type=str
+)
+@argument(
+    "all_groups", name="all", description="check every path group variable", type=bool
+)
+@argument("timeout", description="seconds to wait for each entry", type=float)
+def health(
+    varname: str = "PATH", all_groups: bool = False, timeout: float = HEALTH_TIMEOUT
+):
+    """
+    Check that every entry of a path group is a readable directory that
+    answers quickly. Entries are checked concurrently, and an entry on a
+    hung mount is reported after the timeout instead of blocking.
+    """
+    env_dict = get_environment_vars()
+    if all_groups:
+        varnames = [
+            name
+            for name, value in env_dict.items()
+            if recognize_type(value) == "path_group"
+        ]
+    else:
+        if varname not in env_dict:
+            print(f"{varname} is not in the environment variables.")
+            return 1
+        varnames = [varname]
+
+    entries = {name: env_dict[name].split(PATH_SEPARATOR) for name in varnames}
+    # one pool for every variable, shared entries are checked once
+    results = check_entries(
+        [entry for group in entries.values() for entry in group], timeout=timeout
+    )
+    problems = 0
+    for name, group in entries.items():
+        print(f"{BColors.OKGREEN}{name}{BColors.ENDC}")
+        for entry in group:
+            status, latency = results[entry]
+            if status != "ok":
+                problems += 1
+            tag = compress_str(describe_health(status, latency), HEALTH_COLUMN_WIDTH)
+            cprint(f"  {tag} ", HEALTH_COLORS[status], end="")
+            print(entry or "(empty entry: current directory)")
+    print(f"{problems} problem entries.")
+    return 1 if problems else 0
+
+
 @command("conflict")
 @argument(
     "varname", description="the variable to be checked", positional=True, type=str
 )
-def conflict_checker(varname: str):
+@argument("no_cache", description="rescan every directory", type=bool)
+@argument("content", description="also ignore byte-identical copies", type=bool)
+@argument("watch", description="keep the report live as directories change", type=bool)
+@argument("interval", description="seconds between two polls with --watch", type=float)
+def conflict_checker(
+    varname: str,
+    no_cache: bool = False,
+    content: bool = False,
+    watch: bool = False,
+    interval: float = WATCH_INTERVAL,
+):
     """
     Check if there is any conflict between the environment variables and the
     current environment variables.
+    Copies that are the same file (through symlinks or hard links) are not
+    conflicts; with --content, neither are byte-identical copies.
+    With --watch, only the entries that change are rescanned.
     """
     env_dict = get_environment_vars()
     if varname not in env_dict:
@@ -647,62 +1303,289 @@ def conflict_checker(varname: str):
         print(f"{varname} is not a path group. No need to check conflicts.")
         return 0
     path_list = env_dict[varname].split(os.pathsep)
-    exe_list = []
-    for path in path_list:
-        exe_list.append(find_executables(path))
-    for index_i in range(0, len(path_list)):
-        for index_j in range(index_i + 1, len(path_list)):
-            # print(f"Checking {path_list[index_i]} and {path_list[index_j]}, {index_i} and {index_j}")
-            intersection_exe = list(
-                set(exe_list[index_i]).intersection(exe_list[index_j])
-            )
-            if len(intersection_exe) > 0:
-                print(
-                    f"Conflict found between {BColors.OKBLUE} {path_list[index_i]} {BColors.ENDC} and "
-                    f"{BColors.OKBLUE} {path_list[index_j]} {BColors.ENDC}."
-                    f" We will use executable in {BColors.OKBLUE} {path_list[index_i]} {BColors.ENDC} first."
-                )
-                print("The following executables are in both:")
-                conflict_length = len(intersection_exe)
-                for conflict_counter, exe in enumerate(intersection_exe):
-                    if conflict_counter == conflict_length - 1:
-                        print(f"{BColors.FAIL}{exe}{BColors.ENDC} .")
-                        break
-                    if conflict_counter == 20:
-                        print(f"{BColors.FAIL}{exe}{BColors.ENDC} ...")
-                        break
-                    print(f"{BColors.FAIL}{exe}{BColors.ENDC}", end=", ")
+    cache = get_listing_cache(no_cache)
+    exe_index = ExecutableIndex.build(path_list, cache=cache)
+    hashes = HashCache(persist=not no_cache) if content else None
+    conflicts, identical = exe_index.distinct_conflicts(hashes)
+    if watch:
+        watch_conflicts(exe_index, conflicts, identical, cache, hashes, interval)
+        return 0
+    for providers, intersection_exe in exe_index.conflict_groups(conflicts).items():
+        winner = providers[0]
+        shadowed = f" {BColors.ENDC} and {BColors.OKBLUE} ".join(providers[1:])
+        print(
+            f"Conflict found between {BColors.OKBLUE} {winner} {BColors.ENDC} and "
+            f"{BColors.OKBLUE} {shadowed} {BColors.ENDC}."
+            f" We will use executable in {BColors.OKBLUE} {winner} {BColors.ENDC} first."
+        )
+        print("The following executables are in both:")
+        conflict_length = len(intersection_exe)
+        for conflict_counter, exe in enumerate(intersection_exe):
+            if conflict_counter == conflict_length - 1:
+                print(f"{BColors.FAIL}{exe}{BColors.ENDC} .")
+                break
+            if conflict_counter == 20:
+                print(f"{BColors.FAIL}{exe}{BColors.ENDC} ...")
+                break
+            print(f"{BColors.FAIL}{exe}{BColors.ENDC}", end=", ")
+
+    if identical:
+        print(
+            f"{len(identical)} executables found more than once are identical copies."
+        )
+    print_conflict_counts(exe_index, conflicts)
     return 0
 
 
-@command("optimize")
-@argument("varname", description="auto remove duplicates", positional=True, type=str)
-def optimize(varname: str):
+def format_conflict_view(exe_index, conflicts, identical, columns):
     """
-    if there are duplicates in path group, we will remove the duplicates.
+    Render the conflict report as one row per conflict group, groups in
+    lookup order, for the --watch view.
+    :param exe_index: ExecutableIndex
+    :param conflicts: as returned by `ExecutableIndex.distinct_conflicts`
+    :param identical: names whose copies are all identical
+    :param columns: terminal width
+    :return: list of rows
+    """
+    order = {directory: index for index, directory in enumerate(exe_index.directories)}
+    groups = sorted(
+        exe_index.conflict_groups(conflicts).items(),
+        key=lambda group: [order[directory] for directory in group[0]],
+    )
+    lines = [
+        compress_str(
+            f"{providers[0]} shadows {', '.join(providers[1:])}: {', '.join(names)}",
+            columns,
+        ).rstrip()
+        for providers, names in groups
+    ]
+    if not lines:
+        lines.append("No conflicts.")
+    if identical:
+        lines.append(
+            f"{len(identical)} executables found more than once are identical copies."
+        )
+    counts = exe_index.counts(conflicts)
+    if any(shadowed or shadowing for _, shadowed, shadowing in counts.values()):
+        lines.append("")
+        lines.append("Executables per entry (total / shadowed / shadowing):")
+        for directory, (provided, shadowed, shadowing) in counts.items():
+            if shadowed or shadowing:
+                lines.append(
+                    compress_str(
+                        f"{provided:>6} {shadowed:>6} {shadowing:>6}  {directory}",
+                        columns,
+                    ).rstrip()
+                )
+    return lines
+
+
+def watch_conflicts(exe_index, conflicts, identical, cache, hashes, interval):
+    """
+    Live conflict report. The entries are polled with one stat each, only
+    the ones that changed are rescanned, and only the names they add or
+    lose are checked again.
+    :param exe_index: ExecutableIndex, updated in place
+    :param conflicts: as returned by `ExecutableIndex.distinct_conflicts`
+    :param identical: names whose copies are all identical
+    :param cache: ListingCache, or None to scan without caching
+    :param hashes: HashCache, or None to compare files by identity only
+    :param interval: seconds between two polls
+    :return:
+    """
+    watcher = DirectoryWatcher(exe_index.directories)
+    scanner = cache.listing if cache is not None else scan_executables
+    last_change = "none yet"
+    lines = None
+    layout_columns = None
+    with Screen() as screen:
+        while True:
+            columns, rows = screen.size()
+            if lines is None or columns != layout_columns:
+                lines = format_conflict_view(exe_index, conflicts, identical, columns)
+                layout_columns = columns
+            status = compress_str(
+                f"Watching {len(watcher.directories)} entries every {interval:g}s, "
+                f"last change: {last_change}. Press q to quit.",
+                columns,
+            )
+            screen.draw(lines[: rows - 1] + [""] * (rows - 1 - len(lines)) + [status])
+            try:
+                info = screen.keys.read_key(interval)
+            except KeyboardInterrupt:
+                return
+            if info in ("q", "\x03") or screen.keys.closed:
+                return
+            if info is not None:
+                continue
+            changed = watcher.poll()
+            if not changed:
+                continue
+            affected = exe_index.update(scan_directories(changed, scanner=scanner))
+            if cache is not None:
+                cache.save()
+            rechecked, same = exe_index.distinct_conflicts(hashes, names=affected)
+            for name in affected:
+                conflicts.pop(name, None)
+                identical.discard(name)
+            conflicts.update(rechecked)
+            identical.update(same)
+            last_change = f"{time.strftime('%H:%M:%S')} in {', '.join(changed)}"
+            lines = None
+
+
+def print_conflict_counts(exe_index, conflicts=None):
+    """
+    Print how many executables each path entry provides, loses and wins.
+    :param exe_index: ExecutableIndex
+    :param conflicts: as returned by `ExecutableIndex.distinct_conflicts`,
+    None to count every shadowed copy
+    :return:
+    """
+    counts = exe_index.counts(conflicts)
+    if not any(shadowed or shadowing for _, shadowed, shadowing in counts.values()):
+        return
+    print(
+        f"{BColors.OKGREEN}Executables per entry "
+        f"(total / shadowed / shadowing):{BColors.ENDC}"
+    )
+    for directory, (provided, shadowed, shadowing) in counts.items():
+        if shadowed or shadowing:
+            print(f"{provided:>6} {shadowed:>6} {shadowing:>6}  {directory}")
+
+
+@command("libconflict")
+@argument(
+    "varname", description="the variable to be checked", positional=True, type=str
+)
+@argument("top", description="rank the N worst offenders", type=int)
+@argument("no_cache", description="rescan every directory", type=bool)
+def libconflict(varname: str = "LD_LIBRARY_PATH", top: int = 0, no_cache: bool = False):
+    """
+    Check which shared libraries are shadowed in a library path group.
+    Libraries are grouped by the SONAME read from their ELF dynamic section.
     """
     env_dict = get_environment_vars()
     if varname not in env_dict:
         print(f"{varname} is not in the environment variables.")
         return 0
-    if recognize_type(env_dict[varname]) != "path_group":
-        print(f"{varname} is not a path group. No need to check conflicts.")
+    lib_index = build_library_index(
+        env_dict[varname].split(PATH_SEPARATOR), cache=get_library_cache(no_cache)
+    )
+    conflicts = lib_index.conflicts()
+    if top:
+        print_library_ranking(lib_index, conflicts, top)
         return 0
-    path_list = env_dict[varname].split(":")
-    index = 0
-    while index < len(path_list):
-        dup_index = index + 1
-        while dup_index < len(path_list):
-            if path_list[index] == path_list[dup_index]:
-                path_list.pop(dup_index)
-            else:
-                dup_index += 1
-        index += 1
-
-    new_value = ""
-    for index in range(len(path_list) - 1):
-        new_value += path_list[index] + ":"
-    new_value += path_list[-1]
-    # print(new_value)
-    os.environ[varname] = new_value
+    for soname in sorted(conflicts):
+        winner, *shadowed = conflicts[soname]
+        print(
+            f"{BColors.FAIL}{soname}{BColors.ENDC}: "
+            f"{BColors.OKBLUE}{winner}{BColors.ENDC} wins, shadowing "
+            + ", ".join(shadowed)
+        )
+    print(f"{len(conflicts)} of {len(lib_index.providers)} libraries are shadowed.")
     return 0
+
+
+def print_library_ranking(lib_index, conflicts, top):
+    """
+    Print the directories shadowing the most libraries and the libraries
+    with the most copies.
+    :param lib_index: ExecutableIndex of SONAMEs
+    :param conflicts: dict from `ExecutableIndex.conflicts`
+    :param top: number of entries in each ranking
+    :return:
+    """
+    counts = lib_index.counts()
+    ranked = sorted(
+        (directory for directory in counts if counts[directory][2]),
+        key=lambda directory: -counts[directory][2],
+    )
+    print(f"{BColors.OKGREEN}Directories shadowing the most libraries:{BColors.ENDC}")
+    for directory in ranked[:top]:
+        print(f"  {counts[directory][2]:>5}  {directory}")
+    print(f"{BColors.OKGREEN}Libraries with the most copies:{BColors.ENDC}")
+    for soname in sorted(conflicts, key=lambda name: (-len(conflicts[name]), name))[
+        :top
+    ]:
+        print(f"  {len(conflicts[soname]):>5}  {soname} (uses {conflicts[soname][0]})")
+
+
+@command("optimize")
+@argument("varname", description="auto remove duplicates", positional=True, type=str)
+@argument(
+    "all_groups",
+    name="all",
+    description="optimize every path group variable",
+    type=bool,
+)
+@argument("drop_missing", description="remove nonexistent directories", type=bool)
+@argument("drop_empty", description="remove empty directories", type=bool)
+def optimize(
+    varname: str = "",
+    all_groups: bool = False,
+    drop_missing: bool = False,
+    drop_empty: bool = False,
+):
+    """
+    if there are duplicates in path group, we will remove the duplicates.
+    Entries resolving to the same directory (trailing slashes, "//", "."
+    segments, symlinks) count as duplicates.
+    """
+    env_dict = get_environment_vars()
+    if all_groups:
+        varnames = [
+            name
+            for name, value in env_dict.items()
+            if recognize_type(value) == "path_group"
+        ]
+    else:
+        if varname not in env_dict:
+            print(f"{varname} is not in the environment variables.")
+            return 0
+        if recognize_type(env_dict[varname]) != "path_group":
+            print(f"{varname} is not a path group. No need to check conflicts.")
+            return 0
+        varnames = [varname]
+
+    identities = DirectoryIdentity()
+    changes = {}
+    for name in varnames:
+        new_value, removed = optimize_path_group(
+            env_dict[name],
+            separator=PATH_SEPARATOR,
+            drop_missing=drop_missing,
+            drop_empty=drop_empty,
+            identities=identities,
+        )
+        if new_value != env_dict[name]:
+            changes[name] = new_value
+        if not removed:
+            continue
+        print(f"{BColors.OKGREEN}{name}{BColors.ENDC}: removed {len(removed)}")
+        for entry, reason in removed:
+            print(f"  {BColors.FAIL}{entry}{BColors.ENDC} ({reason})")
+    # one undo step for the whole run
+    get_journal().apply(changes)
+    return 0
+
+
+@command("daemon")
+@argument("stop", description="stop the running daemon", type=bool)
+def run_daemon(stop: bool = False):
+    """
+    Keep the listings and the type cache warm in the background, and answer
+    `enview --client which|conflict|health|libconflict|getall` over a Unix
+    domain socket. Clients run the command themselves when no daemon answers.
+    """
+    from enview import daemon
+
+    if not daemon.supported():
+        print("Unix domain sockets are not available on this system.")
+        return 1
+    if stop:
+        if not daemon.stop():
+            print("No daemon is running.")
+            return 1
+        return 0
+    return daemon.serve()
@@ -0,0 +1,222 @@
+"""
+Warm background daemon answering `enview --client` queries over a Unix
+domain socket.
+
+The daemon imports the commands once and keeps the listing caches and the
+type classification cache in memory, revalidating listings by directory
+mtime like a fresh process would. Every query carries the client's
+environment and working directory, and runs against them. Queries are
+served one at a time, so the redirected output of one never mixes with
+another.
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+from contextlib import redirect_stderr, redirect_stdout, suppress
+
+from enview.storage import cache_dir
+
+SOCKET_NAME = "daemon.sock"
+# commands that only read the environment they are given
+CLIENT_COMMANDS = ("which", "conflict", "health", "libconflict", "getall")
+# seconds a client waits for an answer before running the query itself
+CLIENT_TIMEOUT = 10.0
+MAX_MESSAGE_BYTES = 16 << 20
+
+
+def socket_path() -> str:
+    """
+    Get the path of the daemon socket, `ENVIEW_SOCKET` if set.
+    :return: path
+    """
+    return os.environ.get("ENVIEW_SOCKET") or os.path.join(cache_dir(), SOCKET_NAME)
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def can_serve(argv) -> bool:
+    """
+    Check whether the daemon can answer a command line.
+    :param argv: arguments, without the program name
+    :return: bool
+    """
+    return bool(argv) and argv[0] in CLIENT_COMMANDS and "--watch" not in argv
+
+
+def _receive(connection) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > MAX_MESSAGE_BYTES:
+            raise ValueError("message too large")
+        chunks.append(chunk)
+
+
+def _exchange(message, path=None, timeout=CLIENT_TIMEOUT):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path or socket_path())
+        connection.sendall(json.dumps(message).encode())
+        connection.shutdown(socket.SHUT_WR)
+        return json.loads(_receive(connection))
+
+
+def request(argv, path=None, timeout=CLIENT_TIMEOUT):
+    """
+    Run a command in the daemon and print its output.
+    :param argv: arguments, without the program name
+    :param path: socket path
+    :param timeout: seconds to wait for the answer
+    :return: exit code, or None if no daemon answered
+    """
+    if not supported() or not can_serve(argv):
+        return None
+    message = {
+        "argv": list(argv),
+        "environ": dict(os.environ),
+        "cwd": os.getcwd(),
+        "tty": sys.stdout.isatty(),
+    }
+    try:
+        response = _exchange(message, path, timeout)
+    except (OSError, ValueError):
+        return None
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    return response.get("code", 1)
+
+
+def is_running(path=None) -> bool:
+    """
+    Check whether a daemon answers on the socket.
+    :param path: socket path
+    :return: bool
+    """
+    try:
+        _exchange({"ping": True}, path, timeout=1.0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def stop(path=None) -> bool:
+    """
+    Ask the running daemon to exit.
+    :param path: socket path
+    :return: False if no daemon answered
+    """
+    try:
+        _exchange({"stop": True}, path, timeout=CLIENT_TIMEOUT)
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+class _Capture(io.StringIO):
+    """
+    Output buffer that reports whether the client's output is a terminal,
+    so colored output is decided as if the command ran in the client.
+    """
+
+    def __init__(self, tty: bool):
+        super().__init__()
+        self._tty = tty
+
+    def isatty(self) -> bool:
+        return self._tty
+
+
+def answer(message) -> dict:
+    """
+    Run one client query.
+    :param message: {"argv", "environ", "cwd", "tty"}
+    :return: {"stdout", "stderr", "code"}
+    """
+    import traceback
+
+    from enview import cli
+    from enview.envstore import bound_store
+
+    argv = message.get("argv") or []
+    if not can_serve(argv):
+        return {"stdout": "", "stderr": "not a daemon query\n", "code": 2}
+    stdout = _Capture(bool(message.get("tty")))
+    stderr = _Capture(False)
+    cwd = os.getcwd()
+    try:
+        os.chdir(message.get("cwd") or cwd)
+        environ = dict(message.get("environ") or {})
+        with bound_store(environ), redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                code = cli.run(argv)
+            except SystemExit as exit_:
+                # argparse errors, usage goes to the captured stderr
+                code = (
+                    exit_.code if isinstance(exit_.code, int) else int(bool(exit_.code))
+                )
+            except Exception:
+                traceback.print_exc()
+                code = 1
+    except OSError as error:
+        stderr.write(f"{error}\n")
+        code = 1
+    finally:
+        os.chdir(cwd)
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "code": code}
+
+
+def serve(path=None):
+    """
+    Answer client queries until stopped.
+    :param path: socket path
+    :return: exit code
+    """
+    from enview import cli
+
+    path = path or socket_path()
+    if is_running(path):
+        print(f"A daemon is already listening on {path}.", file=sys.stderr)
+        return 1
+    # warm the command modules before the first query
+    cli.load_commands()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with suppress(FileNotFoundError):
+        # left behind by a daemon that was killed
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        # only the owner may connect
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    print(f"Listening on {path}.", file=sys.stderr)
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                try:
+                    message = json.loads(_receive(connection))
+                    if message.get("stop"):
+                        connection.sendall(b"{}")
+                        return 0
+                    response = {} if message.get("ping") else answer(message)
+                    connection.sendall(json.dumps(response).encode())
+                except (OSError, ValueError, AttributeError):
+                    continue
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.close()
+        with suppress(OSError):
+            os.unlink(path)
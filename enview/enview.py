@@ -1,16 +1,59 @@
 import sys
 
-from nubia import Nubia, Options
+from enview import cli, profiling
 
-import enview.commands
+
+def run_shell(argv=()):
+    """
+    Start the interactive nubia shell.
+    :param argv: arguments left after the global options, without the
+    program name
+    :return: exit code
+    """
+    from nubia import Nubia, Options
+
+    from enview.commands.enviewcmd import SYSTEM_TYPE, clear_terminal
+    from enview.registry import nubia_plugin
+
+    cli.load_commands()
+    options = Options(persistent_history=False, auto_execute_single_suggestions=False)
+    # if using powershell in Windows Terminal, color patterns are correctly interpreted
+    # but when using in Windows PowerShell, Command Prompt, or double clicking on enview.exe, color patterns will work after executing a `powershell clear` command
+    clear_terminal()
+    print("Running on " + SYSTEM_TYPE)
+    # nubia reads sys.argv, both to pick its default subcommand when it is
+    # built and to parse it when it runs, so drop our global options from it
+    sys.argv[1:] = argv
+    shell = Nubia(name="enview", plugin=nubia_plugin(options), options=options)
+    return shell.run(cli_args=sys.argv)
 
 
 def main():
-    shell = Nubia(
-        name="enview",
-        command_pkgs=enview.commands,
-        options=Options(
-            persistent_history=False, auto_execute_single_suggestions=False
-        ),
-    )
-    sys.exit(shell.run())
+    options, argv = cli.global_options(sys.argv[1:])
+    profiler = None
+    if options["profile"] or options["trace"]:
+        profiler = profiling.enable(trace=bool(options["trace"]))
+    try:
+        code = None
+        if options["batch"]:
+            code = cli.run_batch(options["batch"])
+        elif options["client"]:
+            from enview import daemon
+
+            with profiling.span("client", "command"):
+                # None when no daemon answered, run the command ourselves
+                code = daemon.request(argv)
+        if code is None:
+            if cli.is_command(argv):
+                code = cli.run(argv)
+            else:
+                with profiling.span("shell", "command"):
+                    code = run_shell(argv)
+    finally:
+        if profiler is not None:
+            profiling.disable()
+            if options["profile"]:
+                profiler.report(sys.stderr)
+            if options["trace"]:
+                profiler.write_trace(options["trace"])
+    sys.exit(code)
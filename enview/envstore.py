@@ -0,0 +1,200 @@
+import os
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from enview import profiling
+
+
+class EnvStore(Mapping):
+    """
+    Ordered, indexed snapshot of the process environment.
+
+    The snapshot is taken once and kept up to date by writing through the
+    store (`set` / `unset`), so readers can look variables up by position or
+    by name in O(1) without copying `os.environ` again.
+    `version` is bumped on every change so callers can cheaply tell whether
+    anything derived from the snapshot is stale.
+    An environment that offers `raw_items` (e.g. `procenv.RawEnviron`) is
+    copied undecoded; each value is decoded the first time it is read.
+    """
+
+    def __init__(self, environ=None):
+        self._environ = os.environ if environ is None else environ
+        self._keys = []
+        self._values = {}
+        self._index = {}
+        self.version = 0
+        self.reload()
+
+    @property
+    def is_bound(self) -> bool:
+        """
+        True if the store writes to an environment other than `os.environ`.
+        """
+        return self._environ is not os.environ
+
+    def reload(self):
+        """
+        Re-read the whole environment. Only needed if it was changed behind
+        the store's back.
+        :return:
+        """
+        profiling.count("environment copies")
+        raw_items = getattr(self._environ, "raw_items", None)
+        self._values = dict(raw_items() if raw_items else self._environ)
+        self._keys = list(self._values)
+        self._index = {key: index for index, key in enumerate(self._keys)}
+        self.version += 1
+
+    def _value(self, name: str) -> str:
+        value = self._values[name]
+        if isinstance(value, bytes):
+            value = self._values[name] = os.fsdecode(value)
+        return value
+
+    def __getitem__(self, name: str) -> str:
+        return self._value(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._values
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def key_at(self, position: int) -> str:
+        """
+        Get the name of the variable at a position.
+        :param position:
+        :return: variable name
+        """
+        return self._keys[position]
+
+    def value_at(self, position: int) -> str:
+        """
+        Get the value of the variable at a position.
+        :param position:
+        :return: variable value
+        """
+        return self._value(self._keys[position])
+
+    def item_at(self, position: int):
+        """
+        Get the (name, value) pair at a position.
+        :param position:
+        :return: (name, value)
+        """
+        key = self._keys[position]
+        return key, self._value(key)
+
+    def index_of(self, name: str) -> int:
+        """
+        Get the position of a variable, or -1 if it is not set.
+        :param name:
+        :return: position
+        """
+        return self._index.get(name, -1)
+
+    def set(self, name: str, value: str) -> bool:
+        """
+        Set a variable, in the snapshot and in the underlying environment.
+        :param name:
+        :param value:
+        :return: True if anything changed
+        """
+        if name in self._index and self._value(name) == value:
+            return False
+        self._environ[name] = value
+        if name not in self._index:
+            self._index[name] = len(self._keys)
+            self._keys.append(name)
+        self._values[name] = value
+        self.version += 1
+        return True
+
+    def unset(self, name: str) -> bool:
+        """
+        Remove a variable, from the snapshot and the underlying environment.
+        :param name:
+        :return: True if the variable was set before
+        """
+        position = self._index.pop(name, None)
+        if position is None:
+            return False
+        self._environ.pop(name, None)
+        del self._values[name]
+        del self._keys[position]
+        for index in range(position, len(self._keys)):
+            self._index[self._keys[index]] = index
+        self.version += 1
+        return True
+
+    def apply(self, changes):
+        """
+        Apply a change set all-or-nothing: if any write fails, the variables
+        already written are restored before the error propagates.
+        :param changes: mapping or iterable of (name, value); None unsets
+        :return: list of (name, old value, new value) that changed, where a
+        missing variable is None
+        """
+        if isinstance(changes, Mapping):
+            changes = changes.items()
+        applied = []
+        try:
+            for name, value in changes:
+                old = self.get(name)
+                changed = self.unset(name) if value is None else self.set(name, value)
+                if changed:
+                    applied.append((name, old, value))
+        except BaseException:
+            for name, old, _value in reversed(applied):
+                if old is None:
+                    self.unset(name)
+                else:
+                    self.set(name, old)
+            raise
+        return applied
+
+    def update(self, changes) -> int:
+        """
+        Set several variables at once.
+        :param changes: mapping or iterable of (name, value)
+        :return: number of variables that changed
+        """
+        if isinstance(changes, Mapping):
+            changes = changes.items()
+        return sum(1 for name, value in changes if self.set(name, value))
+
+
+_default_store = None
+
+
+def get_store() -> EnvStore:
+    """
+    Get the store shared by all commands, bound to `os.environ`.
+    :return: EnvStore
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = EnvStore()
+    return _default_store
+
+
+@contextmanager
+def bound_store(environ):
+    """
+    Make the shared store a snapshot of another environment for the duration
+    of the block, e.g. the environment of a daemon client. Writes go to
+    `environ`, never to `os.environ`.
+    :param environ: dict of variables
+    :return: EnvStore
+    """
+    global _default_store
+    previous = _default_store
+    _default_store = EnvStore(environ)
+    try:
+        yield _default_store
+    finally:
+        _default_store = previous
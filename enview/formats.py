@@ -0,0 +1,638 @@
+import itertools
+import json
+import os
+import sys
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+EXPORT_FORMATS = ("sh", "fish", "dotenv", "json", "ps1")
+# formats that can express removing a variable
+DELTA_FORMATS = ("sh", "fish", "ps1")
+DEFAULT_FORMAT = "ps1" if os.name == "nt" else "sh"
+# lines are joined and written in chunks to keep the number of writes low
+CHUNK_LINES = 512
+
+_PS_QUOTES = "'\u2018\u2019\u201a\u201b"
+
+
+def quote_sh(value: str) -> str:
+    """
+    Quote a value for POSIX shells. Nothing is special inside single quotes,
+    so only the single quote itself needs care.
+    :param value:
+    :return: quoted value
+    """
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def quote_fish(value: str) -> str:
+    """
+    Quote a value for fish, where backslash and quote are escapable inside
+    single quotes.
+    :param value:
+    :return: quoted value
+    """
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def quote_dotenv(value: str) -> str:
+    """
+    Quote a value for dotenv files: literal single quotes when possible,
+    otherwise double quotes with backslash escapes.
+    :param value:
+    :return: quoted value
+    """
+    if "'" not in value and "\n" not in value and "\r" not in value:
+        return "'" + value + "'"
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("$", "\\$")
+        .replace("`", "\\`")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+    return '"' + escaped + '"'
+
+
+def quote_ps1(value: str) -> str:
+    """
+    Quote a value for PowerShell: verbatim single quotes, where every kind of
+    single quote character is escaped by doubling it.
+    :param value:
+    :return: quoted value
+    """
+    if any(c in value for c in _PS_QUOTES):
+        value = "".join(c + c if c in _PS_QUOTES else c for c in value)
+    return "'" + value + "'"
+
+
+def format_sh(name: str, value: str) -> str:
+    return f"export {name}={quote_sh(value)}\n"
+
+
+def format_fish(name: str, value: str) -> str:
+    # fish keeps *PATH variables as lists and joins them with ":" on export
+    if name.endswith("PATH") and value:
+        items = " ".join(quote_fish(item) for item in value.split(":"))
+        return f"set -gx {name} {items}\n"
+    return f"set -gx {name} {quote_fish(value)}\n"
+
+
+def format_dotenv(name: str, value: str) -> str:
+    return f"{name}={quote_dotenv(value)}\n"
+
+
+def format_ps1(name: str, value: str) -> str:
+    name = name.replace("`", "``").replace("}", "`}")
+    return f"${{env:{name}}} = {quote_ps1(value)}\n"
+
+
+LINE_FORMATTERS = {
+    "sh": format_sh,
+    "fish": format_fish,
+    "dotenv": format_dotenv,
+    "ps1": format_ps1,
+}
+
+
+def unset_sh(name: str) -> str:
+    return f"unset {name}\n"
+
+
+def unset_fish(name: str) -> str:
+    return f"set -e {name}\n"
+
+
+def unset_ps1(name: str) -> str:
+    name = name.replace("`", "``").replace("}", "`}")
+    return f"${{env:{name}}} = $null\n"
+
+
+UNSET_FORMATTERS = {
+    "sh": unset_sh,
+    "fish": unset_fish,
+    "ps1": unset_ps1,
+}
+
+
+def filter_items(items, patterns=None):
+    """
+    Keep the variables whose name matches any of the glob patterns.
+    :param items: iterable of (name, value)
+    :param patterns: glob patterns, everything if empty
+    :return: iterator of (name, value)
+    """
+    if not patterns:
+        return iter(items)
+    return (
+        (name, value)
+        for name, value in items
+        if any(fnmatchcase(name, pattern) for pattern in patterns)
+    )
+
+
+def _json_lines(items):
+    yield "{"
+    first = True
+    for name, value in items:
+        separator = "\n" if first else ",\n"
+        first = False
+        yield f"{separator}  {json.dumps(name)}: {json.dumps(value)}"
+    yield "\n}\n" if not first else "}\n"
+
+
+def is_shell_name(name: str) -> bool:
+    """
+    Check if a variable name can be assigned by a shell.
+    :param name:
+    :return: bool
+    """
+    return name.isascii() and name.isidentifier()
+
+
+def export_lines(items, fmt: str = DEFAULT_FORMAT):
+    """
+    Render variables in an export format, one piece at a time. Shell formats
+    skip variables whose names a shell cannot assign (e.g. "BASH_FUNC_x%%").
+    :param items: iterable of (name, value)
+    :param fmt: one of EXPORT_FORMATS
+    :return: iterator of strings
+    """
+    if fmt == "json":
+        return _json_lines(items)
+    try:
+        formatter = LINE_FORMATTERS[fmt]
+    except KeyError:
+        raise ValueError(f"unknown export format: {fmt}") from None
+    if fmt == "ps1":
+        return (formatter(name, value) for name, value in items)
+    return (formatter(name, value) for name, value in items if is_shell_name(name))
+
+
+def delta_lines(changes, fmt: str = DEFAULT_FORMAT):
+    """
+    Render changes as a script that sets and unsets only those variables.
+    :param changes: iterable of (name, value), where None means unset
+    :param fmt: one of DELTA_FORMATS
+    :return: iterator of strings
+    """
+    if fmt not in UNSET_FORMATTERS:
+        raise ValueError(f"unknown delta format: {fmt}")
+    set_line = LINE_FORMATTERS[fmt]
+    unset_line = UNSET_FORMATTERS[fmt]
+    for name, value in changes:
+        if fmt != "ps1" and not is_shell_name(name):
+            continue
+        yield unset_line(name) if value is None else set_line(name, value)
+
+
+# where exports printed to stdout go while `exports_to` is active
+_export_stream = None
+
+
+def export_stream():
+    """
+    Get the stream for what a command exports on stdout (`save -o -`,
+    `delta`), as opposed to the messages it prints.
+    :return: writable text stream
+    """
+    return sys.stdout if _export_stream is None else _export_stream
+
+
+@contextmanager
+def exports_to(stream):
+    """
+    Send exports to a stream for the duration of the block, e.g. to keep
+    them on the real stdout while everything else is redirected.
+    :param stream: writable text stream
+    :return:
+    """
+    global _export_stream
+    previous = _export_stream
+    _export_stream = stream
+    try:
+        yield stream
+    finally:
+        _export_stream = previous
+
+
+def write_export(stream, items, fmt: str = DEFAULT_FORMAT) -> int:
+    """
+    Stream variables to a text stream in an export format.
+    :param stream: writable text stream
+    :param items: iterable of (name, value)
+    :param fmt: one of EXPORT_FORMATS
+    :return: number of characters written
+    """
+    written = 0
+    chunk = []
+    for piece in export_lines(items, fmt):
+        chunk.append(piece)
+        if len(chunk) >= CHUNK_LINES:
+            written += stream.write("".join(chunk))
+            chunk = []
+    if chunk:
+        written += stream.write("".join(chunk))
+    return written
+
+
+class ExportParseError(ValueError):
+    """
+    An export file could not be parsed.
+    """
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+# sh words go on after a closing quote: quote characters opening a new quoted
+# part, with their escape character
+_SH_QUOTES = {"'": "", '"': "\\"}
+
+
+class _IncompleteError(Exception):
+    """
+    A quoted value continues on the next line. Keeps the lexer state, so the
+    next lines are scanned for the end of the value instead of parsed again.
+    """
+
+    def __init__(
+        self, quotes: str = "", escape: str = "", doubled: bool = False, word=None
+    ):
+        """
+        :param quotes: characters closing the quoted part, empty if the
+        statement continues on the next line whatever it holds
+        :param escape: character making the next one literal
+        :param doubled: whether a doubled quote is a literal quote
+        :param word: quote characters that open another quoted part of the
+        same value after this one closes, with their escape characters
+        """
+        super().__init__()
+        self.quotes = quotes
+        self.escape = escape
+        self.doubled = doubled
+        self.word = word or {}
+
+    def ends_in(self, line: str) -> bool:
+        """
+        Scan a line, check whether the value may end in it.
+        :param line:
+        :return: bool, False if the value is still open after the line
+        """
+        if not self.quotes:
+            return True
+        index = 0
+        while index < len(line):
+            c = line[index]
+            if self.quotes is None:
+                # between the quoted parts of a word
+                if c in self.word:
+                    self.quotes, self.escape = c, self.word[c]
+                elif c == "\\":
+                    index += 1
+                elif not c.isspace() and c not in ";#":
+                    pass
+                else:
+                    return True
+                index += 1
+            elif c == self.escape:
+                index += 2
+            elif c in self.quotes:
+                if self.doubled and line[index + 1 : index + 2] in tuple(self.quotes):
+                    index += 2
+                elif self.word:
+                    self.quotes = None
+                    index += 1
+                else:
+                    return True
+            else:
+                index += 1
+        return self.quotes is None
+
+
+def _skip_blanks(text: str, index: int) -> int:
+    while index < len(text) and text[index] in " \t":
+        index += 1
+    return index
+
+
+def _read_name(text: str, index: int):
+    end = index
+    while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+        end += 1
+    if end == index:
+        raise ValueError("expected a variable name")
+    return text[index:end], end
+
+
+def _sh_value(text: str, index: int):
+    out = []
+    end = len(text)
+    while index < end:
+        c = text[index]
+        if c == "'":
+            close = text.find("'", index + 1)
+            if close < 0:
+                raise _IncompleteError("'", word=_SH_QUOTES)
+            out.append(text[index + 1 : close])
+            index = close + 1
+        elif c == '"':
+            index += 1
+            while True:
+                if index >= end:
+                    raise _IncompleteError('"', escape="\\", word=_SH_QUOTES)
+                c = text[index]
+                if c == '"':
+                    index += 1
+                    break
+                if c == "\\" and index + 1 < end and text[index + 1] in '$`"\\\n':
+                    if text[index + 1] != "\n":
+                        out.append(text[index + 1])
+                    index += 2
+                    continue
+                out.append(c)
+                index += 1
+        elif c == "\\":
+            if index + 1 >= end:
+                raise _IncompleteError()
+            if text[index + 1] != "\n":
+                out.append(text[index + 1])
+            index += 2
+        elif c in " \t\r\n;":
+            break
+        else:
+            out.append(c)
+            index += 1
+    return "".join(out), index
+
+
+def parse_sh(text: str):
+    """
+    Parse one line of sh statements: "[export] NAME=VALUE [NAME=VALUE ...]",
+    several of them separated by ";". Values are taken literally, "$VAR" is
+    not expanded.
+    :param text: statements, may span several lines
+    :return: list of (name, value)
+    """
+    index = 0
+    entries = []
+    while True:
+        index = _skip_blanks(text, index)
+        for prefix in ("export ", "declare -x "):
+            if text.startswith(prefix, index):
+                index = _skip_blanks(text, index + len(prefix))
+                break
+        while index < len(text) and text[index] not in "#\r\n;":
+            name, index = _read_name(text, index)
+            if index >= len(text) or text[index] != "=":
+                raise ValueError(f"expected '=' after {name}")
+            value, index = _sh_value(text, index + 1)
+            entries.append((name, value))
+            index = _skip_blanks(text, index)
+        if index >= len(text) or text[index] != ";":
+            return entries
+        index += 1
+
+
+_DOTENV_ESCAPES = {"n": "\n", "r": "\r", "t": "\t"}
+
+
+def parse_dotenv(text: str):
+    """
+    Parse one dotenv line: "[export] NAME = value", with literal single
+    quotes, escaped double quotes or unquoted values ending at " #".
+    :param text: statement, may span several lines
+    :return: list of (name, value)
+    """
+    index = _skip_blanks(text, 0)
+    stripped = text[index:]
+    if not stripped.strip() or stripped.startswith("#"):
+        return []
+    if stripped.startswith("export "):
+        index = _skip_blanks(text, index + len("export "))
+    name, index = _read_name(text, index)
+    index = _skip_blanks(text, index)
+    if index >= len(text) or text[index] != "=":
+        raise ValueError(f"expected '=' after {name}")
+    index = _skip_blanks(text, index + 1)
+    quote = text[index : index + 1]
+    if quote == "'":
+        close = text.find("'", index + 1)
+        if close < 0:
+            raise _IncompleteError("'")
+        return [(name, text[index + 1 : close])]
+    if quote == '"':
+        out = []
+        index += 1
+        while True:
+            if index >= len(text):
+                raise _IncompleteError('"', escape="\\")
+            c = text[index]
+            if c == '"':
+                return [(name, "".join(out))]
+            if c == "\\" and index + 1 < len(text):
+                escaped = text[index + 1]
+                out.append(_DOTENV_ESCAPES.get(escaped, escaped))
+                index += 2
+                continue
+            out.append(c)
+            index += 1
+    value = text[index:].rstrip("\r\n")
+    comment = value.find(" #")
+    if comment >= 0:
+        value = value[:comment]
+    return [(name, value.strip())]
+
+
+_PS_ESCAPES = {
+    "0": "\0",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+}
+
+
+def parse_ps1(text: str):
+    """
+    Parse one PowerShell assignment: "$env:NAME = 'value'" or
+    "${env:NAME} = "value"".
+    :param text: statement, may span several lines
+    :return: list of (name, value)
+    """
+    index = _skip_blanks(text, 0)
+    stripped = text[index:]
+    if not stripped.strip() or stripped.startswith("#"):
+        return []
+    if stripped[:6].lower() == "${env:":
+        out = []
+        index += 6
+        while index < len(text) and text[index] != "}":
+            if text[index] == "`" and index + 1 < len(text):
+                index += 1
+            out.append(text[index])
+            index += 1
+        if index >= len(text):
+            raise ValueError("unterminated variable name")
+        name = "".join(out)
+        index += 1
+    elif stripped[:5].lower() == "$env:":
+        name, index = _read_name(text, index + 5)
+    else:
+        raise ValueError("expected $env:NAME")
+    index = _skip_blanks(text, index)
+    if index >= len(text) or text[index] != "=":
+        raise ValueError(f"expected '=' after {name}")
+    index = _skip_blanks(text, index + 1)
+    quote = text[index : index + 1]
+    out = []
+    if quote and quote in _PS_QUOTES:
+        index += 1
+        while True:
+            if index >= len(text):
+                raise _IncompleteError(_PS_QUOTES, doubled=True)
+            c = text[index]
+            if c in _PS_QUOTES:
+                if index + 1 < len(text) and text[index + 1] in _PS_QUOTES:
+                    out.append(c)
+                    index += 2
+                    continue
+                return [(name, "".join(out))]
+            out.append(c)
+            index += 1
+    if quote == '"':
+        index += 1
+        while True:
+            if index >= len(text):
+                raise _IncompleteError('"', escape="`", doubled=True)
+            c = text[index]
+            if c == '"':
+                if index + 1 < len(text) and text[index + 1] == '"':
+                    out.append('"')
+                    index += 2
+                    continue
+                return [(name, "".join(out))]
+            if c == "`" and index + 1 < len(text):
+                escaped = text[index + 1]
+                out.append(_PS_ESCAPES.get(escaped, escaped))
+                index += 2
+                continue
+            out.append(c)
+            index += 1
+    return [(name, text[index:].strip())]
+
+
+STATEMENT_PARSERS = {
+    "sh": parse_sh,
+    "dotenv": parse_dotenv,
+    "ps1": parse_ps1,
+}
+IMPORT_FORMATS = ("sh", "dotenv", "ps1", "json")
+_EXTENSIONS = {
+    ".json": "json",
+    ".ps1": "ps1",
+    ".env": "dotenv",
+    ".sh": "sh",
+    ".bash": "sh",
+    ".zsh": "sh",
+}
+
+
+def detect_format(path: str, first_line: str = "") -> str:
+    """
+    Guess the format of an export file from its extension or first line.
+    :param path:
+    :param first_line: first non-blank, non-comment line
+    :return: one of IMPORT_FORMATS
+    """
+    base = os.path.basename(path)
+    if base == ".env":
+        return "dotenv"
+    fmt = _EXTENSIONS.get(os.path.splitext(base)[1].lower())
+    if fmt:
+        return fmt
+    line = first_line.lstrip()
+    if line.startswith(("{", "[")):
+        return "json"
+    if line[:5].lower() == "$env:" or line[:6].lower() == "${env:":
+        return "ps1"
+    if line.startswith(("export ", "declare -x ")):
+        return "sh"
+    return "dotenv"
+
+
+def read_export(lines, fmt: str):
+    """
+    Parse an export file in one streaming pass.
+    :param lines: iterable of lines, e.g. a text file
+    :param fmt: one of IMPORT_FORMATS
+    :return: iterator of (name, value)
+    """
+    if fmt == "json":
+        text = "".join(lines)
+        try:
+            data = json.loads(text)
+        except ValueError as error:
+            raise ExportParseError(getattr(error, "lineno", 0), str(error)) from None
+        if not isinstance(data, dict):
+            raise ExportParseError(1, "expected a JSON object")
+        for name, value in data.items():
+            if not isinstance(value, str):
+                # null, numbers and booleans are not values a variable can hold
+                key = text.find(json.dumps(name))
+                raise ExportParseError(
+                    text.count("\n", 0, max(key, 0)) + 1,
+                    f"{name}: expected a string, got {json.dumps(value)[:20]}",
+                )
+            yield name, value
+        return
+    try:
+        parse = STATEMENT_PARSERS[fmt]
+    except KeyError:
+        raise ValueError(f"unknown import format: {fmt}") from None
+    parts = []
+    incomplete = None
+    start = 0
+    for number, line in enumerate(lines, 1):
+        if not parts:
+            start = number
+        parts.append(line)
+        if incomplete is not None and not incomplete.ends_in(line):
+            continue
+        try:
+            entries = parse("".join(parts))
+        except _IncompleteError as error:
+            incomplete = error
+            continue
+        except ValueError as error:
+            raise ExportParseError(start, str(error)) from None
+        parts = []
+        incomplete = None
+        yield from entries
+    if parts:
+        raise ExportParseError(start, "unterminated quote")
+
+
+def open_export(stream, path: str, fmt: str = "auto"):
+    """
+    Detect the format of an export file without consuming it.
+    :param stream: readable text stream
+    :param path: file name, used for the extension
+    :param fmt: format, or "auto" to guess
+    :return: (format, iterable of all lines)
+    """
+    if fmt != "auto":
+        return fmt, stream
+    head = []
+    first_line = ""
+    for line in stream:
+        head.append(line)
+        if line.strip() and not line.lstrip().startswith("#"):
+            first_line = line
+            break
+    return detect_format(path, first_line), itertools.chain(head, stream)
@@ -0,0 +1,260 @@
+import os
+import time
+
+from enview.envstore import get_store
+from enview.procenv import read_start_time
+from enview.storage import data_dir, load_json, save_json
+
+DELTA_FILE = "delta-{session}.json"
+# delta files of ENVIEW_SESSION sessions, whose shell cannot be checked, are
+# dropped when untouched for this long (seconds)
+DELTA_MAX_AGE = 7 * 24 * 3600
+
+
+def _safe_token(token: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in token)
+
+
+def session_token() -> str:
+    """
+    Get what identifies the shell enview was started from: `ENVIEW_SESSION`
+    if set, else the parent process id and start time, so a reused pid does
+    not inherit another shell's changes.
+    :return: token safe to use in a file name
+    """
+    token = os.environ.get("ENVIEW_SESSION")
+    if token:
+        return _safe_token(token)
+    ppid = os.getppid()
+    start_time = read_start_time(ppid)
+    return f"{ppid}-{start_time}" if start_time else str(ppid)
+
+
+def delta_path() -> str:
+    """
+    Get the file the pending changes of the invoking shell are kept in
+    between enview runs, so sessions do not see each other's changes.
+    :return: path
+    """
+    return os.path.join(data_dir(), DELTA_FILE.format(session=session_token()))
+
+
+def _session_alive(session: str, mtime: float, now: float) -> bool:
+    pid, _, start_time = session.partition("-")
+    if pid.isdigit() and start_time.isdigit():
+        return read_start_time(int(pid)) == start_time
+    return now - mtime < DELTA_MAX_AGE
+
+
+def expire_deltas(directory=None) -> int:
+    """
+    Remove the delta files of sessions that ended: those of a shell that is
+    no longer running, and those of a named session untouched for
+    DELTA_MAX_AGE.
+    :param directory: where the delta files are, the data directory if not given
+    :return: number of files removed
+    """
+    directory = data_dir() if directory is None else directory
+    prefix, suffix = DELTA_FILE.split("{session}")
+    now = time.time()
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            mtime = os.stat(path).st_mtime
+            if _session_alive(name[len(prefix) : -len(suffix)], mtime, now):
+                continue
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+class ChangeJournal:
+    """
+    Undo / redo history of the changes made through enview.
+
+    Every entry is the list of (name, old value, new value) one change set
+    touched, so undoing or redoing writes back only those variables. The
+    current value of every touched variable is also kept, for `enview delta`
+    to turn into a script for the parent shell: in memory, and in `path`
+    too when one is given. The value each variable had before its first
+    change is the base the pending changes are compared with, since the
+    store itself may write to the environment they would be compared with.
+    """
+
+    def __init__(self, store, path=None):
+        """
+        :param store: EnvStore the changes are applied to
+        :param path: file to keep the pending changes in across runs, None
+        to keep them in memory only
+        """
+        self.store = store
+        self.path = path
+        self._undo = []
+        self._redo = []
+        self._pending = {}
+        self._base = {}
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self._undo)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def apply(self, changes):
+        """
+        Apply a change set all-or-nothing and record it as one undo step.
+        :param changes: mapping or iterable of (name, value); None unsets
+        :return: list of (name, old value, new value) that changed
+        """
+        applied = self.store.apply(changes)
+        for name, old, _new in applied:
+            self._base.setdefault(name, old)
+        if applied:
+            self._undo.append(applied)
+            self._redo.clear()
+            self._persist(applied)
+        return applied
+
+    def set(self, name: str, value: str) -> bool:
+        """
+        Set one variable as its own undo step.
+        :param name:
+        :param value:
+        :return: True if anything changed
+        """
+        return bool(self.apply([(name, value)]))
+
+    def undo(self):
+        """
+        Revert the last change set.
+        :return: the reverted (name, old value, new value) list, empty if
+        there was nothing to undo
+        """
+        if not self._undo:
+            return []
+        entry = self._undo.pop()
+        self.store.apply([(name, old) for name, old, _new in reversed(entry)])
+        self._redo.append(entry)
+        self._persist(entry)
+        return entry
+
+    def redo(self):
+        """
+        Apply the last undone change set again.
+        :return: the reapplied (name, old value, new value) list, empty if
+        there was nothing to redo
+        """
+        if not self._redo:
+            return []
+        entry = self._redo.pop()
+        self.store.apply([(name, new) for name, _old, new in entry])
+        self._undo.append(entry)
+        self._persist(entry)
+        return entry
+
+    def _persist(self, entry):
+        for name, _old, _new in entry:
+            self._pending[name] = self.store.get(name)
+        if self.path is None:
+            return
+        pending = load_json(self.path, {})
+        if not isinstance(pending, dict):
+            pending = {}
+        for name, _old, _new in entry:
+            pending[name] = self.store.get(name)
+        save_json(self.path, pending)
+
+    def pending_changes(self, environ=None):
+        """
+        Get the recorded changes that differ from what the variables were
+        before this journal changed them, or for variables it did not
+        change, from an environment.
+        :param environ: environment to compare with, `os.environ` if not given
+        :return: sorted list of (name, value), where None means unset
+        """
+        if self.path is not None:
+            return pending_changes(self.path, environ, self._base)
+        return _differences(self._pending, environ, self._base)
+
+    def clear_pending(self) -> bool:
+        """
+        Forget the recorded changes.
+        :return: True if there were any
+        """
+        had_pending = bool(self._pending)
+        self._pending.clear()
+        self._base.clear()
+        if self.path is not None:
+            had_pending = clear_pending(self.path) or had_pending
+        return had_pending
+
+
+def _differences(pending, environ=None, base=None):
+    environ = os.environ if environ is None else environ
+    base = {} if base is None else base
+    return sorted(
+        (name, value)
+        for name, value in pending.items()
+        if (value is None or isinstance(value, str))
+        and (base[name] if name in base else environ.get(name)) != value
+    )
+
+
+def pending_changes(path: str, environ=None, base=None):
+    """
+    Get the recorded changes that differ from an environment.
+    :param path: file written by a ChangeJournal
+    :param environ: environment to compare with, `os.environ` if not given
+    :param base: values to compare with instead of the environment's, None
+    meaning unset
+    :return: sorted list of (name, value), where None means unset
+    """
+    pending = load_json(path, {})
+    if not isinstance(pending, dict):
+        return []
+    return _differences(pending, environ, base)
+
+
+def clear_pending(path: str) -> bool:
+    """
+    Forget the recorded changes.
+    :param path:
+    :return: True if there were any
+    """
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+_default_journal = None
+
+
+def get_journal() -> ChangeJournal:
+    """
+    Get the journal of the shared store. Pending changes are kept on disk
+    only for the store bound to `os.environ`; a store bound to another
+    environment (a batch run, a daemon query) keeps them in memory.
+    :return: ChangeJournal
+    """
+    global _default_journal
+    store = get_store()
+    if _default_journal is None or _default_journal.store is not store:
+        path = None
+        if not store.is_bound:
+            path = delta_path()
+            expire_deltas(os.path.dirname(path))
+        _default_journal = ChangeJournal(store, path)
+    return _default_journal
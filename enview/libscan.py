@@ -0,0 +1,182 @@
+import os
+import struct
+from fnmatch import fnmatchcase
+
+from enview import profiling
+from enview.pathscan import ExecutableIndex, same_file_keys, scan_directories
+
+LIBRARY_PATTERN = "lib*.so*"
+
+_ELF_MAGIC = b"\x7fELF"
+_PT_LOAD = 1
+_PT_DYNAMIC = 2
+_DT_NULL = 0
+_DT_STRTAB = 5
+_DT_SONAME = 14
+# never read more than this for the tables, whatever the header claims
+_MAX_TABLE_BYTES = 1 << 20
+_MAX_NAME_BYTES = 4096
+
+# (ELF header fields after e_ident, program header, dynamic entry) per class
+_LAYOUTS = {
+    1: ("HHIIIIIHHH", "IIIIIIII", "iI"),
+    2: ("HHIQQQIHHH", "IIQQQQQQ", "qQ"),
+}
+
+
+def _read_at(f, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    return f.read(size)
+
+
+def read_soname(path: str):
+    """
+    Read the SONAME of a shared library from its ELF dynamic section,
+    without running readelf.
+    :param path:
+    :return: SONAME, or None if the file is not an ELF object or has none
+    """
+    try:
+        with open(path, "rb") as f:
+            return _read_soname(f)
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def _read_soname(f):
+    ident = f.read(16)
+    if len(ident) < 16 or ident[:4] != _ELF_MAGIC or ident[4] not in _LAYOUTS:
+        return None
+    order = "<" if ident[5] == 1 else ">"
+    header, program_header, dynamic_entry = (
+        order + layout for layout in _LAYOUTS[ident[4]]
+    )
+    fields = struct.unpack(header, f.read(struct.calcsize(header)))
+    phoff, phentsize, phnum = fields[4], fields[8], fields[9]
+    if (
+        phentsize < struct.calcsize(program_header)
+        or phentsize * phnum > _MAX_TABLE_BYTES
+    ):
+        return None
+
+    # map the string table address to a file offset through the segments
+    loads = []
+    dynamic = None
+    table = _read_at(f, phoff, phentsize * phnum)
+    for index in range(phnum):
+        entry = table[
+            index * phentsize : index * phentsize + struct.calcsize(program_header)
+        ]
+        if len(entry) < struct.calcsize(program_header):
+            break
+        values = struct.unpack(program_header, entry)
+        if ident[4] == 2:
+            p_type, _flags, offset, vaddr, _paddr, filesz = values[:6]
+        else:
+            p_type, offset, vaddr, _paddr, filesz = values[:5]
+        if p_type == _PT_LOAD:
+            loads.append((vaddr, offset, filesz))
+        elif p_type == _PT_DYNAMIC:
+            dynamic = (offset, min(filesz, _MAX_TABLE_BYTES))
+    if dynamic is None:
+        return None
+
+    strtab = soname = None
+    entry_size = struct.calcsize(dynamic_entry)
+    data = _read_at(f, dynamic[0], dynamic[1])
+    for start in range(0, len(data) - entry_size + 1, entry_size):
+        tag, value = struct.unpack(dynamic_entry, data[start : start + entry_size])
+        if tag == _DT_NULL:
+            break
+        if tag == _DT_STRTAB:
+            strtab = value
+        elif tag == _DT_SONAME:
+            soname = value
+    if strtab is None or soname is None:
+        return None
+    for vaddr, offset, filesz in loads:
+        if vaddr <= strtab < vaddr + filesz:
+            name = _read_at(f, offset + strtab - vaddr + soname, _MAX_NAME_BYTES)
+            name = name.split(b"\0", 1)[0]
+            return os.fsdecode(name) if name else None
+    return None
+
+
+def is_library_name(name: str) -> bool:
+    return fnmatchcase(name, LIBRARY_PATTERN)
+
+
+def scan_libraries(directory: str):
+    """
+    List the shared libraries of a directory with their SONAME. Every file
+    is read once, however many symlinks point at it.
+    :param directory:
+    :return: list of [file name, SONAME], the file name standing in for the
+    SONAME of libraries without one
+    """
+    libraries = []
+    sonames = {}
+    try:
+        with os.scandir(directory or os.curdir) as entries:
+            for entry in entries:
+                if not is_library_name(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if not entry.is_file():
+                    continue
+                key = (st.st_dev, st.st_ino)
+                if key not in sonames:
+                    sonames[key] = read_soname(entry.path)
+                libraries.append([entry.name, sonames[key] or entry.name])
+    except OSError:
+        return []
+    return libraries
+
+
+def build_library_index(directories, max_workers=None, cache=None):
+    """
+    Index the shared libraries of path group entries by SONAME, which is the
+    name the dynamic loader looks for in every entry. A copy that is the
+    same file as an earlier one (the same entry reached through a symlinked
+    directory, or a hard link) is left out, so it is not a conflict.
+    :param directories: path group entries, in lookup order
+    :param max_workers:
+    :param cache: ListingCache created with `scan_libraries` as its scanner
+    :return: ExecutableIndex whose names are SONAMEs
+    """
+    directories = list(directories)
+    scanner = cache.listing if cache is not None else scan_libraries
+    with profiling.span("scan_libraries", "scan"):
+        listings = scan_directories(
+            directories, scanner=scanner, max_workers=max_workers
+        )
+        if cache is not None:
+            cache.save()
+    # SONAME -> file providing it, preferring the file named after it
+    files = {}
+    for directory, libraries in listings.items():
+        provided = files[directory] = {}
+        for name, soname in libraries:
+            if name == soname or soname not in provided:
+                provided[soname] = name
+    paths = {
+        (soname, directory): os.path.join(
+            directory or os.curdir, files[directory][soname]
+        )
+        for soname, providers in ExecutableIndex(directories, files).conflicts().items()
+        for directory in providers
+    }
+    keys = same_file_keys(paths.values(), max_workers=max_workers)
+    seen = set()
+    for (soname, directory), path in paths.items():
+        key = keys[path]
+        if key is None:
+            continue
+        if (soname, key) in seen:
+            del files[directory][soname]
+        seen.add((soname, key))
+    sonames = {directory: sorted(provided) for directory, provided in files.items()}
+    return ExecutableIndex(directories, sonames)
@@ -0,0 +1,124 @@
+import os
+import queue
+import stat
+import threading
+import time
+
+MAX_HEALTH_WORKERS = 16
+# seconds an entry may take before it is reported as hung
+HEALTH_TIMEOUT = 2.0
+# entries answering slower than this are reported as slow
+SLOW_SECONDS = 0.1
+
+HEALTH_STATUSES = ("ok", "slow", "missing", "not-a-dir", "unreadable")
+
+
+def check_entry(entry: str, slow: float = SLOW_SECONDS):
+    """
+    Check one path group entry.
+    :param entry: an empty entry means the current directory, like in PATH
+    :param slow: latency above which a working entry is reported as slow
+    :return: (status, latency in seconds)
+    """
+    path = entry or os.curdir
+    start = time.perf_counter()
+    try:
+        st = os.stat(path)
+        status = "ok"
+        if not stat.S_ISDIR(st.st_mode):
+            status = "not-a-dir"
+        elif not os.access(path, os.R_OK | os.X_OK):
+            status = "unreadable"
+    except PermissionError:
+        status = "unreadable"
+    except (OSError, ValueError):
+        status = "missing"
+    latency = time.perf_counter() - start
+    if status == "ok" and latency > slow:
+        status = "slow"
+    return status, latency
+
+
+def check_entries(
+    entries,
+    timeout: float = HEALTH_TIMEOUT,
+    slow: float = SLOW_SECONDS,
+    max_workers=None,
+):
+    """
+    Check many entries concurrently, giving up on any entry that takes longer
+    than `timeout`.
+
+    The workers are daemon threads: a stat on a hung mount cannot be
+    interrupted, so the thread stuck on it is abandoned (and replaced) rather
+    than waited for, and it never keeps the process from exiting.
+    :param entries: path group entries, duplicates are checked once
+    :param timeout: seconds per entry
+    :param slow: latency above which a working entry is reported as slow
+    :param max_workers: number of entries checked at the same time
+    :return: dict mapping entry to (status, latency); an entry that timed out
+    is "slow" with a latency of None
+    """
+    pending = list(dict.fromkeys(entries))
+    if not pending:
+        return {}
+    jobs = queue.Queue()
+    for entry in pending:
+        jobs.put(entry)
+    done = queue.Queue()
+    started = {}
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            try:
+                entry = jobs.get_nowait()
+            except queue.Empty:
+                return
+            with lock:
+                started[entry] = time.monotonic()
+            done.put((entry, check_entry(entry, slow)))
+
+    def start_worker():
+        threading.Thread(target=work, name="enview-health", daemon=True).start()
+
+    for _ in range(max_workers or min(MAX_HEALTH_WORKERS, len(pending))):
+        start_worker()
+
+    results = {}
+    while len(results) < len(pending):
+        now = time.monotonic()
+        with lock:
+            running = [
+                (start, entry)
+                for entry, start in started.items()
+                if entry not in results
+            ]
+        deadline = min((start for start, _entry in running), default=now) + timeout
+        try:
+            entry, result = done.get(timeout=max(deadline - now, 0.001))
+            results.setdefault(entry, result)
+            continue
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        for start, entry in running:
+            if entry not in results and now - start >= timeout:
+                results[entry] = ("slow", None)
+                # the thread stays blocked on this entry, keep the pool size
+                start_worker()
+    return results
+
+
+def describe_health(status: str, latency) -> str:
+    """
+    Short text for a health result.
+    :param status:
+    :param latency: seconds, None if the check timed out
+    :return: e.g. "missing" or "slow 350 ms"
+    """
+    if latency is None:
+        return "hung (timed out)"
+    if status == "slow":
+        return f"slow {latency * 1000:.0f} ms"
+    return status
@@ -0,0 +1,122 @@
+import os
+import stat
+
+
+class DirectoryIdentity:
+    """
+    Cached map from a path to the (st_dev, st_ino) of the directory it
+    resolves to, so entries reached through symlinks compare equal.
+    Shared across variables, every directory is stat'ed once.
+    """
+
+    def __init__(self):
+        self._identities = {}
+        self._empty = {}
+
+    def identity(self, path: str):
+        """
+        :param path:
+        :return: (st_dev, st_ino), or None if it is not an existing directory
+        """
+        try:
+            return self._identities[path]
+        except KeyError:
+            pass
+        try:
+            st = os.stat(path)
+            ident = (st.st_dev, st.st_ino) if stat.S_ISDIR(st.st_mode) else None
+        except (OSError, ValueError):
+            ident = None
+        self._identities[path] = ident
+        return ident
+
+    def is_empty(self, path: str) -> bool:
+        """
+        :param path: an existing directory
+        :return: True if the directory has no entries
+        """
+        try:
+            return self._empty[path]
+        except KeyError:
+            pass
+        try:
+            with os.scandir(path) as entries:
+                empty = next(entries, None) is None
+        except OSError:
+            empty = False
+        self._empty[path] = empty
+        return empty
+
+
+def normalize_entry(entry: str) -> str:
+    """
+    Textually normalize a path group entry: repeated separators, "." segments
+    and trailing separators are removed. ".." is kept, since resolving it
+    textually is wrong when the parent is a symlink.
+    :param entry:
+    :return: normalized entry
+    """
+    if not entry or entry.startswith("$"):
+        return entry
+    separators = "/\\" if os.name == "nt" else "/"
+    sep = os.sep
+    if os.name == "nt":
+        entry = entry.replace("/", "\\")
+    drive, rest = os.path.splitdrive(entry)
+    absolute = rest[:1] in separators
+    parts = [part for part in rest.split(sep) if part not in ("", ".")]
+    normalized = sep.join(parts)
+    if absolute:
+        normalized = sep + normalized
+    return drive + normalized if (drive or normalized) else "."
+
+
+def optimize_path_group(
+    value: str,
+    separator: str = os.pathsep,
+    drop_missing: bool = False,
+    drop_empty: bool = False,
+    identities=None,
+):
+    """
+    Remove redundant entries from a path group in one pass, keeping the first
+    occurrence so lookup order does not change.
+    :param value: path group value
+    :param separator:
+    :param drop_missing: also drop entries that are not existing directories
+    :param drop_empty: also drop directories without any entries
+    :param identities: DirectoryIdentity shared between calls
+    :return: (new value, list of (removed entry, reason))
+    """
+    if identities is None:
+        identities = DirectoryIdentity()
+    kept = []
+    removed = []
+    seen_text = {}
+    seen_identity = {}
+    for entry in value.split(separator):
+        normalized = normalize_entry(entry)
+        if normalized in seen_text:
+            original = seen_text[normalized] or "(empty entry)"
+            removed.append((entry, f"duplicate of {original}"))
+            continue
+        # an empty entry means the current directory, and "$VAR" and "~"
+        # entries are expanded by whoever reads them (bash expands "~" in
+        # PATH); never resolve any of them
+        resolvable = normalized and normalized[0] not in "$~"
+        ident = identities.identity(normalized) if resolvable else None
+        if ident is not None and ident in seen_identity:
+            removed.append((entry, f"same directory as {seen_identity[ident]}"))
+            seen_text[normalized] = seen_identity[ident]
+            continue
+        if ident is None and drop_missing and resolvable:
+            removed.append((entry, "missing"))
+            continue
+        if ident is not None and drop_empty and identities.is_empty(normalized):
+            removed.append((entry, "empty"))
+            continue
+        seen_text[normalized] = normalized
+        if ident is not None:
+            seen_identity[ident] = normalized
+        kept.append(normalized)
+    return separator.join(kept), removed
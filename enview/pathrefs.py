@@ -0,0 +1,139 @@
+import os
+
+from enview.pathopt import normalize_entry
+from enview.vartypes import classify_all
+
+
+def component_prefixes(entry: str, sep: str = os.sep):
+    """
+    Get every prefix of a normalized entry that ends at a component
+    boundary, so "/opt/cuda" is a prefix of "/opt/cuda/bin" but not of
+    "/opt/cuda-11".
+    :param entry: normalized path group entry
+    :param sep: path component separator
+    :return: list of prefixes, shortest first, ending with the entry itself
+    """
+    prefixes = []
+    start = 0
+    if entry.startswith(sep):
+        prefixes.append(sep)
+        start = 1
+    index = entry.find(sep, start)
+    while index != -1:
+        prefixes.append(entry[:index])
+        index = entry.find(sep, index + 1)
+    if entry != sep:
+        prefixes.append(entry)
+    return prefixes
+
+
+class PathRefs:
+    """
+    Reverse index from path group entries, and every component prefix of
+    them, to the variables and positions they appear at.
+
+    Path groups and single paths are split once per store version; a lookup
+    is then a dict access however many variables reference the prefix.
+    Entries are compared in their normalized form, so "/opt/x/" and
+    "/opt//x" both match "/opt/x".
+    """
+
+    def __init__(self, store, separator: str = os.pathsep):
+        self.version = store.version
+        self.separator = separator
+        self._order = {}
+        self._groups = set()
+        # normalized entry -> list of (variable, position, entry as written)
+        self._refs = {}
+        # prefix -> set of normalized entries under it
+        self._under = {}
+        types = classify_all(store)
+        for order, (name, value) in enumerate(store.items()):
+            vartype = types.get(name)
+            if vartype == "path_group":
+                self._groups.add(name)
+                entries = value.split(separator)
+            elif vartype == "path":
+                entries = [value]
+            else:
+                continue
+            self._order[name] = order
+            for position, entry in enumerate(entries):
+                if entry:
+                    self._add(name, position, entry)
+
+    def _add(self, name: str, position: int, entry: str):
+        normalized = normalize_entry(entry)
+        refs = self._refs.get(normalized)
+        if refs is None:
+            refs = self._refs[normalized] = []
+            for prefix in component_prefixes(normalized):
+                self._under.setdefault(prefix, set()).add(normalized)
+        refs.append((name, position, entry))
+
+    def is_stale(self, store) -> bool:
+        return store.version != self.version
+
+    def lookup(self, prefix: str):
+        """
+        Get every reference to a path or to anything under it.
+        :param prefix: path, or path prefix ending at a component boundary
+        :return: list of (variable, position, entry), in environment order
+        """
+        found = []
+        for normalized in self._under.get(normalize_entry(prefix), ()):
+            found.extend(self._refs[normalized])
+        found.sort(key=lambda ref: (self._order[ref[0]], ref[1]))
+        return found
+
+    def variables(self, prefix: str):
+        """
+        Get the variables referencing a path or anything under it.
+        :param prefix:
+        :return: list of names, in environment order
+        """
+        return list(dict.fromkeys(name for name, _, _ in self.lookup(prefix)))
+
+    def rewrite(self, store, old: str, new: str):
+        """
+        Compute the values of every variable referencing `old` once that
+        prefix is replaced by `new`. Other entries are kept as written.
+        :param store: the EnvStore the index was built from
+        :param old: prefix to replace
+        :param new: replacement prefix
+        :return: dict mapping variable name to its new value
+        """
+        old = normalize_entry(old)
+        new = normalize_entry(new)
+        targets = {}
+        for name, position, entry in self.lookup(old):
+            rest = normalize_entry(entry)[len(old) :].lstrip(os.sep)
+            targets.setdefault(name, {})[position] = (
+                new.rstrip(os.sep) + os.sep + rest if rest else new
+            )
+        changes = {}
+        for name, replacements in targets.items():
+            value = store[name]
+            if name not in self._groups:
+                changes[name] = replacements[0]
+                continue
+            entries = value.split(self.separator)
+            for position, entry in replacements.items():
+                entries[position] = entry
+            changes[name] = self.separator.join(entries)
+        return changes
+
+
+_cached = None
+
+
+def get_path_refs(store) -> PathRefs:
+    """
+    Get the reference index of a store, rebuilt only when it changed.
+    :param store: EnvStore
+    :return: PathRefs
+    """
+    global _cached
+    if _cached is None or _cached[0] is not store or _cached[1].is_stale(store):
+        _cached = (store, PathRefs(store))
+    return _cached[1]
@@ -0,0 +1,519 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+from contextlib import suppress
+
+from enview import profiling
+from enview.storage import cache_dir, load_json, save_json
+
+MAX_SCAN_WORKERS = 16
+LISTING_CACHE_VERSION = 1
+HASH_CACHE_VERSION = 1
+HASH_CHUNK_BYTES = 1 << 20
+# a directory modified this recently may still change within the same mtime tick
+RACY_MTIME_SECONDS = 2
+
+
+def scan_executables(directory: str):
+    """
+    List the executable files in a directory with a single scandir pass.
+    :param directory: an empty entry means the current directory, like in PATH
+    :return: list of file names, empty if the directory cannot be read
+    """
+    executables = []
+    with profiling.span("scan_executables", "scan"):
+        try:
+            with os.scandir(directory or os.curdir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            executables.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return []
+    return executables
+
+
+def scan_directories(directories, scanner=scan_executables, max_workers=None):
+    """
+    Scan several directories in parallel.
+    :param directories: iterable of directories, duplicates are scanned once
+    :param scanner: function listing one directory
+    :param max_workers: thread pool size
+    :return: dict mapping each directory to its listing
+    """
+    unique = list(dict.fromkeys(directories))
+    if not unique:
+        return {}
+    workers = max_workers or min(MAX_SCAN_WORKERS, len(unique))
+    if workers <= 1:
+        return {directory: scanner(directory) for directory in unique}
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(unique, pool.map(scanner, unique)))
+
+
+class ListingCache:
+    """
+    On-disk cache of directory listings.
+
+    Every entry is keyed by the directory's (st_dev, st_ino, st_mtime_ns), so
+    a directory is listed again only when it was replaced or its content
+    changed. Changing the mode of a file does not touch the directory mtime;
+    pass no cache to pick up such changes.
+    """
+
+    def __init__(self, name: str = "executables", path=None, scanner=None):
+        """
+        :param name: cache file name, one per kind of listing
+        :param path: cache file, defaults to the user cache directory
+        :param scanner: function listing one directory
+        """
+        self.path = path or os.path.join(cache_dir(), f"{name}.json")
+        self.scanner = scanner or scan_executables
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        data = load_json(self.path, {})
+        if not isinstance(data, dict) or data.get("version") != LISTING_CACHE_VERSION:
+            data = {}
+        self._entries = data.get("entries", {})
+
+    def listing(self, directory: str):
+        """
+        Get the listing of a directory, scanning it only if it changed.
+        :param directory:
+        :return: list of names
+        """
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entry = self._entries.get(directory)
+        try:
+            st = os.stat(directory or os.curdir)
+        except OSError:
+            return []
+        key = [st.st_dev, st.st_ino, st.st_mtime_ns]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        names = self.scanner(directory)
+        if time.time() - st.st_mtime > RACY_MTIME_SECONDS:
+            with self._lock:
+                self._entries[directory] = [key, names]
+                self._dirty = True
+        return names
+
+    def save(self):
+        """
+        Write the cache back if anything was rescanned.
+        :return:
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            # a read-only cache location only costs us the speedup
+            with suppress(OSError):
+                save_json(
+                    self.path,
+                    {"version": LISTING_CACHE_VERSION, "entries": self._entries},
+                )
+            self._dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+        return False
+
+
+def file_identity(path: str):
+    """
+    Identify the file a path leads to, following symlinks.
+    :param path:
+    :return: (st_dev, st_ino, st_size, st_mtime_ns), or None if it cannot be read
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def hash_file(path: str):
+    """
+    Hash the content of a file.
+    :param path:
+    :return: hex digest, or None if it cannot be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    On-disk cache of file content hashes.
+
+    Entries are keyed by (st_dev, st_ino) and only trusted while the size and
+    mtime are unchanged, so a file is hashed again only when it was modified.
+    """
+
+    def __init__(self, path=None, persist: bool = True):
+        """
+        :param path: cache file, defaults to the user cache directory
+        :param persist: read and write the cache file, False to only keep
+        hashes in memory
+        """
+        self.persist = persist
+        self.path = path
+        if persist and path is None:
+            self.path = os.path.join(cache_dir(), "hashes.json")
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        data = load_json(self.path, {}) if self.persist else {}
+        if not isinstance(data, dict) or data.get("version") != HASH_CACHE_VERSION:
+            data = {}
+        self._entries = data.get("entries", {})
+
+    def digest(self, path: str, identity=None):
+        """
+        Get the content hash of a file, hashing it only if it changed.
+        :param path:
+        :param identity: result of `file_identity(path)`, if already known
+        :return: hex digest, or None if it cannot be read
+        """
+        identity = identity or file_identity(path)
+        if identity is None:
+            return None
+        dev, ino, size, mtime_ns = identity
+        key = f"{dev}:{ino}"
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        with profiling.span("hash_file", "scan"):
+            digest = hash_file(path)
+        if digest is not None and time.time() - mtime_ns / 1e9 > RACY_MTIME_SECONDS:
+            with self._lock:
+                self._entries[key] = [size, mtime_ns, digest]
+                self._dirty = True
+        return digest
+
+    def save(self):
+        """
+        Write the cache back if anything was hashed.
+        :return:
+        """
+        with self._lock:
+            if not self._dirty or not self.persist:
+                return
+            with suppress(OSError):
+                save_json(
+                    self.path,
+                    {"version": HASH_CACHE_VERSION, "entries": self._entries},
+                )
+            self._dirty = False
+
+
+def same_file_keys(paths, hashes=None, max_workers=None):
+    """
+    Key files so that paths reaching the same file share a key: the same
+    (st_dev, st_ino), or with `hashes`, the same size and content. Only files
+    whose size matches another file's are hashed.
+    :param paths: file paths
+    :param hashes: HashCache, None to compare identities only
+    :param max_workers: thread pool size
+    :return: dict mapping path to key, None for files that cannot be read
+    """
+    identities = scan_directories(paths, scanner=file_identity, max_workers=max_workers)
+    keys = {
+        path: None if identity is None else ("inode", identity[0], identity[1])
+        for path, identity in identities.items()
+    }
+    if hashes is None:
+        return keys
+
+    # one path per inode, grouped by size
+    by_size = {}
+    for path, identity in identities.items():
+        if identity is not None:
+            by_size.setdefault(identity[2], {}).setdefault(identity[:2], path)
+    candidates = [
+        path
+        for inodes in by_size.values()
+        if len(inodes) > 1
+        for path in inodes.values()
+    ]
+    digests = scan_directories(
+        candidates,
+        scanner=lambda path: hashes.digest(path, identities[path]),
+        max_workers=max_workers,
+    )
+    hashes.save()
+    content_keys = {}
+    for path, digest in digests.items():
+        if digest is not None:
+            content_keys[identities[path][:2]] = (
+                "content",
+                identities[path][2],
+                digest,
+            )
+    for path, identity in identities.items():
+        if identity is not None and identity[:2] in content_keys:
+            keys[path] = content_keys[identity[:2]]
+    return keys
+
+
+class ExecutableIndex:
+    """
+    Inverted index from executable name to the PATH entries providing it,
+    in lookup order. The first provider wins, the others are shadowed.
+    """
+
+    def __init__(self, directories, listings):
+        """
+        :param directories: path group entries, in lookup order
+        :param listings: dict mapping each directory to its executables
+        """
+        self.directories = list(dict.fromkeys(directories))
+        self.listings = listings
+        self.providers = {}
+        for directory in self.directories:
+            for name in listings.get(directory, ()):
+                self.providers.setdefault(name, []).append(directory)
+
+    @classmethod
+    def build(cls, directories, max_workers=None, cache=None):
+        """
+        Scan the directories and build the index.
+        :param directories:
+        :param max_workers:
+        :param cache: ListingCache to reuse unchanged listings from
+        :return: ExecutableIndex
+        """
+        directories = list(directories)
+        scanner = cache.listing if cache is not None else scan_executables
+        with profiling.span("scan_directories", "scan"):
+            listings = scan_directories(
+                directories, scanner=scanner, max_workers=max_workers
+            )
+            if cache is not None:
+                cache.save()
+        return cls(directories, listings)
+
+    def reorder(self, directories, scanner=scan_executables):
+        """
+        Index another order or subset of directories, scanning only the
+        directories that were not part of this index.
+        :param directories: path group entries, in lookup order
+        :param scanner: function listing one directory
+        :return: ExecutableIndex
+        """
+        listings = self.listings
+        missing = [directory for directory in directories if directory not in listings]
+        if missing:
+            listings = dict(listings)
+            listings.update(scan_directories(missing, scanner=scanner))
+        return ExecutableIndex(directories, listings)
+
+    def winner(self, name: str):
+        """
+        Get the directory an executable resolves to.
+        :param name:
+        :return: directory, or None if no entry provides it
+        """
+        providers = self.providers.get(name)
+        return providers[0] if providers else None
+
+    def resolve(self, name: str):
+        """
+        Get the file a command name runs, like the shell's PATH lookup.
+        :param name:
+        :return: path, or None if no entry provides it
+        """
+        directory = self.winner(name)
+        if directory is None:
+            return None
+        return os.path.join(directory or os.curdir, name)
+
+    def resolution_changes(self, other, max_workers=None):
+        """
+        Compare which file every executable resolves to. A name whose
+        directory changed but that still runs the same file (the new entry
+        is a symlink to the old one, or the copies are hard links) did not
+        change.
+        :param other: ExecutableIndex of the new path group
+        :param max_workers: thread pool size
+        :return: dict mapping name to (old directory, new directory), where
+        None means the name does not resolve
+        """
+        changes = {}
+        for name in self.providers.keys() | other.providers.keys():
+            old = self.winner(name)
+            new = other.winner(name)
+            if old != new:
+                changes[name] = (old, new)
+        moved = {
+            name: (self.resolve(name), other.resolve(name))
+            for name, (old, new) in changes.items()
+            if old is not None and new is not None
+        }
+        keys = same_file_keys(
+            {path for paths in moved.values() for path in paths},
+            max_workers=max_workers,
+        )
+        for name, (old_path, new_path) in moved.items():
+            if keys[old_path] is not None and keys[old_path] == keys[new_path]:
+                del changes[name]
+        return changes
+
+    def shadowed(self, name: str):
+        """
+        Get the directories whose copy of an executable is never used.
+        :param name:
+        :return: list of directories
+        """
+        return self.providers.get(name, [])[1:]
+
+    def conflicts(self):
+        """
+        Get every executable provided by more than one directory.
+        :return: dict mapping name to its providers
+        """
+        return {
+            name: providers
+            for name, providers in self.providers.items()
+            if len(providers) > 1
+        }
+
+    def update(self, listings):
+        """
+        Replace the listings of some directories, touching only the names
+        that appeared in or disappeared from them.
+        :param listings: dict mapping directory to its new listing
+        :return: set of names whose providers changed
+        """
+        order = {directory: index for index, directory in enumerate(self.directories)}
+        merged = dict(self.listings)
+        affected = set()
+        for directory, names in listings.items():
+            if directory not in order:
+                continue
+            old = set(self.listings.get(directory, ()))
+            new = set(names)
+            for name in old - new:
+                providers = self.providers[name]
+                providers.remove(directory)
+                if not providers:
+                    del self.providers[name]
+                affected.add(name)
+            for name in new - old:
+                providers = self.providers.setdefault(name, [])
+                positions = [order[provider] for provider in providers]
+                providers.insert(bisect.bisect(positions, order[directory]), directory)
+                affected.add(name)
+            merged[directory] = names
+        self.listings = merged
+        return affected
+
+    def distinct_conflicts(self, hashes=None, max_workers=None, names=None):
+        """
+        Get the conflicts where a shadowed copy is really another file, not
+        an earlier copy reached through a symlink or hard link (or, with
+        `hashes`, a byte-identical copy). Copies are grouped by file, and
+        only the first directory of each group is kept.
+        :param hashes: HashCache to compare contents with, None to compare
+        identities only
+        :param max_workers: thread pool size
+        :param names: only check these names
+        :return: (dict mapping name to the directories of its distinct files,
+        winner first, set of the names whose copies are all identical)
+        """
+        conflicts = self.conflicts()
+        if names is not None:
+            conflicts = {name: conflicts[name] for name in names if name in conflicts}
+        paths = {
+            (name, directory): os.path.join(directory or os.curdir, name)
+            for name, providers in conflicts.items()
+            for directory in providers
+        }
+        keys = same_file_keys(paths.values(), hashes, max_workers)
+        distinct = {}
+        identical = set()
+        for name, providers in conflicts.items():
+            seen = set()
+            kept = []
+            for directory in providers:
+                key = keys[paths[name, directory]]
+                # files that cannot be read are never the same as another
+                if key is None or key not in seen:
+                    seen.add(key)
+                    kept.append(directory)
+            if len(kept) > 1:
+                distinct[name] = kept
+            else:
+                identical.add(name)
+        return distinct, identical
+
+    def conflict_groups(self, conflicts=None):
+        """
+        Group conflicting executables by the directories providing them.
+        :param conflicts: dict mapping name to providers, all conflicts if not
+        given
+        :return: dict mapping a providers tuple to the sorted names
+        """
+        if conflicts is None:
+            conflicts = self.conflicts()
+        groups = {}
+        for name, providers in conflicts.items():
+            groups.setdefault(tuple(providers), []).append(name)
+        for names in groups.values():
+            names.sort()
+        return groups
+
+    def counts(self, conflicts=None):
+        """
+        Per directory statistics.
+        :param conflicts: dict mapping name to the directories that really
+        conflict, as returned by `distinct_conflicts`; other names are not
+        conflicts. Every copy is a conflict if not given.
+        :return: dict mapping directory to (provided, shadowed, shadowing), where
+        shadowed counts its executables hidden by earlier entries and shadowing
+        counts the executables it hides in later entries.
+        """
+        stats = {directory: [0, 0, 0] for directory in self.directories}
+        for name, providers in self.providers.items():
+            for directory in providers:
+                stats[directory][0] += 1
+            if conflicts is not None:
+                providers = conflicts.get(name, providers[:1])
+            for directory in providers[1:]:
+                stats[directory][1] += 1
+            if len(providers) > 1:
+                stats[providers[0]][2] += 1
+        return {directory: tuple(values) for directory, values in stats.items()}
@@ -0,0 +1,186 @@
+import os
+from collections.abc import Mapping
+
+PROC_ROOT = "/proc"
+MAX_PROC_WORKERS = 16
+
+
+def proc_supported() -> bool:
+    """
+    Check if process environments can be read through /proc.
+    :return: bool
+    """
+    return os.path.isdir(os.path.join(PROC_ROOT, "self"))
+
+
+def read_environ_raw(pid: int):
+    """
+    Read the raw environment block of a process.
+    :param pid:
+    :return: NUL-separated bytes, or None if the process is gone or not readable
+    """
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "environ"), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def read_comm(pid: int) -> str:
+    """
+    Get the command name of a process.
+    :param pid:
+    :return: name, empty if unknown
+    """
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "comm"), "rb") as f:
+            return os.fsdecode(f.read().rstrip(b"\n"))
+    except OSError:
+        return ""
+
+
+def read_start_time(pid: int) -> str:
+    """
+    Get when a process started, in clock ticks since boot. Together with the
+    pid it names one process, even after the pid is reused.
+    :param pid:
+    :return: start time, empty if unknown
+    """
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "stat"), "rb") as f:
+            stat = f.read()
+    except OSError:
+        return ""
+    # the command name in parentheses may hold spaces; starttime is the 22nd
+    # field, the 20th after the name
+    fields = stat[stat.rfind(b")") + 2 :].split()
+    return fields[19].decode() if len(fields) > 19 else ""
+
+
+def list_pids():
+    """
+    List the running processes.
+    :return: sorted list of pids
+    """
+    try:
+        return sorted(int(name) for name in os.listdir(PROC_ROOT) if name.isdigit())
+    except OSError:
+        return []
+
+
+def raw_value(raw: bytes, name: bytes):
+    """
+    Find one variable in a raw environment block without splitting it.
+    :param raw: NUL-separated environment block
+    :param name: variable name
+    :return: value bytes, or None if it is not set
+    """
+    key = name + b"="
+    if raw.startswith(key):
+        start = len(key)
+    else:
+        found = raw.find(b"\0" + key)
+        if found < 0:
+            return None
+        start = found + 1 + len(key)
+    end = raw.find(b"\0", start)
+    return raw[start:] if end < 0 else raw[start:end]
+
+
+class RawEnviron(Mapping):
+    """
+    Read-only mapping over a raw environment block. The block is split once
+    and each value is decoded only when it is looked up.
+    """
+
+    def __init__(self, raw: bytes):
+        self._values = {}
+        for entry in raw.split(b"\0"):
+            name, sep, value = entry.partition(b"=")
+            if sep and name:
+                self._values[os.fsdecode(name)] = value
+
+    def __getitem__(self, name: str) -> str:
+        return os.fsdecode(self._values[name])
+
+    def raw_items(self):
+        """
+        Get the variables without decoding their values.
+        :return: iterable of (name, value bytes)
+        """
+        return self._values.items()
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __setitem__(self, name, value):
+        raise TypeError("the environment of another process is read-only")
+
+    def pop(self, name, default=None):
+        raise TypeError("the environment of another process is read-only")
+
+
+def parse_query(query: str):
+    """
+    Build a predicate over raw environment blocks from a query:
+    "NAME" (set), "NAME=VALUE" (equal) or "NAME~TEXT" (value contains TEXT).
+    :param query:
+    :return: (name, predicate); the predicate returns the value or None
+    """
+    separator = min(
+        (index for index in (query.find("="), query.find("~")) if index > 0),
+        default=-1,
+    )
+    if separator < 0:
+        name, operator, operand = query, "", b""
+    else:
+        name, operator = query[:separator], query[separator]
+        operand = os.fsencode(query[separator + 1 :])
+    encoded_name = os.fsencode(name)
+
+    def predicate(raw: bytes):
+        value = raw_value(raw, encoded_name)
+        if value is None:
+            return None
+        if operator == "=" and value != operand:
+            return None
+        if operator == "~" and operand not in value:
+            return None
+        return os.fsdecode(value)
+
+    return name, predicate
+
+
+def scan_processes(predicate, pids=None, max_workers=None):
+    """
+    Read the environment of many processes in parallel and keep the matches.
+    :param predicate: function raw block -> result, None to skip the process
+    :param pids: processes to scan, all if not given
+    :param max_workers: thread pool size
+    :return: (list of (pid, result), number of processes not readable)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    pids = list_pids() if pids is None else list(pids)
+    if not pids:
+        return [], 0
+
+    def check(pid):
+        raw = read_environ_raw(pid)
+        if raw is None:
+            return pid, None, True
+        return pid, predicate(raw), False
+
+    matches = []
+    unreadable = 0
+    workers = max_workers or min(MAX_PROC_WORKERS, len(pids))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for pid, result, failed in pool.map(check, pids):
+            if failed:
+                unreadable += 1
+            elif result is not None:
+                matches.append((pid, result))
+    return matches, unreadable
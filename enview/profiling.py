@@ -0,0 +1,206 @@
+"""
+Opt-in instrumentation of the hot paths.
+
+Nothing is recorded until `enable` is called (by `--profile` or `--trace`);
+until then `span` returns a shared no-op context manager and `count` returns
+right away, so the instrumented code pays one global lookup.
+"""
+
+import json
+import os
+import threading
+import time
+
+_profiler = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("category", "name", "profiler", "start")
+
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.profiler.add(self.name, self.category, self.start, end - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Collects timed spans and counters. Per-name totals are always kept; the
+    individual events are only kept when a trace was requested.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.origin = time.perf_counter()
+        self.trace = trace
+        self.totals = {}
+        self.counters = {}
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, category: str, start: float, duration: float):
+        """
+        Record one finished span.
+        :param name:
+        :param category:
+        :param start: perf_counter value at the start
+        :param duration: seconds
+        :return:
+        """
+        with self._lock:
+            total = self.totals.get(name)
+            if total is None:
+                self.totals[name] = [1, duration, duration]
+            else:
+                total[0] += 1
+                total[1] += duration
+                total[2] = max(total[2], duration)
+            if self.trace:
+                self.events.append(
+                    ("X", name, category, start, duration, threading.get_ident())
+                )
+
+    def count(self, name: str, amount: int = 1):
+        """
+        Increase a counter.
+        :param name:
+        :param amount:
+        :return:
+        """
+        with self._lock:
+            value = self.counters.get(name, 0) + amount
+            self.counters[name] = value
+            if self.trace:
+                self.events.append(
+                    ("C", name, "counter", time.perf_counter(), value, 0)
+                )
+
+    def report(self, stream):
+        """
+        Print the totals per span name, slowest first, and the counters.
+        :param stream:
+        :return:
+        """
+        wall = (time.perf_counter() - self.origin) * 1000
+        stream.write(f"enview profile, {wall:.1f} ms wall time\n")
+        stream.write(
+            f"{'span':<32} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}\n"
+        )
+        totals = sorted(self.totals.items(), key=lambda item: -item[1][1])
+        for name, (calls, total, longest) in totals:
+            stream.write(
+                f"{name:<32} {calls:>7} {total * 1000:>10.2f}"
+                f" {total / calls * 1000:>9.3f} {longest * 1000:>9.2f}\n"
+            )
+        for name, value in sorted(self.counters.items()):
+            stream.write(f"{name}: {value}\n")
+        stream.flush()
+
+    def trace_events(self):
+        """
+        Convert the recorded events to the Chrome trace event format.
+        :return: list of event dicts
+        """
+        pid = os.getpid()
+        events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "enview"}}
+        ]
+        for phase, name, category, start, value, tid in self.events:
+            timestamp = (start - self.origin) * 1e6
+            if phase == "X":
+                events.append(
+                    {
+                        "name": name,
+                        "cat": category,
+                        "ph": "X",
+                        "ts": timestamp,
+                        "dur": value * 1e6,
+                        "pid": pid,
+                        "tid": tid,
+                    }
+                )
+            else:
+                events.append(
+                    {
+                        "name": name,
+                        "ph": "C",
+                        "ts": timestamp,
+                        "pid": pid,
+                        "args": {"value": value},
+                    }
+                )
+        return events
+
+    def write_trace(self, path: str):
+        """
+        Write a trace loadable by chrome://tracing or Perfetto.
+        :param path:
+        :return:
+        """
+        from enview.storage import atomic_open
+
+        with atomic_open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+
+
+def enable(trace: bool = False) -> Profiler:
+    """
+    Start recording.
+    :param trace: also keep every event, for `Profiler.write_trace`
+    :return: Profiler
+    """
+    global _profiler
+    _profiler = Profiler(trace)
+    return _profiler
+
+
+def disable():
+    """
+    Stop recording.
+    :return: the Profiler that was active, or None
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def span(name: str, category: str = "enview"):
+    """
+    Time a block: `with span("render.env_list", "render"): ...`
+    :param name:
+    :param category: trace category
+    :return: context manager
+    """
+    if _profiler is None:
+        return _NULL_SPAN
+    return _Span(_profiler, name, category)
+
+
+def count(name: str, amount: int = 1):
+    """
+    Increase a counter, e.g. "subprocess launches".
+    :param name:
+    :param amount:
+    :return:
+    """
+    if _profiler is not None:
+        _profiler.count(name, amount)
@@ -0,0 +1,104 @@
+"""
+Deferred command registration.
+
+`command` and `argument` take the same parameters as their nubia
+counterparts, but only record them. The non-interactive entry point builds
+its argument parser from the records, and `bind_nubia` hands them to nubia
+when the interactive shell actually starts, so running one command never
+imports nubia, prompt_toolkit or Pygments.
+"""
+
+COMMANDS = {}
+
+
+def argument(arg: str, **spec):
+    """
+    Record an argument of a command, see `nubia.argument`. Pass `name` to
+    give it another name on the command line than the parameter's, e.g. for
+    a parameter that would otherwise shadow a builtin.
+    :param arg: parameter name of the command function
+    :return: decorator
+    """
+
+    def decorator(function):
+        arguments = function.__dict__.setdefault("_enview_arguments", [])
+        # decorators apply bottom-up, keep the declaration order
+        arguments.insert(0, dict(spec, arg=arg))
+        return function
+
+    return decorator
+
+
+def command(name: str, **spec):
+    """
+    Record a command, see `nubia.command`.
+    :param name: command name
+    :return: decorator
+    """
+
+    def decorator(function):
+        function.__dict__.setdefault("_enview_arguments", [])
+        function._enview_command = dict(spec, name=name)
+        COMMANDS[name] = function
+        return function
+
+    return decorator
+
+
+def _defaulted_parameters(function):
+    """
+    Get the names of the parameters of a function that have a default.
+    :param function:
+    :return: set of names
+    """
+    code = function.__code__
+    names = code.co_varnames[: code.co_argcount]
+    return set(names[len(names) - len(function.__defaults__ or ()) :])
+
+
+def bind_nubia():
+    """
+    Apply the real nubia decorators to every recorded command.
+    :return:
+    """
+    from nubia import argument as nubia_argument
+    from nubia import command as nubia_command
+
+    for function in COMMANDS.values():
+        if getattr(function, "_enview_nubia_bound", False):
+            continue
+        defaulted = _defaulted_parameters(function)
+        for spec in reversed(function._enview_arguments):
+            spec = dict(spec)
+            arg = spec.pop("arg")
+            if spec.get("positional") and arg in defaulted:
+                # nubia rejects positional arguments with a default, they
+                # are options in the shell and stay positional on the CLI
+                del spec["positional"]
+            nubia_argument(arg, **spec)(function)
+        spec = dict(function._enview_command)
+        nubia_command(spec.pop("name"), **spec)(function)
+        function._enview_nubia_bound = True
+
+
+def nubia_plugin(options=None):
+    """
+    Build a nubia plugin that hands nubia the bound command functions.
+    Passing the command package to nubia instead would make it re-execute
+    the command modules, which records fresh, unbound functions.
+    :param options: nubia.Options the commands are built with
+    :return: nubia.PluginInterface
+    """
+    from nubia import PluginInterface
+
+    # nubia has no public way to wrap a function as a command; setup.py pins
+    # the version this internal class comes from
+    from nubia.internal.cmdbase import AutoCommand
+
+    bind_nubia()
+
+    class EnviewPlugin(PluginInterface):
+        def get_commands(self):
+            return [AutoCommand(function, options) for function in COMMANDS.values()]
+
+    return EnviewPlugin()
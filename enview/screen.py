@@ -0,0 +1,406 @@
+import codecs
+import os
+import signal
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENTER_ALT_SCREEN = "\033[?1049h"
+LEAVE_ALT_SCREEN = "\033[?1049l"
+HIDE_CURSOR = "\033[?25l"
+SHOW_CURSOR = "\033[?25h"
+CLEAR_SCREEN = "\033[2J"
+CLEAR_LINE = "\033[K"
+
+
+def move_to(row: int, column: int = 0) -> str:
+    """
+    ANSI sequence moving the cursor to a 0-based (row, column).
+    :param row:
+    :param column:
+    :return: escape sequence
+    """
+    return f"\033[{row + 1};{column + 1}H"
+
+
+# keys the views understand, by escape sequence (xterm and VT220 style)
+ESCAPE_KEYS = {
+    "\x1b[A": "up",
+    "\x1b[B": "down",
+    "\x1b[C": "right",
+    "\x1b[D": "left",
+    "\x1bOA": "up",
+    "\x1bOB": "down",
+    "\x1bOC": "right",
+    "\x1bOD": "left",
+    "\x1b[5~": "page_up",
+    "\x1b[6~": "page_down",
+    "\x1b[H": "home",
+    "\x1b[F": "end",
+    "\x1bOH": "home",
+    "\x1bOF": "end",
+    "\x1b[1~": "home",
+    "\x1b[4~": "end",
+    "\x1b[7~": "home",
+    "\x1b[8~": "end",
+}
+# second character of the Windows console's two-character keys
+_WINDOWS_KEYS = {
+    "H": "\x1b[A",
+    "P": "\x1b[B",
+    "M": "\x1b[C",
+    "K": "\x1b[D",
+    "I": "\x1b[5~",
+    "Q": "\x1b[6~",
+    "G": "\x1b[H",
+    "O": "\x1b[F",
+}
+
+
+def split_keys(text: str):
+    """
+    Split terminal input into keys. Known escape sequences become key
+    names, unknown ones are dropped, and Esc on its own stays "\x1b".
+    :param text:
+    :return: (list of keys, unfinished escape sequence at the end of text)
+    """
+    keys = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char != "\x1b":
+            keys.append(char)
+            index += 1
+            continue
+        kind = text[index + 1 : index + 2]
+        if kind == "[":
+            # CSI: parameters, then one final byte in @..~
+            end = index + 2
+            while end < len(text) and not "@" <= text[end] <= "~":
+                end += 1
+        elif kind == "O":
+            end = index + 2
+        elif kind:
+            keys.append(char)
+            index += 1
+            continue
+        else:
+            return keys, text[index:]
+        if end >= len(text):
+            return keys, text[index:]
+        name = ESCAPE_KEYS.get(text[index : end + 1])
+        if name is not None:
+            keys.append(name)
+        index = end + 1
+    return keys, ""
+
+
+class KeyReader:
+    """
+    Keyboard input for the full screen views.
+
+    While active, the terminal is in cbreak mode: keys are readable as soon
+    as they are typed and are not echoed. Reads block in select (or in the
+    console on Windows) instead of polling, and everything already typed is
+    read at once, so a view can apply a burst of keys (a held "j") and draw
+    only the final state. Arrows, PageUp/PageDown, Home and End are returned
+    by name: "up", "down", "left", "right", "page_up", "page_down", "home",
+    "end".
+    """
+
+    # seconds to wait for the rest of an escape sequence before taking Esc
+    # on its own
+    ESCAPE_DELAY = 0.05
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdin
+        self.closed = False
+        self._keys = deque()
+        self._partial = ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._attributes = None
+
+    def __enter__(self):
+        self._attributes = self._cbreak()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._restore()
+        return False
+
+    def _fileno(self):
+        try:
+            return self.stream.fileno()
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    def _cbreak(self):
+        if os.name == "nt":
+            return None
+        import termios
+        import tty
+
+        fd = self._fileno()
+        if fd is None:
+            return None
+        try:
+            attributes = termios.tcgetattr(fd)
+        except termios.error:
+            # not a terminal, input is not line buffered anyway
+            return None
+        tty.setcbreak(fd, termios.TCSANOW)
+        return attributes
+
+    def _restore(self):
+        if self._attributes is not None:
+            import termios
+
+            termios.tcsetattr(self._fileno(), termios.TCSADRAIN, self._attributes)
+            self._attributes = None
+
+    @contextmanager
+    def cooked(self):
+        """
+        Give the terminal its normal mode back, e.g. to run an editor.
+        :return:
+        """
+        active = self._attributes is not None
+        self._restore()
+        try:
+            yield self
+        finally:
+            if active:
+                self._attributes = self._cbreak()
+
+    def _wait(self, timeout) -> bool:
+        if os.name == "nt":
+            import msvcrt
+
+            if timeout is None:
+                # getwch blocks in the console until a key comes
+                return True
+            deadline = time.monotonic() + timeout
+            while not msvcrt.kbhit():
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.02)
+            return True
+        import select
+
+        return bool(select.select([self._fileno()], [], [], timeout)[0])
+
+    def _read(self):
+        """
+        :return: text read, None at the end of the input
+        """
+        if os.name == "nt":
+            import msvcrt
+
+            char = msvcrt.getwch()
+            if char in ("\x00", "\xe0"):
+                return _WINDOWS_KEYS.get(msvcrt.getwch(), "")
+            return char
+        data = os.read(self._fileno(), 4096)
+        if not data:
+            return None
+        return self._decoder.decode(data)
+
+    def _fill(self, timeout) -> bool:
+        if self.closed:
+            return False
+        text = self._partial
+        self._partial = ""
+        wait = timeout
+        while self._wait(wait):
+            chunk = self._read()
+            if chunk is None:
+                self.closed = True
+                break
+            text += chunk
+            # keep reading while keys are already there, and give an escape
+            # sequence cut in the middle time to arrive
+            tail = text[text.rfind("\x1b") :] if "\x1b" in text[-8:] else ""
+            wait = self.ESCAPE_DELAY if tail and split_keys(tail)[1] else 0
+        keys, partial = split_keys(text)
+        if partial:
+            # nothing followed, it was the Esc key
+            keys.append("\x1b")
+        self._keys.extend(keys)
+        return bool(keys)
+
+    def read_key(self, timeout=None):
+        """
+        Get the next key, waiting for it.
+        :param timeout: seconds, None to wait as long as it takes
+        :return: key, or None on timeout or at the end of the input
+        """
+        if not self._keys and not self._fill(timeout):
+            return None
+        return self._keys.popleft()
+
+    def pending(self) -> bool:
+        """
+        Check, without waiting, whether more keys were typed already.
+        :return: bool
+        """
+        return bool(self._keys) or self._fill(0)
+
+
+class Screen:
+    """
+    Frame renderer for the full screen views.
+
+    Frames are drawn on the alternate screen buffer. The previous frame is
+    kept so only rows that changed are rewritten, and every frame goes out in
+    a single write. The terminal size is cached and only queried again after
+    a SIGWINCH (or on every frame where SIGWINCH does not exist). Keys are
+    read through `keys`, a KeyReader active as long as the screen is.
+    """
+
+    def __init__(self, stream=None, keys=None):
+        self.stream = stream or sys.stdout
+        self.keys = keys or KeyReader()
+        self._frame = []
+        self._full_redraw = True
+        self._size = None
+        self._old_handler = None
+        self._resize_hooked = False
+        self._active = False
+
+    def __enter__(self):
+        self._install_resize_handler()
+        self.keys.__enter__()
+        self._write(ENTER_ALT_SCREEN + HIDE_CURSOR)
+        self._active = True
+        self.invalidate()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._active = False
+        self._write(SHOW_CURSOR + LEAVE_ALT_SCREEN)
+        self.keys.__exit__(*exc_info)
+        self._restore_resize_handler()
+        return False
+
+    def _install_resize_handler(self):
+        if not hasattr(signal, "SIGWINCH"):
+            return
+        try:
+            self._old_handler = signal.signal(signal.SIGWINCH, self._on_resize)
+            self._resize_hooked = True
+        except ValueError:
+            # not in the main thread, fall back to querying every frame
+            self._resize_hooked = False
+
+    def _restore_resize_handler(self):
+        if self._resize_hooked:
+            signal.signal(signal.SIGWINCH, self._old_handler)
+            self._resize_hooked = False
+
+    def _on_resize(self, signum, frame):
+        self._size = None
+        self._full_redraw = True
+
+    def _write(self, data: str):
+        self.stream.write(data)
+        self.stream.flush()
+
+    def size(self):
+        """
+        Get the terminal size, relayouting only after a resize.
+        :return: (columns, rows)
+        """
+        if self._size is None or not self._resize_hooked:
+            try:
+                self._size = tuple(os.get_terminal_size(self.stream.fileno()))
+            except (OSError, ValueError, AttributeError):
+                self._size = tuple(os.get_terminal_size())
+        return self._size
+
+    def invalidate(self):
+        """
+        Forget the previous frame so the next draw repaints everything.
+        :return:
+        """
+        self._frame = []
+        self._full_redraw = True
+
+    def clear(self):
+        """
+        Clear the terminal and move the cursor home, also while suspended,
+        e.g. before a prompt on the normal screen.
+        :return:
+        """
+        self._write(CLEAR_SCREEN + move_to(0))
+        self.invalidate()
+
+    def draw(self, lines):
+        """
+        Draw a frame, rewriting only the rows that differ from the last one.
+        :param lines: rendered rows, top to bottom
+        :return: number of rows written
+        """
+        buffer = []
+        if self._full_redraw:
+            buffer.append(CLEAR_SCREEN)
+            self._frame = []
+            self._full_redraw = False
+        previous = self._frame
+        written = 0
+        for row, line in enumerate(lines):
+            if row < len(previous) and previous[row] == line:
+                continue
+            buffer.append(move_to(row) + line + CLEAR_LINE)
+            written += 1
+        for row in range(len(lines), len(previous)):
+            buffer.append(move_to(row) + CLEAR_LINE)
+        if buffer:
+            self._write("".join(buffer))
+        self._frame = list(lines)
+        return written
+
+    def prompt(self, message: str = "") -> str:
+        """
+        Read a line of input on the bottom row of the screen. The line is
+        read through `keys`, so keys typed ahead are not lost.
+        :param message:
+        :return: user input, empty if cancelled with Esc
+        """
+        _, rows = self.size()
+        text = ""
+        try:
+            while True:
+                self._write(
+                    move_to(rows - 1) + message + text + CLEAR_LINE + SHOW_CURSOR
+                )
+                key = self.keys.read_key()
+                if key is None or key in ("\r", "\n"):
+                    return text
+                if key == "\x1b":
+                    return ""
+                if key in ("\x7f", "\x08"):
+                    text = text[:-1]
+                elif len(key) == 1 and key.isprintable():
+                    text += key
+        finally:
+            self._write(HIDE_CURSOR)
+            self.invalidate()
+
+    @contextmanager
+    def suspend(self):
+        """
+        Temporarily leave the alternate screen, e.g. to run an editor.
+        :return:
+        """
+        if not self._active:
+            yield self
+            return
+        self._write(SHOW_CURSOR + LEAVE_ALT_SCREEN)
+        try:
+            with self.keys.cooked():
+                yield self
+        finally:
+            self._write(ENTER_ALT_SCREEN + HIDE_CURSOR)
+            self._size = None
+            self.invalidate()
@@ -0,0 +1,249 @@
+import heapq
+import warnings
+
+# only the head of huge values is indexed, searching deeper is what refs is for
+VALUE_INDEX_LIMIT = 4096
+FUZZY_LIMIT = 50
+RANK_LIMIT = 200
+# rows of the edit view scored fuzzily, about a screenful
+VISIBLE_ROWS = 50
+
+
+def trigrams(text: str):
+    """
+    Get the set of 3-character substrings of a (lower-cased) string.
+    :param text:
+    :return: set of trigrams
+    """
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _scorers():
+    with warnings.catch_warnings():
+        # fuzzywuzzy warns when python-Levenshtein is not installed
+        warnings.simplefilter("ignore")
+        from fuzzywuzzy import fuzz
+    import jellyfish
+
+    return fuzz.WRatio, jellyfish.jaro_winkler_similarity
+
+
+class SearchIndex:
+    """
+    Lower-cased names (and optionally values) of an EnvStore plus a trigram
+    index over them. The trigram index is built on the first query that
+    needs it, and `refresh` re-indexes only the variables that changed.
+    """
+
+    def __init__(self, store, include_values: bool = False):
+        self.include_values = include_values
+        self.version = None
+        self.keys = []
+        self.values = [] if include_values else None
+        self._sources = []
+        self._postings = None
+        self.refresh(store)
+
+    def refresh(self, store):
+        """
+        Bring the index up to date with the store. Changed and added
+        variables are re-indexed in place; a removal shifts the positions,
+        so the whole index is rebuilt then.
+        :param store: EnvStore
+        :return:
+        """
+        if store.version == self.version:
+            return
+        self.version = store.version
+        if self.include_values:
+            sources = [store.item_at(i) for i in range(len(store))]
+        else:
+            sources = [(key,) for key in store]
+        old, self._sources = self._sources, sources
+        if len(sources) < len(old) or any(
+            before[0] != after[0] for before, after in zip(old, sources)
+        ):
+            self.keys = [source[0].lower() for source in sources]
+            if self.include_values:
+                self.values = [self._indexed_value(source) for source in sources]
+            self._postings = None
+            return
+        changed = [i for i in range(len(old)) if old[i] != sources[i]]
+        for position in changed + list(range(len(old), len(sources))):
+            if position < len(old):
+                self._index(position, remove=True)
+                self.values[position] = self._indexed_value(sources[position])
+            else:
+                self.keys.append(sources[position][0].lower())
+                if self.include_values:
+                    self.values.append(self._indexed_value(sources[position]))
+            self._index(position)
+
+    @staticmethod
+    def _indexed_value(source) -> str:
+        # only the head of huge values is indexed
+        return source[1][:VALUE_INDEX_LIMIT].lower()
+
+    @property
+    def postings(self):
+        """
+        Trigram to set of positions, built when first needed.
+        """
+        if self._postings is None:
+            self._postings = {}
+            for position in range(len(self.keys)):
+                self._index(position)
+        return self._postings
+
+    def _index(self, position: int, remove: bool = False):
+        if self._postings is None:
+            return
+        grams = trigrams(self.keys[position])
+        if self.include_values:
+            grams |= trigrams(self.values[position])
+        for gram in grams:
+            if remove:
+                positions = self._postings[gram]
+                positions.discard(position)
+                if not positions:
+                    del self._postings[gram]
+            else:
+                self._postings.setdefault(gram, set()).add(position)
+
+    def matches(self, position: int, query: str) -> bool:
+        """
+        Check whether a variable contains the (lower-cased) query.
+        :param position:
+        :param query:
+        :return: bool
+        """
+        if query in self.keys[position]:
+            return True
+        return self.include_values and query in self.values[position]
+
+    def substring(self, query: str, candidates=None):
+        """
+        Get the positions containing the query.
+        :param query: lower-cased query
+        :param candidates: positions to narrow down, all if not given
+        :return: list of positions, in environment order
+        """
+        if candidates is None:
+            grams = trigrams(query)
+            if grams:
+                postings = self.postings
+                sets = sorted((postings.get(g, set()) for g in grams), key=len)
+                candidates = sorted(set.intersection(*sets))
+            else:
+                candidates = range(len(self.keys))
+        return [i for i in candidates if self.matches(i, query)]
+
+    def fuzzy(self, query: str, limit: int = FUZZY_LIMIT):
+        """
+        Get the positions sharing most trigrams with the query, for typos.
+        :param query: lower-cased query
+        :param limit:
+        :return: list of positions, most shared trigrams first
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        hits = {}
+        postings = self.postings
+        for gram in grams:
+            for position in postings.get(gram, ()):
+                hits[position] = hits.get(position, 0) + 1
+        threshold = max(1, len(grams) // 2)
+        candidates = [i for i, count in hits.items() if count >= threshold]
+        return heapq.nsmallest(limit * 4, candidates, key=lambda i: -hits[i])
+
+    def rank(
+        self,
+        query: str,
+        positions,
+        limit: int = RANK_LIMIT,
+        visible: int = VISIBLE_ROWS,
+    ):
+        """
+        Order matches: name prefix matches (shortest first), then other name
+        matches, then the rest by fuzzy similarity of the name. Only the best
+        `limit` candidates are picked out, and fuzzy scoring is skipped when
+        name matches fill the `visible` rows; otherwise only as many of the
+        other candidates as rows are left are scored.
+        :param query: lower-cased query
+        :param positions: candidates, in the order to keep among equals
+        :param limit: number of candidates to order, the rest keep their order
+        :param visible: number of rows shown at once
+        :return: sorted list of positions
+        """
+        keys = self.keys
+        order = {position: rank for rank, position in enumerate(positions)}
+
+        def rough(position):
+            key = keys[position]
+            named = query in key
+            return (
+                not key.startswith(query),
+                not named,
+                len(key) if named else 0,
+                order[position],
+            )
+
+        head = heapq.nsmallest(limit, positions, key=rough)
+        named = sum(1 for position in head if query in keys[position])
+        end = min(len(head), visible)
+        if named < end:
+            # only the candidates that can reach the screen are scored
+            ratio, similarity = _scorers()
+
+            def score(position):
+                key = keys[position]
+                return (-ratio(query, key), -similarity(query, key), order[position])
+
+            head[named:end] = sorted(head[named:end], key=score)
+        if len(head) == len(order):
+            return head
+        chosen = set(head)
+        return head + [position for position in positions if position not in chosen]
+
+
+class IncrementalSearch:
+    """
+    As-you-type search state. Extending the query only filters the previous
+    matches; anything else starts over from the index.
+    """
+
+    def __init__(self, index: SearchIndex, visible: int = VISIBLE_ROWS):
+        """
+        :param index: SearchIndex
+        :param visible: number of rows shown at once
+        """
+        self.index = index
+        self.visible = visible
+        self.query = ""
+        self._matches = None
+        self.results = []
+
+    def update(self, query: str):
+        """
+        Set the query and get the ranked results.
+        :param query:
+        :return: list of positions, best first
+        """
+        query = query.lower()
+        if not query:
+            self.query, self._matches, self.results = "", None, []
+            return self.results
+        if self._matches is not None and self.query and query.startswith(self.query):
+            matches = self.index.substring(query, self._matches)
+        else:
+            matches = self.index.substring(query)
+        self.query = query
+        self._matches = matches
+        if matches:
+            self.results = self.index.rank(query, matches, visible=self.visible)
+        else:
+            fuzzy = self.index.fuzzy(query)
+            self.results = self.index.rank(query, fuzzy, visible=self.visible)
+            self.results = self.results[:FUZZY_LIMIT]
+        return self.results
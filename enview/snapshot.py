@@ -0,0 +1,200 @@
+import difflib
+import hashlib
+import json
+import os
+import time
+import zlib
+
+from enview.storage import atomic_write, data_dir
+
+_NAME_CHARS = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._-"
+)
+
+
+def value_hash(value: str) -> str:
+    """
+    Content address of a value.
+    :param value:
+    :return: hex digest
+    """
+    return hashlib.sha256(value.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def check_snapshot_name(name: str) -> bool:
+    """
+    Check if a snapshot name is safe to use as a file name.
+    :param name:
+    :return: bool
+    """
+    return bool(name) and name[0] != "." and _NAME_CHARS.issuperset(name)
+
+
+class Snapshot:
+    """
+    One environment state: variable name -> value hash, with values fetched
+    only when they are actually needed.
+    """
+
+    def __init__(self, name: str, hashes: dict, fetch, created=None):
+        """
+        :param name:
+        :param hashes: dict mapping variable name to value hash
+        :param fetch: function loading a value by variable name
+        :param created: creation time, seconds since the epoch
+        """
+        self.name = name
+        self.hashes = hashes
+        self.created = created
+        self._fetch = fetch
+
+    @classmethod
+    def from_items(cls, name: str, items, created=None):
+        """
+        Snapshot an in-memory environment.
+        :param name:
+        :param items: iterable of (name, value)
+        :param created:
+        :return: Snapshot
+        """
+        values = dict(items)
+        hashes = {key: value_hash(value) for key, value in values.items()}
+        return cls(name, hashes, values.__getitem__, created)
+
+    def value(self, name: str) -> str:
+        return self._fetch(name)
+
+
+class SnapshotStore:
+    """
+    Local content-addressed snapshot store.
+
+    Values are zlib-compressed objects named by their SHA-256, shared by all
+    snapshots, so a value is stored once however many snapshots contain it.
+    A snapshot is a compressed manifest mapping names to value hashes.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(data_dir(), "snapshots")
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.manifests_dir = os.path.join(self.root, "manifests")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def _manifest_path(self, name: str) -> str:
+        if not check_snapshot_name(name):
+            raise ValueError(f"invalid snapshot name: {name!r}")
+        return os.path.join(self.manifests_dir, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._manifest_path(name))
+
+    def save(self, name: str, items) -> Snapshot:
+        """
+        Store an environment, writing only values not stored yet.
+        :param name:
+        :param items: iterable of (name, value)
+        :return: Snapshot
+        """
+        snapshot = Snapshot.from_items(name, items, created=time.time())
+        for key, digest in snapshot.hashes.items():
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                data = snapshot.value(key).encode("utf-8", "surrogateescape")
+                atomic_write(path, zlib.compress(data))
+        manifest = {"created": snapshot.created, "vars": snapshot.hashes}
+        atomic_write(
+            self._manifest_path(name),
+            zlib.compress(json.dumps(manifest, separators=(",", ":")).encode()),
+        )
+        return snapshot
+
+    def load(self, name: str) -> Snapshot:
+        """
+        Load one snapshot manifest; values are read on demand.
+        :param name:
+        :return: Snapshot
+        """
+        try:
+            with open(self._manifest_path(name), "rb") as f:
+                manifest = json.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            raise KeyError(name) from None
+        hashes = manifest["vars"]
+        return Snapshot(
+            name,
+            hashes,
+            lambda key: self.read_object(hashes[key]),
+            manifest.get("created"),
+        )
+
+    def read_object(self, digest: str) -> str:
+        with open(self._object_path(digest), "rb") as f:
+            return zlib.decompress(f.read()).decode("utf-8", "surrogateescape")
+
+    def list(self):
+        """
+        List the stored snapshots without reading them.
+        :return: list of (name, modification time), oldest first
+        """
+        try:
+            entries = list(os.scandir(self.manifests_dir))
+        except FileNotFoundError:
+            return []
+        snapshots = [
+            (entry.name, entry.stat().st_mtime)
+            for entry in entries
+            if check_snapshot_name(entry.name)
+        ]
+        snapshots.sort(key=lambda item: item[1])
+        return snapshots
+
+    def delete(self, name: str) -> bool:
+        """
+        Delete a snapshot manifest. Objects are kept, they may be shared.
+        :param name:
+        :return: True if it existed
+        """
+        try:
+            os.unlink(self._manifest_path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot):
+    """
+    Compare two snapshots by value hash, without reading any value.
+    :param old:
+    :param new:
+    :return: (added, removed, changed) sorted lists of variable names
+    """
+    added = sorted(new.hashes.keys() - old.hashes.keys())
+    removed = sorted(old.hashes.keys() - new.hashes.keys())
+    changed = sorted(
+        key
+        for key in old.hashes.keys() & new.hashes.keys()
+        if old.hashes[key] != new.hashes[key]
+    )
+    return added, removed, changed
+
+
+def diff_path_group(old: str, new: str, separator: str = os.pathsep):
+    """
+    Element-level diff of two path group values.
+    :param old:
+    :param new:
+    :param separator:
+    :return: list of ("+" or "-", element)
+    """
+    old_list = old.split(separator)
+    new_list = new.split(separator)
+    changes = []
+    matcher = difflib.SequenceMatcher(a=old_list, b=new_list, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("delete", "replace"):
+            changes.extend(("-", element) for element in old_list[i1:i2])
+        if tag in ("insert", "replace"):
+            changes.extend(("+", element) for element in new_list[j1:j2])
+    return changes
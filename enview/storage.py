@@ -0,0 +1,102 @@
+import json
+import os
+import stat
+from contextlib import contextmanager, suppress
+
+APP_NAME = "enview"
+
+
+def cache_dir() -> str:
+    """
+    Get the per-user cache directory of enview.
+    :return: path, it may not exist yet
+    """
+    if os.environ.get("ENVIEW_CACHE_DIR"):
+        return os.environ["ENVIEW_CACHE_DIR"]
+    from platformdirs import user_cache_dir
+
+    return user_cache_dir(APP_NAME)
+
+
+def data_dir() -> str:
+    """
+    Get the per-user data directory of enview.
+    :return: path, it may not exist yet
+    """
+    if os.environ.get("ENVIEW_DATA_DIR"):
+        return os.environ["ENVIEW_DATA_DIR"]
+    from platformdirs import user_data_dir
+
+    return user_data_dir(APP_NAME)
+
+
+def _replacement_mode(path: str) -> int:
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", **kwargs):
+    """
+    Open a temporary file next to `path` and move it over `path` once the
+    block finishes, so readers never see a partial file. The temporary file
+    is removed if the block fails. The file keeps the permissions of the
+    file it replaces, or gets the usual ones (0o666 less the umask) if new.
+    :param path:
+    :param mode: "w" or "wb"
+    :return: file object
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".enview-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, _replacement_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write(path: str, data: bytes):
+    """
+    Replace a file in one step, so readers never see a partial file.
+    :param path:
+    :param data:
+    :return:
+    """
+    with atomic_open(path, "wb") as f:
+        f.write(data)
+
+
+def load_json(path: str, default=None):
+    """
+    Load a JSON file, tolerating a missing or corrupted file.
+    :param path:
+    :param default: returned when the file cannot be read
+    :return:
+    """
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path: str, data):
+    """
+    Atomically write an object as compact JSON.
+    :param path:
+    :param data:
+    :return:
+    """
+    atomic_write(path, json.dumps(data, separators=(",", ":")).encode())
@@ -0,0 +1,280 @@
+import json
+import os
+import weakref
+from functools import lru_cache
+
+from enview import profiling
+
+OS_NAME = os.name
+PATH_SEPARATOR = ";" if OS_NAME == "nt" else ":"
+
+_DIGITS = frozenset("0123456789")
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_NAME_START = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+_NAME_CHARS = _NAME_START | _DIGITS
+_HOST_CHARS = _NAME_CHARS | frozenset("-.")
+_SCHEME_CHARS = _NAME_CHARS.difference("_") | frozenset("+-.")
+_BOOLEANS = frozenset(["true", "false", "yes", "no", "on", "off"])
+
+
+def check_ipv4(address: str) -> bool:
+    """
+    Check if the address is a valid dotted-quad IPv4 address.
+    :param address:
+    :return: bool
+    """
+    parts = address.split(".")
+    if len(parts) != 4:
+        return False
+    for part in parts:
+        if not 0 < len(part) <= 3 or not _DIGITS.issuperset(part):
+            return False
+        if int(part) > 255:
+            return False
+    return True
+
+
+def check_ipv6(address: str) -> bool:
+    """
+    Check if the address is a valid IPv6 address.
+    :param address:
+    :return: bool
+    """
+    if not 2 <= len(address) <= 45 or address.count("::") > 1:
+        return False
+    head, compressed, tail = address.partition("::")
+    groups = []
+    for side in (head, tail) if compressed else (head,):
+        if side:
+            groups.extend(side.split(":"))
+    if groups and "." in groups[-1]:
+        if not check_ipv4(groups.pop()):
+            return False
+        hextets = len(groups) + 2
+    else:
+        hextets = len(groups)
+    for group in groups:
+        if not 0 < len(group) <= 4 or not _HEX_DIGITS.issuperset(group):
+            return False
+    return hextets < 8 if compressed else hextets == 8
+
+
+def _variable_length(text: str, start: int) -> int:
+    """
+    Length of a "$name" or "${name}" reference at `start`, 0 if there is none.
+    """
+    end = len(text)
+    index = start + 1
+    braced = index < end and text[index] == "{"
+    if braced:
+        index += 1
+    if index >= end or text[index] not in _NAME_START:
+        return 0
+    index += 1
+    while index < end and text[index] in _NAME_CHARS:
+        index += 1
+    if braced:
+        if index >= end or text[index] != "}":
+            return 0
+        index += 1
+    return index - start
+
+
+def check_path(path: str) -> bool:
+    """
+    Check if the path is a valid path.
+    :param path:
+    :return: bool
+    """
+    if OS_NAME == "nt":
+        return len(path) >= 2 and "A" <= path[0] <= "Z" and path[1] == ":"
+    if path.startswith("/"):
+        return True
+    return path.startswith("$") and _variable_length(path, 0) > 0
+
+
+def check_path_group(path: str) -> bool:
+    """
+    Check if the path is a valid path group.
+    :param path:
+    :return: bool
+
+    WARNING: This function might conflict with `check_path`, since we cannot check if there are colons(:) in the path.
+    """
+    if path.find(PATH_SEPARATOR) == -1:
+        return False
+    # again, if using powershell in Windows Terminal, it works fine
+    # but when using in Windows PowerShell, Command Prompt, or double clicking on enview.exe, 'Path' variable will end with a separator character ';'
+    # causing the last element in path_list a string in length 0
+    if path[len(path) - 1] == PATH_SEPARATOR:
+        path = path[:-1]
+    path_list = path.split(PATH_SEPARATOR)
+    return all(check_path(item) for item in path_list)
+
+
+def check_integer(value: str) -> bool:
+    """
+    Check if the value is a decimal integer.
+    :param value:
+    :return: bool
+    """
+    digits = value[1:] if value[:1] in ("-", "+") else value
+    return bool(digits) and len(digits) <= 64 and _DIGITS.issuperset(digits)
+
+
+def check_boolean(value: str) -> bool:
+    """
+    Check if the value is a boolean word (true/false, yes/no, on/off).
+    :param value:
+    :return: bool
+    """
+    return len(value) <= 5 and value.lower() in _BOOLEANS
+
+
+def check_url(value: str) -> bool:
+    """
+    Check if the value is a URL ("scheme://rest" without whitespace).
+    :param value:
+    :return: bool
+    """
+    scheme, found, rest = value.partition("://")
+    if not found or not rest or not scheme or scheme[0] not in _NAME_START:
+        return False
+    if not _SCHEME_CHARS.issuperset(scheme):
+        return False
+    return not any(c.isspace() for c in rest)
+
+
+def check_host_port(value: str) -> bool:
+    """
+    Check if the value is "host:port", with "[address]:port" for IPv6.
+    :param value:
+    :return: bool
+    """
+    host, found, port = value.rpartition(":")
+    if not found or not host or not 0 < len(port) <= 5:
+        return False
+    if not _DIGITS.issuperset(port) or not 0 < int(port) <= 65535:
+        return False
+    if host[0] == "[" and host[-1] == "]":
+        return check_ipv6(host[1:-1])
+    return host[0] != "." and _HOST_CHARS.issuperset(host)
+
+
+def check_json(value: str) -> bool:
+    """
+    Check if the value is a JSON object or array.
+    :param value:
+    :return: bool
+    """
+    stripped = value.strip()
+    if not stripped or stripped[0] not in "{[":
+        return False
+    try:
+        json.loads(stripped)
+    except ValueError:
+        return False
+    return True
+
+
+class VarType:
+    """
+    A recognizable kind of environment variable value.
+    """
+
+    def __init__(self, name: str, check, label=None, error=None):
+        """
+        :param name: type string returned by `recognize_type`
+        :param check: validator, value -> bool
+        :param label: name shown to the user
+        :param error: message shown when a new value fails the validator
+        """
+        self.name = name
+        self.check = check
+        self.label = label or name.upper()
+        self.error = error or f"Invalid {self.label.lower()}."
+
+
+# checked in order, the first match wins
+TYPE_REGISTRY = [
+    VarType("integer", check_integer, "INTEGER", "Invalid integer."),
+    VarType("boolean", check_boolean, "BOOLEAN", "Invalid boolean."),
+    VarType("ipv4", check_ipv4, "IPV4", "Invalid IPv4 address."),
+    VarType("ipv6", check_ipv6, "IPV6", "Invalid IPv6 address."),
+    VarType("path_group", check_path_group, "PATH GROUP", "Invalid path group."),
+    VarType("path", check_path, "PATH", "Invalid path."),
+    VarType("url", check_url, "URL", "Invalid URL."),
+    VarType("host_port", check_host_port, "HOST:PORT", "Invalid host:port."),
+    VarType("json", check_json, "JSON", "Invalid JSON."),
+]
+
+
+def register_type(vartype: VarType, before=None):
+    """
+    Add a type to the registry.
+    :param vartype:
+    :param before: name of the type to check this one before, last if None
+    :return:
+    """
+    global _classified
+    names = [registered.name for registered in TYPE_REGISTRY]
+    if vartype.name in names:
+        TYPE_REGISTRY.pop(names.index(vartype.name))
+        names.remove(vartype.name)
+    if before is None:
+        TYPE_REGISTRY.append(vartype)
+    else:
+        TYPE_REGISTRY.insert(names.index(before), vartype)
+    recognize_type.cache_clear()
+    _classified = None
+
+
+def get_type(name: str):
+    """
+    Look a registered type up by name.
+    :param name:
+    :return: VarType, or None
+    """
+    for vartype in TYPE_REGISTRY:
+        if vartype.name == name:
+            return vartype
+    return None
+
+
+@lru_cache(maxsize=4096)
+def recognize_type(name: str) -> str:
+    """
+    Recognize the type of the environment variable.
+    :param name: the value of the variable
+    :return: type string
+    """
+    with profiling.span("recognize_type", "types"):
+        for vartype in TYPE_REGISTRY:
+            if vartype.check(name):
+                return vartype.name
+        return "undefined"
+
+
+# (weak reference to the store, its version, types) of the last store
+# classified; weak so that short-lived stores, e.g. one per daemon query,
+# are not kept alive by the cache
+_classified = None
+
+
+def classify_all(store) -> dict:
+    """
+    Recognize the type of every variable of an EnvStore. The result for the
+    last store classified is kept until the store changes.
+    :param store:
+    :return: dict mapping variable name to type string
+    """
+    global _classified
+    if (
+        _classified is not None
+        and _classified[0]() is store
+        and _classified[1] == store.version
+    ):
+        return _classified[2]
+    types = {name: recognize_type(value) for name, value in store.items()}
+    _classified = (weakref.ref(store), store.version, types)
+    return types
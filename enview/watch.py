@@ -0,0 +1,58 @@
+import os
+
+# seconds between two polls of the watched directories
+WATCH_INTERVAL = 1.0
+
+
+def directory_key(directory: str):
+    """
+    Get what identifies the content of a directory.
+    :param directory: an empty entry means the current directory, like in PATH
+    :return: (st_dev, st_ino, st_mtime_ns), or None if it does not exist
+    """
+    try:
+        st = os.stat(directory or os.curdir)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino, st.st_mtime_ns
+
+
+class DirectoryWatcher:
+    """
+    Polls directories for changes with one stat per directory, so a watch
+    loop rescans only the directories whose entries were added, removed or
+    renamed (or that appeared, vanished or were replaced).
+    """
+
+    def __init__(self, directories):
+        self._keys = {
+            directory: directory_key(directory)
+            for directory in dict.fromkeys(directories)
+        }
+
+    @property
+    def directories(self):
+        return list(self._keys)
+
+    def add(self, directories):
+        """
+        Start watching more directories, from their current state.
+        :param directories:
+        :return:
+        """
+        for directory in directories:
+            if directory not in self._keys:
+                self._keys[directory] = directory_key(directory)
+
+    def poll(self):
+        """
+        Check every directory once.
+        :return: list of the directories that changed since the last poll
+        """
+        changed = []
+        for directory, key in self._keys.items():
+            new_key = directory_key(directory)
+            if new_key != key:
+                self._keys[directory] = new_key
+                changed.append(directory)
+        return changed
@@ -19,7 +19,6 @@ setup(
         "Pygments>=2.11.2,<3.0.0",
         "pyparsing>=3.0.7,<4.0.0",
         "python-nubia==0.2b5",
-        "readchar>=3.0.5,<5.0.0",
         "termcolor>=1.1.0,<4.0.0",
         "tomli>=1.2.3,<3.0.0",
         "typing-inspect>=0.7.1,<1.0.0",
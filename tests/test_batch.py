@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_batch(script, tmp_path, **environ):
+    path = tmp_path / "script.txt"
+    path.write_text(script)
+    env = dict(
+        os.environ,
+        ENVIEW_CACHE_DIR=str(tmp_path / "cache"),
+        ENVIEW_DATA_DIR=str(tmp_path / "data"),
+        PYTHONPATH=str(PROJECT_ROOT),
+        **environ,
+    )
+    return subprocess.run(
+        [sys.executable, "-m", "enview", "--batch", str(path)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("sh") is None, reason="needs a POSIX shell")
+def test_batch_stdout_evaluates(tmp_path):
+    result = run_batch(
+        'setenv --name GREETING --value "it\'s $HOME"\n'
+        "getall\n"
+        "optimize PATH\n"
+        "delta --format sh\n",
+        tmp_path,
+        PATH=f"/usr/bin:/bin:/usr/bin/:{os.environ.get('PATH', '')}",
+    )
+    assert "# enview setenv" in result.stderr
+    assert "GREETING" in result.stderr
+    check = subprocess.run(
+        ["sh", "-c", 'eval "$1" && printf %s "$GREETING"', "sh", result.stdout],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert check.stdout == "it's $HOME"
+
+
+def test_batch_stdout_is_json(tmp_path):
+    result = run_batch(
+        "setenv --name GREETING --value hello\nsave --format json -o - --filter GREET*\n",
+        tmp_path,
+    )
+    assert json.loads(result.stdout) == {"GREETING": "hello"}
@@ -0,0 +1,29 @@
+import gc
+import weakref
+
+from enview import daemon
+from enview.envstore import EnvStore
+
+
+def test_repeated_queries_do_not_keep_environments(tmp_path, monkeypatch):
+    stores = []
+    original_init = EnvStore.__init__
+
+    def tracking_init(self, environ=None):
+        original_init(self, environ)
+        stores.append(weakref.ref(self))
+
+    monkeypatch.setattr(EnvStore, "__init__", tracking_init)
+    for index in range(50):
+        reply = daemon.answer(
+            {
+                "argv": ["getall", "--types"],
+                "environ": {"PORT": str(index)},
+                "cwd": str(tmp_path),
+            }
+        )
+        assert reply["code"] == 0, reply["stderr"]
+        assert reply["stdout"] == f"PORT (integer) = {index}\n"
+    gc.collect()
+    assert len(stores) == 50
+    assert not any(ref() is not None for ref in stores)
@@ -0,0 +1,24 @@
+import pytest
+
+from enview.envstore import EnvStore
+from enview.procenv import RawEnviron
+
+RAW = b"A=1\0B=caf\xc3\xa9\0C=x=y\0"
+
+
+def test_raw_environ_values_are_decoded_on_access():
+    store = EnvStore(RawEnviron(RAW))
+    assert list(store) == ["A", "B", "C"]
+    assert all(isinstance(value, bytes) for value in store._values.values())
+    assert store.value_at(1) == "café"
+    assert isinstance(store._values["B"], str)
+    assert isinstance(store._values["A"], bytes)
+    assert dict(store) == {"A": "1", "B": "café", "C": "x=y"}
+
+
+def test_raw_environ_store_is_read_only():
+    store = EnvStore(RawEnviron(RAW))
+    assert not store.set("A", "1")
+    with pytest.raises(TypeError):
+        store.set("A", "2")
+    assert store["A"] == "1"
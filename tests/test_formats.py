@@ -0,0 +1,157 @@
+import io
+import shutil
+import subprocess
+
+import pytest
+
+from enview import formats
+from enview.formats import (
+    EXPORT_FORMATS,
+    ExportParseError,
+    delta_lines,
+    quote_fish,
+    read_export,
+    write_export,
+)
+
+VALUES = {
+    "PLAIN": "value",
+    "EMPTY": "",
+    "SINGLE": "it's",
+    "DOUBLE": 'say "hi"',
+    "DOLLAR": "$HOME and ${PATH} and $(id)",
+    "BACKTICK": "`id` and ``",
+    "BACKSLASH": "C:\\path\\ends\\",
+    "NEWLINES": "one\ntwo\r\nthree\n",
+    "MIXED": "a'b\"c$d`e\\f\ng",
+    "UNICODE": "caf\u00e9 \u2018curly\u2019 \u201aquotes\u201b",
+    "SPACES": "  leading and trailing  ",
+}
+
+
+def export(items, fmt):
+    stream = io.StringIO()
+    write_export(stream, items, fmt)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["sh", "dotenv", "ps1", "json"])
+def test_export_round_trip(fmt):
+    text = export(VALUES.items(), fmt)
+    parsed = dict(read_export(io.StringIO(text), fmt))
+    assert parsed == VALUES
+
+
+@pytest.mark.skipif(shutil.which("sh") is None, reason="needs a POSIX shell")
+@pytest.mark.parametrize("name", sorted(VALUES))
+def test_sh_export_evaluates_to_value(name, tmp_path):
+    script = tmp_path / "env.sh"
+    script.write_text(export([(name, VALUES[name])], "sh"))
+    result = subprocess.run(
+        ["sh", "-c", f'. "$1" && printf %s "${name}"', "sh", str(script)],
+        capture_output=True,
+        check=True,
+    )
+    assert result.stdout.decode() == VALUES[name]
+
+
+def unquote_fish(text):
+    """
+    Undo fish single quoting, where only backslash and quote are escapes.
+    """
+    assert text[0] == text[-1] == "'"
+    value = []
+    escaped = False
+    for c in text[1:-1]:
+        if escaped:
+            value.append(c if c in "\\'" else "\\" + c)
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        else:
+            assert c != "'"
+            value.append(c)
+    return "".join(value)
+
+
+@pytest.mark.parametrize("name", sorted(VALUES))
+def test_fish_quote_round_trip(name):
+    assert unquote_fish(quote_fish(VALUES[name])) == VALUES[name]
+
+
+def test_fish_path_is_a_list():
+    line = export([("MANPATH", "/a b:/it's")], "fish")
+    assert line == "set -gx MANPATH '/a b' '/it\\'s'\n"
+
+
+@pytest.mark.parametrize("fmt", EXPORT_FORMATS)
+def test_shell_formats_skip_unassignable_names(fmt):
+    text = export([("BASH_FUNC_x%%", "() { :; }"), ("OK", "1")], fmt)
+    if fmt in ("json", "ps1"):
+        assert "BASH_FUNC_x%%" in text
+    else:
+        assert "BASH_FUNC" not in text
+        assert "OK" in text
+
+
+@pytest.mark.skipif(shutil.which("sh") is None, reason="needs a POSIX shell")
+def test_sh_delta_sets_and_unsets(tmp_path):
+    script = tmp_path / "delta.sh"
+    script.write_text("".join(delta_lines([("GONE", None), ("NEW", "a'$b")], "sh")))
+    result = subprocess.run(
+        [
+            "sh",
+            "-c",
+            '. "$1" && printf "%s|%s" "${GONE-unset}" "$NEW"',
+            "sh",
+            str(script),
+        ],
+        env={"GONE": "x"},
+        capture_output=True,
+        check=True,
+    )
+    assert result.stdout.decode() == "unset|a'$b"
+
+
+@pytest.mark.parametrize("value", ["null", "true", "1", "[]", '{"a": "b"}'])
+def test_json_import_rejects_non_string_values(value):
+    text = f'{{\n  "OK": "1",\n  "BAD": {value}\n}}\n'
+    with pytest.raises(ExportParseError) as raised:
+        dict(read_export(io.StringIO(text), "json"))
+    assert raised.value.line == 3
+    assert "BAD" in str(raised.value)
+
+
+@pytest.mark.parametrize("text", ["export A=1; export B=2\n", "A=1;B=2 ;\n"])
+def test_sh_import_reads_every_statement(text):
+    assert dict(read_export(io.StringIO(text), "sh")) == {"A": "1", "B": "2"}
+
+
+def test_sh_import_rejects_unsupported_operators():
+    with pytest.raises(ExportParseError) as raised:
+        dict(read_export(io.StringIO("A=1 && B=2\n"), "sh"))
+    assert raised.value.line == 1
+
+
+@pytest.mark.parametrize(
+    ("fmt", "text"),
+    [
+        ("sh", "A='x\n" + "it'\\''s\n" * 500 + "'\n"),
+        ("sh", 'A="x\n' + 'say \\"hi\\"\n' * 500 + '"\n'),
+        ("dotenv", 'A="x\n' + 'say \\"hi\\"\n' * 500 + '"\n'),
+        ("ps1", "$env:A = 'x\n" + "it''s\n" * 500 + "'\n"),
+    ],
+)
+def test_multi_line_value_is_parsed_once(fmt, text, monkeypatch):
+    parse = formats.STATEMENT_PARSERS[fmt]
+    calls = []
+
+    def counting(statement):
+        calls.append(statement)
+        return parse(statement)
+
+    monkeypatch.setitem(formats.STATEMENT_PARSERS, fmt, counting)
+    ((name, value),) = read_export(io.StringIO(text), fmt)
+    assert name == "A"
+    assert value.count("\n") == 501
+    assert len(calls) <= 2
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+from enview import journal
+from enview.envstore import EnvStore
+from enview.journal import ChangeJournal, expire_deltas, pending_changes
+
+
+def test_pending_changes_compare_with_the_values_before_the_first_change():
+    environ = {"A": "1", "B": "2"}
+    changes = ChangeJournal(EnvStore(environ))
+    changes.set("A", "10")
+    changes.apply({"A": "11", "B": None, "C": "3"})
+    # the store wrote through to `environ`, which no longer shows the changes
+    assert changes.pending_changes(environ) == [("A", "11"), ("B", None), ("C", "3")]
+    changes.set("B", "2")
+    assert changes.pending_changes(environ) == [("A", "11"), ("C", "3")]
+    assert changes.clear_pending()
+    assert changes.pending_changes(environ) == []
+
+
+def test_pending_changes_on_disk_use_the_base_of_this_run(tmp_path):
+    path = str(tmp_path / "delta.json")
+    environ = {"A": "1"}
+    changes = ChangeJournal(EnvStore(environ), path)
+    changes.set("A", "2")
+    assert changes.pending_changes(environ) == [("A", "2")]
+    # a later run started from a shell that applied the change
+    assert pending_changes(path, {"A": "2"}) == []
+    assert pending_changes(path, {"A": "1"}) == [("A", "2")]
+
+
+def test_session_token_names_the_parent_process(monkeypatch):
+    monkeypatch.delenv("ENVIEW_SESSION", raising=False)
+    monkeypatch.setattr(journal, "read_start_time", lambda pid: "1234")
+    assert journal.session_token() == f"{os.getppid()}-1234"
+    monkeypatch.setenv("ENVIEW_SESSION", "a/b c")
+    assert journal.session_token() == "a_b_c"
+
+
+def test_expire_deltas_drops_ended_sessions(tmp_path, monkeypatch):
+    alive = {"100": "5000"}
+    monkeypatch.setattr(journal, "read_start_time", lambda pid: alive.get(str(pid), ""))
+    for session in ("100-5000", "100-4000", "200-5000", "named", "old"):
+        (tmp_path / f"delta-{session}.json").write_text("{}")
+    (tmp_path / "other.json").write_text("{}")
+    os.utime(tmp_path / "delta-old.json", (0, 0))
+    assert expire_deltas(str(tmp_path)) == 3
+    assert sorted(os.listdir(tmp_path)) == [
+        "delta-100-5000.json",
+        "delta-named.json",
+        "other.json",
+    ]
+
+
+class FailingEnviron(dict):
+    """
+    Environment refusing to set one variable, like os.environ does for a
+    value holding a NUL.
+    """
+
+    def __setitem__(self, name, value):
+        if name == "BAD":
+            raise ValueError("embedded null byte")
+        super().__setitem__(name, value)
+
+
+def test_undo_and_redo_walk_the_history():
+    environ = {"A": "1"}
+    store = EnvStore(environ)
+    changes = ChangeJournal(store)
+    changes.set("A", "2")
+    changes.apply({"A": "3", "B": "x"})
+    assert changes.undo() == [("A", "2", "3"), ("B", None, "x")]
+    assert dict(store) == environ == {"A": "2"}
+    assert changes.undo() == [("A", "1", "2")]
+    assert dict(store) == {"A": "1"}
+    assert changes.undo() == []
+    assert not changes.can_undo
+    assert changes.redo() == [("A", "1", "2")]
+    assert changes.redo() == [("A", "2", "3"), ("B", None, "x")]
+    assert dict(store) == environ == {"A": "3", "B": "x"}
+    assert changes.redo() == []
+
+
+def test_new_change_drops_the_redo_history():
+    store = EnvStore({"A": "1"})
+    changes = ChangeJournal(store)
+    changes.set("A", "2")
+    changes.undo()
+    assert changes.can_redo
+    changes.set("A", "5")
+    assert not changes.can_redo
+    assert changes.redo() == []
+    assert store["A"] == "5"
+    assert changes.undo() == [("A", "1", "5")]
+    assert store["A"] == "1"
+
+
+def test_unchanged_set_is_not_an_undo_step():
+    changes = ChangeJournal(EnvStore({"A": "1"}))
+    assert not changes.set("A", "1")
+    assert not changes.can_undo
+
+
+def test_failed_apply_rolls_back_and_records_nothing(tmp_path):
+    path = str(tmp_path / "delta.json")
+    environ = FailingEnviron(A="1", C="3")
+    store = EnvStore(environ)
+    changes = ChangeJournal(store, path)
+    changes.set("C", "4")
+    with pytest.raises(ValueError):
+        changes.apply([("A", "2"), ("NEW", "x"), ("C", None), ("BAD", "y")])
+    assert dict(store) == dict(environ) == {"A": "1", "C": "4"}
+    assert changes.undo() == [("C", "3", "4")]
+    assert not changes.can_undo
+    assert changes.pending_changes(environ) == []
@@ -0,0 +1,71 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from enview.libscan import read_soname, scan_libraries
+
+
+def mapped_libc():
+    """
+    Find the C library this interpreter runs with.
+    """
+    try:
+        with open("/proc/self/maps") as maps:
+            for line in maps:
+                path = line.split()[-1]
+                if os.path.basename(path).startswith("libc.so"):
+                    return path
+    except OSError:
+        pass
+    return None
+
+
+LIBC = mapped_libc() if sys.platform.startswith("linux") else None
+needs_libc = pytest.mark.skipif(LIBC is None, reason="needs a mapped ELF libc")
+
+
+@needs_libc
+def test_read_soname_of_real_library():
+    soname = read_soname(LIBC)
+    assert soname is not None
+    assert soname.startswith("libc.so")
+
+
+@needs_libc
+@pytest.mark.parametrize("size", [0, 3, 4, 16, 52, 63, 64, 200])
+def test_read_soname_of_truncated_header(size, tmp_path):
+    path = tmp_path / "libtrunc.so"
+    with open(LIBC, "rb") as f:
+        path.write_bytes(f.read(size))
+    assert read_soname(str(path)) is None
+
+
+@needs_libc
+@pytest.mark.parametrize("fraction", [0.1, 0.5, 0.9])
+def test_read_soname_of_truncated_body(fraction, tmp_path):
+    path = tmp_path / "libtrunc.so"
+    with open(LIBC, "rb") as f:
+        data = f.read()
+    path.write_bytes(data[: int(len(data) * fraction)])
+    assert read_soname(str(path)) in (None, read_soname(LIBC))
+
+
+def test_read_soname_of_non_elf(tmp_path):
+    path = tmp_path / "libtext.so"
+    path.write_text("INPUT(-lfoo)\n")
+    assert read_soname(str(path)) is None
+    assert read_soname(str(tmp_path / "missing.so")) is None
+
+
+@needs_libc
+def test_scan_libraries_reads_symlinked_copies_once(tmp_path):
+    shutil.copy(LIBC, tmp_path / "libc-copy.so.6")
+    os.symlink("libc-copy.so.6", tmp_path / "libc-link.so")
+    (tmp_path / "README").write_text("not a library")
+    soname = read_soname(LIBC)
+    assert sorted(scan_libraries(str(tmp_path))) == [
+        ["libc-copy.so.6", soname],
+        ["libc-link.so", soname],
+    ]
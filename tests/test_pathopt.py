@@ -0,0 +1,135 @@
+import os
+
+import pytest
+
+from enview.pathopt import DirectoryIdentity, normalize_entry, optimize_path_group
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="POSIX paths")
+
+
+@pytest.mark.parametrize(
+    ("entry", "normalized"),
+    [
+        ("/usr/bin", "/usr/bin"),
+        ("/usr/bin/", "/usr/bin"),
+        ("/usr//bin///", "/usr/bin"),
+        ("/usr/./bin/.", "/usr/bin"),
+        ("/", "/"),
+        ("//", "/"),
+        ("bin/", "bin"),
+        ("./bin", "bin"),
+        (".", "."),
+        ("./", "."),
+        ("", ""),
+        ("/opt/x/../bin", "/opt/x/../bin"),
+        ("~/bin/", "~/bin"),
+        ("$HOME//bin/", "$HOME//bin/"),
+    ],
+)
+def test_normalize_entry(entry, normalized):
+    assert normalize_entry(entry) == normalized
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "tool").write_text("")
+    (tmp_path / "hollow").mkdir()
+    os.symlink(tmp_path / "a", tmp_path / "link")
+    return tmp_path
+
+
+def optimize(dirs, entries, **kwargs):
+    value = ":".join(
+        entry if entry[:1] in ("", "$", "~", ".") else f"{dirs}/{entry}"
+        for entry in entries
+    )
+    new_value, removed = optimize_path_group(value, ":", **kwargs)
+    strip = f"{dirs}/"
+    return (
+        [entry.replace(strip, "") for entry in new_value.split(":")],
+        [
+            (entry.replace(strip, ""), reason.replace(strip, ""))
+            for entry, reason in removed
+        ],
+    )
+
+
+def test_duplicates_keep_the_first_occurrence(dirs):
+    assert optimize(dirs, ["b", "a", "b", "c", "a"]) == (
+        ["b", "a", "c"],
+        [("b", "duplicate of b"), ("a", "duplicate of a")],
+    )
+
+
+def test_trailing_and_repeated_separators_are_duplicates(dirs):
+    assert optimize(dirs, ["a/", "a", "b//", "b/."]) == (
+        ["a", "b"],
+        [("a", "duplicate of a"), ("b/.", "duplicate of b")],
+    )
+
+
+def test_symlink_is_the_same_directory(dirs):
+    assert optimize(dirs, ["link", "a", "link/"]) == (
+        ["link"],
+        [("a", "same directory as link"), ("link/", "duplicate of link")],
+    )
+
+
+def test_empty_entries_are_the_current_directory(dirs):
+    new_value, removed = optimize_path_group(f"::{dirs}/a:", ":")
+    assert new_value == f":{dirs}/a"
+    assert removed == [("", "duplicate of (empty entry)")] * 2
+
+
+def test_relative_entries_resolve_from_the_current_directory(dirs, monkeypatch):
+    monkeypatch.chdir(dirs)
+    assert optimize_path_group(
+        f"./a:a/:{dirs}/a:b:nowhere", ":", drop_missing=True
+    ) == (
+        "a:b",
+        [
+            ("a/", "duplicate of a"),
+            (f"{dirs}/a", "same directory as a"),
+            ("nowhere", "missing"),
+        ],
+    )
+    # "." is resolved, the empty entry is not, although both mean dirs
+    assert optimize_path_group("::.:.", ":") == (
+        ":.",
+        [("", "duplicate of (empty entry)"), (".", "duplicate of .")],
+    )
+
+
+def test_unexpanded_entries_are_never_dropped(dirs):
+    entries = ["~/nowhere", "$HOME/nowhere", "${X}", "", "missing"]
+    assert optimize(dirs, entries, drop_missing=True) == (
+        ["~/nowhere", "$HOME/nowhere", "${X}", ""],
+        [("missing", "missing")],
+    )
+
+
+def test_missing_entries_are_kept_unless_asked(dirs):
+    assert optimize(dirs, ["missing", "a", "missing/"]) == (
+        ["missing", "a"],
+        [("missing/", "duplicate of missing")],
+    )
+
+
+def test_drop_empty(dirs):
+    assert optimize(dirs, ["hollow", "a"], drop_empty=True) == (
+        ["a"],
+        [("hollow", "empty")],
+    )
+    assert optimize(dirs, ["hollow", "a"]) == (["hollow", "a"], [])
+
+
+def test_identities_are_shared_between_calls(dirs, monkeypatch):
+    identities = DirectoryIdentity()
+    optimize_path_group(f"{dirs}/a:{dirs}/b", ":", identities=identities)
+    calls = []
+    real_stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda path: calls.append(path) or real_stat(path))
+    optimize_path_group(f"{dirs}/b:{dirs}/a", ":", identities=identities)
+    assert calls == []
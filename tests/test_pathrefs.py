@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from enview import cli
+from enview.envstore import EnvStore, bound_store
+from enview.journal import get_journal
+from enview.pathrefs import PathRefs, component_prefixes
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="POSIX paths")
+
+ENVIRON = {
+    "PATH": "/opt/a/bin:/opt/ab/bin:/usr/bin:/opt/a:/opt//a/lib/",
+    "LD_LIBRARY_PATH": "/opt/ab/lib:/opt/a-1/lib",
+    "CUDA_HOME": "/opt/a",
+    "TOOL": "/opt/a/tool",
+    "OTHER": "/opt/abc",
+    "GREETING": "/opt/a is not a path here",
+}
+
+
+def test_component_prefixes():
+    assert component_prefixes("/opt/a/bin") == ["/", "/opt", "/opt/a", "/opt/a/bin"]
+    assert component_prefixes("/") == ["/"]
+    assert component_prefixes("rel/dir") == ["rel", "rel/dir"]
+
+
+def test_lookup_stops_at_component_boundaries():
+    refs = PathRefs(EnvStore(ENVIRON), ":")
+    assert refs.lookup("/opt/a/") == [
+        ("PATH", 0, "/opt/a/bin"),
+        ("PATH", 3, "/opt/a"),
+        ("PATH", 4, "/opt//a/lib/"),
+        ("CUDA_HOME", 0, "/opt/a"),
+        ("TOOL", 0, "/opt/a/tool"),
+    ]
+    assert refs.variables("/opt/ab") == ["PATH", "LD_LIBRARY_PATH"]
+    assert refs.lookup("/opt/a/b") == []
+
+
+@pytest.mark.parametrize("new", ["/srv/b", "/srv/b/", "/srv//b"])
+def test_rewrite_replaces_only_whole_components(new):
+    store = EnvStore(ENVIRON)
+    changes = PathRefs(store, ":").rewrite(store, "/opt/a", new)
+    assert changes == {
+        "PATH": "/srv/b/bin:/opt/ab/bin:/usr/bin:/srv/b:/srv/b/lib",
+        "CUDA_HOME": "/srv/b",
+        "TOOL": "/srv/b/tool",
+    }
+
+
+def test_rewrite_of_a_deeper_prefix():
+    store = EnvStore(ENVIRON)
+    changes = PathRefs(store, ":").rewrite(store, "/opt/ab/", "/opt/ab2")
+    assert changes == {
+        "PATH": "/opt/a/bin:/opt/ab2/bin:/usr/bin:/opt/a:/opt//a/lib/",
+        "LD_LIBRARY_PATH": "/opt/ab2/lib:/opt/a-1/lib",
+    }
+
+
+def test_refs_replace_is_one_undo_step(capsys):
+    environ = dict(ENVIRON)
+    with bound_store(environ) as store:
+        assert cli.run(["refs", "/opt/a", "--replace", "/srv/b"]) == 0
+        assert environ["PATH"].split(":")[:2] == ["/srv/b/bin", "/opt/ab/bin"]
+        assert environ["OTHER"] == "/opt/abc"
+        assert environ["LD_LIBRARY_PATH"] == ENVIRON["LD_LIBRARY_PATH"]
+        get_journal().undo()
+        assert dict(store) == environ == ENVIRON
+    assert "CUDA_HOME = /srv/b" in capsys.readouterr().out
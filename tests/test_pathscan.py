@@ -0,0 +1,139 @@
+import os
+
+import pytest
+
+from enview.pathscan import ExecutableIndex, HashCache, scan_executables
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+
+
+def make_tool(directory, name, content="#!/bin/sh\n"):
+    path = directory / name
+    path.write_text(content)
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    created = []
+    for name in ("d1", "d2", "d3"):
+        directory = tmp_path / name
+        directory.mkdir()
+        created.append(directory)
+    d1, d2, d3 = created
+    make_tool(d1, "a")
+    make_tool(d1, "both")
+    make_tool(d2, "b")
+    make_tool(d3, "both")
+    (d2 / "data.txt").write_text("not executable")
+    return created
+
+
+def build(dirs):
+    return ExecutableIndex.build([str(d) for d in dirs], max_workers=1)
+
+
+def test_build_lists_providers_in_lookup_order(dirs):
+    d1, d2, d3 = map(str, dirs)
+    index = build(dirs)
+    assert index.providers == {"a": [d1], "both": [d1, d3], "b": [d2]}
+    assert index.winner("both") == d1
+    assert index.shadowed("both") == [d3]
+    assert index.resolve("b") == os.path.join(d2, "b")
+    assert index.resolve("missing") is None
+
+
+def test_update_adds_and_removes_names(dirs):
+    d1, d2, d3 = dirs
+    index = build(dirs)
+    make_tool(d2, "both")
+    make_tool(d3, "c")
+    (d1 / "a").unlink()
+    affected = index.update({str(d): scan_executables(str(d)) for d in dirs})
+    assert affected == {"a", "both", "c"}
+    assert index.providers == build(dirs).providers
+    assert index.providers["both"] == [str(d1), str(d2), str(d3)]
+    assert "a" not in index.providers
+
+
+def test_update_of_a_whole_directory(dirs):
+    d1, d2, d3 = map(str, dirs)
+    index = build(dirs)
+    affected = index.update({d1: []})
+    assert affected == {"a", "both"}
+    assert index.providers == {"both": [d3], "b": [d2]}
+    affected = index.update({d1: ["a", "both"]})
+    assert affected == {"a", "both"}
+    assert index.providers == {"a": [d1], "both": [d1, d3], "b": [d2]}
+
+
+def test_update_ignores_directories_outside_the_path_group(dirs, tmp_path):
+    index = build(dirs)
+    providers = {name: list(dirs) for name, dirs in index.providers.items()}
+    assert index.update({str(tmp_path / "elsewhere"): ["a"]}) == set()
+    assert index.providers == providers
+
+
+@pytest.fixture
+def copies(tmp_path):
+    """
+    Five directories providing "tool": the original, a symlink to it, a hard
+    link to it, a copy with the same content and a different file.
+    """
+    created = []
+    for name in ("orig", "symlink", "hardlink", "copy", "other"):
+        directory = tmp_path / name
+        directory.mkdir()
+        created.append(directory)
+    orig, symlink, hardlink, copy, other = created
+    source = make_tool(orig, "tool")
+    os.symlink(source, symlink / "tool")
+    os.link(source, hardlink / "tool")
+    make_tool(copy, "tool")
+    make_tool(other, "tool", "#!/bin/sh\necho other\n")
+    make_tool(orig, "lone")
+    make_tool(symlink, "twin")
+    os.link(symlink / "twin", hardlink / "twin")
+    return [str(directory) for directory in created]
+
+
+def test_distinct_conflicts_by_identity(copies):
+    orig, _, _, copy, other = copies
+    index = ExecutableIndex.build(copies, max_workers=1)
+    distinct, identical = index.distinct_conflicts(max_workers=1)
+    assert distinct == {"tool": [orig, copy, other]}
+    assert identical == {"twin"}
+
+
+def test_distinct_conflicts_by_content(copies):
+    orig, _, hardlink, copy, other = copies
+    index = ExecutableIndex.build(copies, max_workers=1)
+    hashes = HashCache(persist=False)
+    distinct, identical = index.distinct_conflicts(hashes=hashes, max_workers=1)
+    assert distinct == {"tool": [orig, other]}
+    assert identical == {"twin"}
+    counts = index.counts(distinct)
+    assert counts[orig] == (2, 0, 1)
+    assert counts[copy] == (1, 0, 0)
+    assert counts[other] == (1, 1, 0)
+    assert counts[hardlink] == (2, 0, 0)
+
+
+def test_distinct_conflicts_of_some_names(copies):
+    index = ExecutableIndex.build(copies, max_workers=1)
+    assert index.distinct_conflicts(names=["twin", "lone"]) == ({}, {"twin"})
+
+
+def test_resolution_through_a_symlinked_directory_is_unchanged(dirs, tmp_path):
+    d1, d2, d3 = map(str, dirs)
+    os.symlink(d1, tmp_path / "alias")
+    alias = str(tmp_path / "alias")
+    old = ExecutableIndex.build([d1, d2, d3], max_workers=1)
+    new = old.reorder([alias, d3, d2])
+    assert new.winner("a") == alias
+    assert old.resolution_changes(new, max_workers=1) == {}
+    assert old.resolution_changes(old.reorder([d3, d2]), max_workers=1) == {
+        "a": (d1, None),
+        "both": (d1, d3),
+    }
@@ -0,0 +1,123 @@
+import io
+import os
+
+import pytest
+
+from enview.envstore import bound_store
+from enview.screen import CLEAR_SCREEN, KeyReader, Screen, move_to, split_keys
+
+
+@pytest.mark.parametrize(
+    ("text", "keys", "partial"),
+    [
+        ("jk", ["j", "k"], ""),
+        ("\x1b[A\x1b[B\x1bOC\x1bOD", ["up", "down", "right", "left"], ""),
+        ("\x1b[5~\x1b[6~\x1b[H\x1b[4~", ["page_up", "page_down", "home", "end"], ""),
+        ("50j", ["5", "0", "j"], ""),
+        ("12\x1b[B", ["1", "2", "down"], ""),
+        ("q\x1b[", ["q"], "\x1b["),
+        ("\x1b[1", [], "\x1b[1"),
+        ("\x1bO", [], "\x1bO"),
+        ("a\x1b", ["a"], "\x1b"),
+        ("\x1bq", ["\x1b", "q"], ""),
+        ("\x1b[99~x", ["x"], ""),
+        ("\x1b[1;5Cz", ["z"], ""),
+    ],
+)
+def test_split_keys(text, keys, partial):
+    assert split_keys(text) == (keys, partial)
+
+
+class ChunkedReader(KeyReader):
+    """
+    KeyReader fed from a list of byte chunks, each one a separate read.
+    """
+
+    def __init__(self, chunks):
+        super().__init__(stream=object())
+        self.chunks = list(chunks)
+        self.waits = []
+
+    def _wait(self, timeout) -> bool:
+        self.waits.append(timeout)
+        return bool(self.chunks)
+
+    def _read(self):
+        chunk = self.chunks.pop(0)
+        return self._decoder.decode(chunk) if chunk else None
+
+
+def read_all(reader):
+    keys = []
+    while (key := reader.read_key(timeout=0)) is not None:
+        keys.append(key)
+    return keys
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        [b"\x1b", b"[", b"B"],
+        [b"\x1b[", b"6~"],
+        [b"\x1b[6", b"~"],
+        [b"\x1bO", b"A"],
+    ],
+)
+def test_escape_sequence_split_across_reads(chunks):
+    key = split_keys(b"".join(chunks).decode())[0][0]
+    assert read_all(ChunkedReader(chunks)) == [key]
+
+
+def test_escape_waits_briefly_for_the_rest():
+    reader = ChunkedReader([b"j\x1b[", b"A"])
+    assert read_all(reader) == ["j", "up"]
+    assert reader.waits[:2] == [0, KeyReader.ESCAPE_DELAY]
+
+
+def test_lone_escape_is_the_escape_key():
+    assert read_all(ChunkedReader([b"\x1b"])) == ["\x1b"]
+    assert read_all(ChunkedReader([b"/ab\x1b"])) == ["/", "a", "b", "\x1b"]
+
+
+def test_count_prefix_with_split_arrow():
+    reader = ChunkedReader([b"2", b"5\x1b", b"[B"])
+    assert read_all(reader) == ["2", "5", "down"]
+
+
+def test_utf8_character_split_across_reads():
+    reader = ChunkedReader([b"/caf\xc3", b"\xa9"])
+    assert read_all(reader) == ["/", "c", "a", "f", "é"]
+
+
+def test_end_of_input_closes_the_reader():
+    reader = ChunkedReader([b"q", b""])
+    assert read_all(reader) == ["q"]
+    assert reader.closed
+    assert reader.read_key() is None
+
+
+class RecordingScreen(Screen):
+    def __init__(self):
+        super().__init__(stream=io.StringIO(), keys=ChunkedReader([]))
+
+
+def test_clear_writes_one_sequence():
+    screen = RecordingScreen()
+    screen.clear()
+    assert screen.stream.getvalue() == CLEAR_SCREEN + move_to(0)
+
+
+@pytest.mark.parametrize("value", ["no type here", "8080"])
+def test_intelligent_edit_clears_once_without_a_subprocess(value, monkeypatch):
+    from enview.commands import enviewcmd
+
+    def no_subprocess(command):
+        raise AssertionError(f"ran {command!r}")
+
+    monkeypatch.setattr(os, "system", no_subprocess)
+    monkeypatch.setattr(enviewcmd, "full_screen_edit", lambda text: text)
+    monkeypatch.setattr("builtins.input", lambda prompt: "9090")
+    screen = RecordingScreen()
+    with bound_store({"VALUE": value}):
+        enviewcmd.intelligent_edit_mode(0, screen=screen)
+    assert screen.stream.getvalue().count(CLEAR_SCREEN) == 1
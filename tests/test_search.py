@@ -0,0 +1,81 @@
+import pytest
+
+from enview import search
+from enview.envstore import EnvStore
+from enview.search import IncrementalSearch, SearchIndex
+
+VARS = {
+    "PATH": "/usr/bin:/bin",
+    "PYTHONPATH": "/opt/lib",
+    "MANPATH": "/usr/share/man",
+    "HOME": "/root",
+    "EDITOR": "vim",
+    "PAGER": "less",
+}
+
+
+def fresh(store, include_values):
+    index = SearchIndex(store, include_values=include_values)
+    return index.keys, index.values, index.postings
+
+
+@pytest.mark.parametrize("include_values", [False, True])
+def test_refresh_matches_a_fresh_index(include_values):
+    store = EnvStore(dict(VARS))
+    index = SearchIndex(store, include_values=include_values)
+    assert index.postings
+    store.set("EDITOR", "emacs")
+    store.set("VISUAL", "nano")
+    index.refresh(store)
+    assert (index.keys, index.values, index.postings) == fresh(store, include_values)
+    store.unset("MANPATH")
+    index.refresh(store)
+    assert (index.keys, index.values, index.postings) == fresh(store, include_values)
+    assert index.substring("nan") == (
+        [store.index_of("VISUAL")] if include_values else []
+    )
+
+
+def test_postings_are_built_on_first_query():
+    index = SearchIndex(EnvStore(dict(VARS)))
+    assert index._postings is None
+    assert index.substring("pa") == [0, 1, 2, 5]
+    assert index._postings is None
+    assert index.substring("path") == [0, 1, 2]
+    assert index._postings is not None
+
+
+def test_rank_orders_prefix_then_name_matches():
+    store = EnvStore(dict(VARS))
+    search_state = IncrementalSearch(SearchIndex(store, include_values=True))
+    names = [store.key_at(i) for i in search_state.update("pa")]
+    assert names == ["PATH", "PAGER", "MANPATH", "PYTHONPATH"]
+
+
+def test_rank_skips_fuzzy_scoring_when_names_fill_the_rows(monkeypatch):
+    store = EnvStore({f"VAR{i}": "x" for i in range(300)})
+    index = SearchIndex(store)
+
+    def scorers():
+        raise AssertionError("fuzzy scoring is not needed")
+
+    monkeypatch.setattr(search, "_scorers", scorers)
+    ranked = index.rank("var", list(range(300)), visible=20)
+    assert ranked[:3] == [0, 1, 2]
+    assert sorted(ranked) == list(range(300))
+
+
+def test_rank_scores_only_the_visible_rows(monkeypatch):
+    store = EnvStore({f"NAME{i}": "needle" for i in range(300)})
+    index = SearchIndex(store, include_values=True)
+    ratio, similarity = search._scorers()
+    scored = []
+
+    def counting_ratio(query, key):
+        scored.append(key)
+        return ratio(query, key)
+
+    monkeypatch.setattr(search, "_scorers", lambda: (counting_ratio, similarity))
+    results = IncrementalSearch(index, visible=10).update("needle")
+    assert len(results) == 300
+    assert len(scored) == 10
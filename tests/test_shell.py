@@ -0,0 +1,35 @@
+from nubia import Nubia, Options
+
+from enview import cli
+from enview.registry import nubia_plugin
+
+
+def test_shell_registers_every_command():
+    commands = cli.load_commands()
+    options = Options(persistent_history=False)
+    shell = Nubia(
+        name="enview", plugin=nubia_plugin(options), options=options, testing=True
+    )
+    registered = shell._registry.get_all_commands_map()
+    assert set(commands) <= set(registered)
+
+
+def test_defaulted_positional_becomes_option():
+    commands = cli.load_commands()
+    options = Options(persistent_history=False)
+    Nubia(name="enview", plugin=nubia_plugin(options), options=options, testing=True)
+    optimize = commands["optimize"]
+    assert not optimize.__arguments_decorator_specs["varname"].positional
+
+
+def test_parameters_shadowing_builtins_keep_their_external_names():
+    commands = cli.load_commands()
+    parser = cli.build_parser(commands)
+    args = vars(parser.parse_args(["save", "--format", "json", "--filter", "A*"]))
+    assert (args["fmt"], args["patterns"]) == ("json", ["A*"])
+    assert vars(parser.parse_args(["optimize", "--all"]))["all_groups"]
+    assert vars(parser.parse_args(["which", "--all", "sh"]))["show_all"]
+    options = Options(persistent_history=False)
+    Nubia(name="enview", plugin=nubia_plugin(options), options=options, testing=True)
+    specs = commands["save"].__arguments_decorator_specs
+    assert (specs["fmt"].name, specs["patterns"].name) == ("format", "filter")
@@ -0,0 +1,98 @@
+import os
+import zlib
+
+import pytest
+
+from enview.snapshot import (
+    Snapshot,
+    SnapshotStore,
+    check_snapshot_name,
+    diff_path_group,
+    diff_snapshots,
+    value_hash,
+)
+
+ENVIRON = {
+    "PATH": "/usr/bin:/bin",
+    "EMPTY": "",
+    "TEXT": "caf\u00e9 \u2603\nline two",
+    "RAW": os.fsdecode(b"\xff\xfe not utf-8"),
+    "SAME": "/usr/bin:/bin",
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / "snapshots"))
+
+
+def test_round_trip(store):
+    store.save("base", ENVIRON.items())
+    snapshot = store.load("base")
+    assert {name: snapshot.value(name) for name in snapshot.hashes} == ENVIRON
+    assert snapshot.created is not None
+    assert [name for name, _ in store.list()] == ["base"]
+
+
+def test_objects_are_compressed_and_shared(store):
+    store.save("one", ENVIRON.items())
+    store.save("two", {**ENVIRON, "NEW": "x"}.items())
+    objects = [
+        os.path.join(root, name)
+        for root, _dirs, names in os.walk(store.objects_dir)
+        for name in names
+    ]
+    # PATH and SAME share an object, and so do the two snapshots
+    assert len(objects) == len(ENVIRON)
+    digest = value_hash(ENVIRON["TEXT"])
+    with open(store._object_path(digest), "rb") as f:
+        assert zlib.decompress(f.read()) == ENVIRON["TEXT"].encode("utf-8")
+    assert store.read_object(digest) == ENVIRON["TEXT"]
+
+
+def test_values_are_read_on_demand(store):
+    store.save("base", ENVIRON.items())
+    snapshot = store.load("base")
+    os.unlink(store._object_path(value_hash(ENVIRON["TEXT"])))
+    assert snapshot.value("PATH") == ENVIRON["PATH"]
+    with pytest.raises(FileNotFoundError):
+        snapshot.value("TEXT")
+
+
+def test_missing_and_invalid_names(store):
+    with pytest.raises(KeyError):
+        store.load("nothing")
+    assert not store.delete("nothing")
+    for name in ("", ".hidden", "../escape", "a/b"):
+        assert not check_snapshot_name(name)
+        with pytest.raises(ValueError):
+            store.save(name, ENVIRON.items())
+    store.save("gone", ENVIRON.items())
+    assert store.delete("gone")
+    assert not store.exists("gone")
+
+
+def test_diff_snapshots():
+    old = Snapshot.from_items("old", ENVIRON.items())
+    new = Snapshot.from_items(
+        "new", {**ENVIRON, "PATH": "/bin", "ADDED": "1", "EMPTY": ""}.items()
+    )
+    del new.hashes["RAW"]
+    assert diff_snapshots(old, new) == (["ADDED"], ["RAW"], ["PATH"])
+    assert diff_snapshots(new, new) == ([], [], [])
+
+
+@pytest.mark.parametrize(
+    ("old", "new", "changes"),
+    [
+        ("/a:/b:/c", "/a:/b:/c", []),
+        ("/a:/b:/c", "/a:/c", [("-", "/b")]),
+        ("/a:/c", "/a:/b:/c", [("+", "/b")]),
+        ("/a:/b", "/b:/a", [("+", "/b"), ("-", "/b")]),
+        ("/a:/b:/c", "/a:/x:/c", [("-", "/b"), ("+", "/x")]),
+        ("/a:/a:/b", "/a:/b", [("-", "/a")]),
+        ("/a", "/a:", [("+", "")]),
+    ],
+)
+def test_diff_path_group(old, new, changes):
+    assert diff_path_group(old, new, ":") == changes
@@ -0,0 +1,151 @@
+import gc
+import ipaddress
+import weakref
+
+import pytest
+
+from enview import vartypes
+from enview.envstore import EnvStore
+from enview.vartypes import (
+    check_ipv4,
+    check_ipv6,
+    check_path,
+    check_path_group,
+    classify_all,
+    recognize_type,
+)
+
+IPV4_VALID = ["0.0.0.0", "1.2.3.4", "127.0.0.1", "192.168.1.255", "255.255.255.255"]
+IPV4_INVALID = [
+    "",
+    "1.2.3",
+    "1.2.3.4.5",
+    "256.1.1.1",
+    "1.2.3.-4",
+    "1..2.3",
+    "1.2.3.4.",
+    " 1.2.3.4",
+    "1.2.3.4 ",
+    "1234.1.1.1",
+    "a.b.c.d",
+    "0x7f.0.0.1",
+]
+
+IPV6_VALID = [
+    "::",
+    "::1",
+    "fe80::1",
+    "2001:db8::",
+    "2001:db8:0:0:0:0:2:1",
+    "1:2:3:4:5:6:7::",
+    "::2:3:4:5:6:7:8",
+    "FE80::ABCD",
+    "::ffff:192.168.1.1",
+    "64:ff9b::1.2.3.4",
+    "1:2:3:4:5:6:1.2.3.4",
+]
+IPV6_INVALID = [
+    "",
+    ":",
+    ":::",
+    "1::2::3",
+    "1:2:3:4:5:6:7",
+    "1:2:3:4:5:6:7:8:9",
+    "1:2:3:4:5:6:7:8::",
+    "12345::",
+    "g::1",
+    "::ffff:999.1.1.1",
+    "::1.2.3",
+    "1.2.3.4",
+    "fe80::1%eth0",
+]
+
+
+@pytest.mark.parametrize("address", IPV4_VALID)
+def test_ipv4_valid(address):
+    assert check_ipv4(address)
+    ipaddress.IPv4Address(address)
+
+
+@pytest.mark.parametrize("address", IPV4_INVALID)
+def test_ipv4_invalid(address):
+    assert not check_ipv4(address)
+
+
+@pytest.mark.parametrize("value", ["1", "10.1", "127.1", "10.0.1", "4294967295"])
+def test_ipv4_is_strict_dotted_quad(value):
+    # socket.inet_aton accepted all of these as IPv4 addresses
+    assert not check_ipv4(value)
+    assert recognize_type(value) != "ipv4"
+
+
+def test_short_forms_are_integer_or_undefined():
+    assert recognize_type("1") == "integer"
+    assert recognize_type("10.1") == "undefined"
+
+
+@pytest.mark.parametrize("address", IPV6_VALID)
+def test_ipv6_valid(address):
+    assert check_ipv6(address)
+    ipaddress.IPv6Address(address)
+
+
+@pytest.mark.parametrize("address", IPV6_INVALID)
+def test_ipv6_invalid(address):
+    assert not check_ipv6(address)
+
+
+@pytest.fixture
+def posix(monkeypatch):
+    monkeypatch.setattr(vartypes, "OS_NAME", "posix")
+    monkeypatch.setattr(vartypes, "PATH_SEPARATOR", ":")
+
+
+@pytest.mark.parametrize(
+    "path", ["/", "/usr/bin", "/with space/x", "$HOME", "$HOME/bin", "${HOME}/bin"]
+)
+def test_path_valid(posix, path):
+    assert check_path(path)
+
+
+@pytest.mark.parametrize(
+    "path", ["", "usr/bin", "./bin", "~/bin", "$", "$1/bin", "${HOME", "${}/x", "${1}"]
+)
+def test_path_invalid(posix, path):
+    assert not check_path(path)
+
+
+def test_windows_path(monkeypatch):
+    monkeypatch.setattr(vartypes, "OS_NAME", "nt")
+    assert check_path("C:\\Windows")
+    assert not check_path("c:\\Windows")
+    assert not check_path("\\\\server\\share")
+
+
+@pytest.mark.parametrize("value", ["/a:/b", "/usr/bin:$HOME/bin", "/a:/b:"])
+def test_path_group_valid(posix, value):
+    assert check_path_group(value)
+
+
+@pytest.mark.parametrize("value", ["/a", "/a:b", "a:b", "/a::/b", "http://x"])
+def test_path_group_invalid(posix, value):
+    assert not check_path_group(value)
+
+
+def test_classify_all_keeps_no_store_alive():
+    refs = []
+    for index in range(50):
+        store = EnvStore({"PORT": str(index), "HOME": "/root"})
+        assert classify_all(store) == {"PORT": "integer", "HOME": "path"}
+        refs.append(weakref.ref(store))
+    del store
+    gc.collect()
+    assert not any(ref() is not None for ref in refs)
+
+
+def test_classify_all_follows_store_changes():
+    store = EnvStore({"A": "1"})
+    types = classify_all(store)
+    assert classify_all(store) is types
+    store.set("A", "/tmp")
+    assert classify_all(store) == {"A": "path"}